@@ -1,4 +1,4 @@
-from ono.cli import main
+from ono.cli import run
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run()
\ No newline at end of file
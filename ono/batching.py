@@ -0,0 +1,84 @@
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+BATCH_INSTRUCTIONS = (
+    "Answer each of the following numbered requests independently.\n"
+    "Reply with only a JSON array of strings, one answer per request, in the same order.\n"
+)
+
+def build_batch_prompt(prompts: List[str]) -> str:
+    """
+    Combines several block prompts into one structured prompt.
+
+    Args:
+        prompts: The prompts of the blocks in the batch.
+
+    Returns:
+        A prompt asking for a JSON array with one answer per block.
+    """
+    requests = "\n".join(f"{i + 1}. {json.dumps(prompt)}" for i, prompt in enumerate(prompts))
+    return f"{BATCH_INSTRUCTIONS}\n{requests}"
+
+def parse_batch_response(text: str, count: int) -> Optional[List[str]]:
+    """
+    Parses the answer to a batch prompt back into per-block results.
+
+    Args:
+        text: The LLM response.
+        count: The number of blocks in the batch.
+
+    Returns:
+        One result per block, or None if the response isn't a JSON array of
+        exactly ``count`` answers.
+    """
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        return None
+    try:
+        answers = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(answers, list) or len(answers) != count:
+        return None
+    if any(isinstance(answer, (list, dict)) or answer is None for answer in answers):
+        return None
+    return [answer if isinstance(answer, str) else json.dumps(answer) for answer in answers]
+
+@dataclass
+class BatchMetrics:
+    """
+    Counts how batching performed during processing.
+    """
+    batches: int = 0
+    batched_blocks: int = 0
+    fallbacks: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, size: int, fallback: bool) -> None:
+        """
+        Records one batched request of ``size`` blocks.
+        """
+        with self._lock:
+            self.batches += 1
+            self.batched_blocks += size
+            if fallback:
+                self.fallbacks += 1
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.batched_blocks / self.batches if self.batches else 0.0
+
+    @property
+    def fallback_rate(self) -> float:
+        return self.fallbacks / self.batches if self.batches else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "batched_blocks": self.batched_blocks,
+            "fallbacks": self.fallbacks,
+            "mean_batch_size": self.mean_batch_size,
+            "fallback_rate": self.fallback_rate,
+        }
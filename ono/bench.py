@@ -0,0 +1,269 @@
+"""
+This module contains benchmarks for Ono's hot paths.
+
+Parsing and rendering are measured on synthetic templates, for OnoParser and
+for the Lark grammar parser if ``lark`` is installed. End-to-end latency
+and requests per second are measured by rendering the templates in
+``examples/``, scaled up, against a local MockLLMServer, so no network or
+model is needed.
+
+Run with ``ono bench`` or ``python -m ono.bench``.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ono.build import infer_format, is_template
+from ono.config import OnoConfig
+from ono.context import ContextManager
+from ono.demo.server import MockLLMServer
+from ono.exceptions import LLMError
+from ono.grammar import GrammarParser
+from ono.llm import LLMClient
+from ono.parser import OnoParser
+from ono.processor import TwoPassProcessor
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+
+FILLER = "echo 'some passthrough shell text that is not an ono block'\n"
+
+def generate_template(blocks: int, depth: int = 1, filler_lines: int = 4) -> str:
+    """
+    Generates a synthetic template.
+
+    Args:
+        blocks: The number of top-level Ono blocks.
+        depth: The nesting depth of each block (1 means no nesting).
+        filler_lines: Lines of passthrough text between blocks.
+
+    Returns:
+        The generated template text.
+    """
+    block = "value"
+    for level in range(depth):
+        block = f"<?ono level {level} {block} ?>"
+    chunk = FILLER * filler_lines + f"VAR={block}\n"
+    return chunk * blocks
+
+def best_time(fn: Callable[[], object], repeat: int = 3) -> float:
+    """
+    Runs ``fn`` several times and returns the fastest wall-clock time in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def bench_parse(block_counts: List[int], depth: int = 1, repeat: int = 3,
+                parser: Optional[OnoParser] = None) -> List[Dict[str, float]]:
+    """
+    Measures a parser (OnoParser by default) on templates of increasing size.
+
+    Returns:
+        One row per template size with its size, block count, time and throughput.
+    """
+    parser = parser or OnoParser()
+    rows = []
+    for blocks in block_counts:
+        text = generate_template(blocks, depth=depth)
+        seconds = best_time(lambda: parser.parse(text), repeat=repeat)
+        rows.append({
+            "blocks": blocks * depth,
+            "depth": depth,
+            "mb": len(text) / 1e6,
+            "seconds": seconds,
+            "mb_per_s": len(text) / 1e6 / seconds,
+        })
+    return rows
+
+def bench_render(block_counts: List[int], repeat: int = 3) -> List[Dict[str, float]]:
+    """
+    Measures OnoParser.render splicing a result into every block.
+
+    Returns:
+        One row per template size with its size, block count, time and throughput.
+    """
+    parser = OnoParser()
+    rows = []
+    for blocks in block_counts:
+        text = generate_template(blocks)
+        parsed = parser.parse(text)
+        results = ["/tmp"] * len(parser.extract_ono_blocks(parsed))
+        seconds = best_time(lambda: parser.render(parsed, results), repeat=repeat)
+        rows.append({
+            "blocks": blocks,
+            "depth": 1,
+            "mb": len(text) / 1e6,
+            "seconds": seconds,
+            "mb_per_s": len(text) / 1e6 / seconds,
+        })
+    return rows
+
+def load_examples(directory: str = EXAMPLES_DIR, scale: int = 1) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    Loads the example templates, each repeated ``scale`` times.
+
+    Falls back to a synthetic template when the examples aren't available,
+    e.g. in an installed package.
+
+    Returns:
+        (name, text, format) triples.
+    """
+    templates = []
+    for root, subdirectories, files in os.walk(directory):
+        subdirectories.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if not is_template(path):
+                continue
+            with open(path, "r") as f:
+                text = f.read()
+            templates.append((os.path.relpath(path, directory), text * scale, infer_format(path)))
+    return templates or [("synthetic", generate_template(8 * scale), "bash")]
+
+def make_processor(url: str, concurrency: int, batch_size: int = 1) -> TwoPassProcessor:
+    """
+    Creates a processor that talks to ``url`` with caching off and contexts in memory.
+    """
+    config = OnoConfig(global_config_path=os.devnull, project_config_path=os.devnull)
+    config.config = {
+        "cache": {"enabled": False},
+        "llm": {"backoff": 0.01, "max_backoff": 0.1, "batch_size": batch_size},
+    }
+    return TwoPassProcessor(
+        config=config,
+        llm_client=LLMClient(api_url=url, config=config, pool_size=concurrency),
+        max_concurrency=concurrency,
+        context_manager=ContextManager(),
+    )
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+def bench_end_to_end(server: MockLLMServer, templates: List[Tuple[str, str, Optional[str]]],
+                     concurrency_levels: List[int], file_jobs: int = 1, rounds: int = 1,
+                     batch_size: int = 1) -> List[Dict[str, float]]:
+    """
+    Renders every template against the mock server at several concurrency levels.
+
+    Args:
+        server: The running mock server.
+        templates: (name, text, format) triples from ``load_examples``.
+        concurrency_levels: Values of ``max_concurrency`` to measure.
+        file_jobs: Templates rendered at once, as in a batch build.
+        rounds: How many times every template is rendered per level.
+        batch_size: Blocks combined into one LLM call.
+
+    Returns:
+        One row per concurrency level with render latency percentiles,
+        throughput and requests per second.
+    """
+    rows = []
+    for concurrency in concurrency_levels:
+        processor = make_processor(server.url, concurrency, batch_size=batch_size)
+        latencies: List[float] = []
+        failures: List[str] = []
+
+        def render(template: Tuple[str, str, Optional[str]]) -> None:
+            name, text, format = template
+            started = time.perf_counter()
+            try:
+                processor.process(text, format=format)
+            except LLMError:
+                failures.append(name)  # Out of retries; the latency of a failed render isn't counted
+                return
+            latencies.append(time.perf_counter() - started)
+
+        requests_before = server.stats["requests"]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=file_jobs) as executor:
+            list(executor.map(render, templates * rounds))
+        seconds = time.perf_counter() - started
+        requests = server.stats["requests"] - requests_before
+        processor.llm_client.close()
+
+        rows.append({
+            "concurrency": concurrency,
+            "file_jobs": file_jobs,
+            "renders": len(latencies),
+            "failed": len(failures),
+            "seconds": seconds,
+            "p50_ms": percentile(latencies, 0.5) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "requests": requests,
+            "req_per_s": requests / seconds,
+        })
+    return rows
+
+def print_rows(title: str, rows: List[Dict[str, float]]) -> None:
+    """
+    Prints benchmark rows as a table.
+    """
+    print(title)
+    print(f"{'blocks':>10} {'depth':>6} {'MB':>8} {'seconds':>10} {'MB/s':>8}")
+    for row in rows:
+        print(f"{row['blocks']:>10} {row['depth']:>6} {row['mb']:>8.2f} {row['seconds']:>10.4f} {row['mb_per_s']:>8.1f}")
+    print()
+
+def print_latency_rows(title: str, rows: List[Dict[str, float]]) -> None:
+    """
+    Prints end-to-end benchmark rows as a table.
+    """
+    print(title)
+    print(f"{'jobs':>6} {'files':>6} {'renders':>8} {'failed':>7} {'seconds':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'requests':>9} {'req/s':>8}")
+    for row in rows:
+        print(f"{row['concurrency']:>6} {row['file_jobs']:>6} {row['renders']:>8} {row['failed']:>7} {row['seconds']:>9.3f} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['requests']:>9} {row['req_per_s']:>8.1f}")
+    print()
+
+def main(quick: bool = False, latency: float = 0.05, jitter: float = 0.02, error_rate: float = 0.0,
+         scale: int = 4, concurrency_levels: Optional[List[int]] = None) -> None:
+    """
+    Runs the whole benchmark suite and prints the results.
+
+    Args:
+        quick: Use smaller inputs, for a fast sanity check.
+        latency: Seconds the mock server waits before answering.
+        jitter: Random extra seconds per answer.
+        error_rate: Fraction of requests the mock server fails.
+        scale: How many times each example template is repeated.
+        concurrency_levels: Values of ``max_concurrency`` to measure.
+    """
+    sizes = [1000, 4000] if quick else [1000, 4000, 16000, 64000]
+    print_rows("Parse, flat blocks", bench_parse(sizes))
+    print_rows("Parse, nested 8 deep", bench_parse([size // 4 for size in sizes], depth=8))
+    try:
+        grammar = GrammarParser()
+    except ImportError:
+        print("Parse, Lark grammar: skipped, lark is not installed\n")
+    else:
+        # LALR builds a full parse tree, so smaller inputs keep this quick
+        print_rows("Parse, flat blocks, Lark grammar", bench_parse(sizes[:2], parser=grammar))
+        print_rows("Parse, nested 8 deep, Lark grammar", bench_parse([size // 4 for size in sizes[:2]], depth=8,
+                                                                     parser=grammar))
+    print_rows("Render, flat blocks", bench_render(sizes))
+    print_rows("Parse, one chain nested deeply", [
+        row for depth in ((500, 2000) if quick else (500, 2000, 8000)) for row in bench_parse([1], depth=depth)
+    ])
+
+    levels = concurrency_levels or ([1, 8] if quick else [1, 4, 16])
+    templates = load_examples(scale=1 if quick else scale)
+    with MockLLMServer(latency=latency, jitter=jitter, error_rate=error_rate, seed=0) as server:
+        print_latency_rows(
+            f"End to end, {len(templates)} example templates x{1 if quick else scale} "
+            f"({latency * 1000:.0f} ms latency, {error_rate:.0%} errors)",
+            bench_end_to_end(server, templates, levels),
+        )
+        print_latency_rows(
+            "Load, templates rendered 4 at a time",
+            bench_end_to_end(server, templates, levels, file_jobs=4, rounds=1 if quick else 4),
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from ono.metadata import BuildManifest
+
+DEFAULT_FILE_JOBS = 4
+
+# Extensions whose format name differs from the extension itself
+FORMAT_ALIASES = {
+    "sh": "bash",
+    "py": "python",
+    "yml": "yaml",
+    "tf": "terraform",
+}
+
+@dataclass
+class FileResult:
+    """
+    The outcome of processing one template file.
+    """
+    source: str
+    output: str
+    seconds: float = 0.0
+    skipped: bool = False  # Up to date according to the build manifest
+    error: Optional[str] = None
+
+def is_template(path: str) -> bool:
+    """
+    Checks whether a file follows the ``.ono.<ext>`` naming convention
+    (``deploy.ono.sh``, ``Dockerfile.ono``). Python's bytecode caches of
+    ``.ono.py`` templates don't count.
+    """
+    if os.path.basename(os.path.dirname(path)) == "__pycache__":
+        return False
+    return "ono" in os.path.basename(path).split(".")[1:]
+
+def infer_format(path: str) -> Optional[str]:
+    """
+    Infers the destination format from a file name such as ``deploy.ono.sh``.
+    """
+    name = os.path.basename(path).lower()
+    parts = [part for part in name.split(".") if part != "ono"]
+    if len(parts) < 2:
+        return parts[0] if parts and parts[0] == "dockerfile" else None
+    extension = parts[-1]
+    return FORMAT_ALIASES.get(extension, extension)
+
+def output_name(path: str) -> str:
+    """
+    Gets the name of the file generated from a template by dropping its
+    ``.ono`` component, e.g. ``deploy.ono.sh`` becomes ``deploy.sh``.
+    """
+    directory, name = os.path.split(path)
+    parts = name.split(".")
+    kept = parts[:1] + [part for part in parts[1:] if part != "ono"]
+    return os.path.join(directory, ".".join(kept))
+
+def has_magic(pattern: str) -> bool:
+    return any(char in pattern for char in "*?[")
+
+def expand_inputs(inputs: List[str]) -> List[Tuple[str, str]]:
+    """
+    Expands files, directories and glob patterns into template files.
+
+    Directories and glob patterns (``**`` included) are searched for
+    ``.ono.<ext>`` templates only, so a broad pattern never picks up the
+    generated files next to them. Files named explicitly are taken as they are.
+
+    Args:
+        inputs: The paths and patterns given on the command line.
+
+    Returns:
+        (source path, path relative to its input root) pairs, used to mirror
+        the source layout under an output directory.
+    """
+    found: List[Tuple[str, str]] = []
+    seen = set()
+
+    def add(path: str, root: str) -> None:
+        if path not in seen and os.path.isfile(path):
+            seen.add(path)
+            found.append((path, os.path.relpath(path, root) if root else os.path.basename(path)))
+
+    for entry in inputs:
+        if has_magic(entry):
+            root = entry
+            while has_magic(root):
+                root = os.path.dirname(root)
+            for path in sorted(glob.glob(entry, recursive=True)):
+                if is_template(path):
+                    add(path, root or ".")
+        elif os.path.isdir(entry):
+            for directory, subdirectories, files in os.walk(entry):
+                subdirectories.sort()
+                for name in sorted(files):
+                    path = os.path.join(directory, name)
+                    if is_template(path):
+                        add(path, entry)
+        else:
+            add(entry, "")
+
+    return found
+
+def build_files(process: Callable[[str, str], str], sources: List[Tuple[str, str]],
+                output_dir: Optional[str] = None, jobs: int = DEFAULT_FILE_JOBS,
+                manifest: Optional[BuildManifest] = None,
+                fingerprint: Optional[Callable[[str], Dict[str, Any]]] = None,
+                force: bool = False) -> List[FileResult]:
+    """
+    Processes template files in parallel.
+
+    A template whose processing fails is reported in its FileResult's
+    ``error``; its output is neither written nor recorded in the manifest, so
+    the next build tries it again. So is a file without an ``.ono`` name
+    component whose output would be the file itself: it is never overwritten.
+
+    Args:
+        process: Called with a file's text and path; returns the output text,
+            or raises if the template can't be processed.
+        sources: (source path, relative path) pairs from ``expand_inputs``.
+        output_dir: The directory mirroring the source layout, or None to write
+            each output next to its template.
+        jobs: The number of files processed at once.
+        manifest: The build manifest used to skip unchanged templates.
+        fingerprint: Called with a source path; returns the non-file inputs
+            (context, configuration, format) recorded in the manifest.
+        force: Rebuild every template even if the manifest says it is up to date.
+
+    Returns:
+        One FileResult per source, in the order given.
+    """
+    def build(source: Tuple[str, str]) -> FileResult:
+        path, relative = source
+        target = output_name(os.path.join(output_dir, relative) if output_dir else path)
+        result = FileResult(source=path, output=target)
+        started = time.perf_counter()
+        if _same_file(path, target):
+            result.error = "output would overwrite the input; name it <name>.ono.<ext> or use --output"
+            return result
+        inputs = fingerprint(path) if manifest is not None and fingerprint else {}
+        if manifest is not None and not force and manifest.is_up_to_date(path, target, inputs):
+            result.skipped = True
+            result.seconds = time.perf_counter() - started
+            return result
+        try:
+            with open(path, "r") as f:
+                text = f.read()
+            processed = process(text, path)
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            with open(target, "w") as f:
+                f.write(processed)
+            if manifest is not None:
+                manifest.record(path, target, inputs)
+        except Exception as e:  # Unreadable files and blocks the LLM couldn't resolve alike
+            result.error = str(e) or type(e).__name__
+        result.seconds = time.perf_counter() - started
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        results = list(executor.map(build, sources))
+
+    if manifest is not None:
+        manifest.save()
+    return results
+
+def _same_file(path: str, target: str) -> bool:
+    if os.path.exists(target):
+        return os.path.samefile(path, target)
+    return os.path.abspath(path) == os.path.abspath(target)
+
+def format_summary(results: List[FileResult], seconds: float) -> str:
+    """
+    Formats per-file timings and totals for the end of a batch run.
+    """
+    lines = []
+    for result in results:
+        status = f"  (error: {result.error})" if result.error else "  (up to date)" if result.skipped else ""
+        lines.append(f"{result.seconds:8.2f}s  {result.source} -> {result.output}{status}")
+    failed = sum(1 for result in results if result.error)
+    skipped = sum(1 for result in results if result.skipped)
+    lines.append(f"Processed {len(results) - failed - skipped} files "
+                 f"({skipped} up to date, {failed} failed) in {seconds:.2f}s")
+    return "\n".join(lines)
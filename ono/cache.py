@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".ono", "cache")
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024  # 100 MB
+
+class ResponseCache:
+    """
+    A persistent, content-addressed cache of resolved Ono blocks.
+
+    Each entry is stored as a small JSON file named after the hash of everything
+    that influences the LLM response. The cache is bounded in size and evicts the
+    least recently used entries first; entries can also expire after a TTL.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size: int = DEFAULT_MAX_SIZE, ttl: Optional[float] = None):
+        """
+        Initializes the ResponseCache.
+
+        Args:
+            path: The directory holding the cache entries.
+            max_size: The maximum total size of the cache in bytes.
+            ttl: The number of seconds an entry stays valid, or None for no expiry.
+        """
+        self.path = os.path.expanduser(path or DEFAULT_CACHE_PATH)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> "ResponseCache":
+        """
+        Creates a ResponseCache from the ``cache`` section of an OnoConfig.
+        """
+        return cls(
+            path=config.get("cache.path", DEFAULT_CACHE_PATH),
+            max_size=int(config.get("cache.max_size", DEFAULT_MAX_SIZE)),
+            ttl=config.get("cache.ttl"),
+        )
+
+    @staticmethod
+    def make_key(prompt: str, model: Optional[str] = None, params: Optional[Dict[str, Any]] = None,
+                 context: Optional[str] = None, format: Optional[str] = None,
+                 limits: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Computes the cache key for a block.
+
+        Args:
+            prompt: The block text sent to the LLM.
+            model: The model used to resolve the block.
+            params: The pass-through parameters sent with the request.
+            context: The context path the block is resolved in.
+            format: The target output format.
+            limits: How the answer was cut short (single line, max length), if at all.
+
+        Returns:
+            A hex digest identifying the request.
+        """
+        fields = {"prompt": prompt, "model": model, "params": params or {}, "context": context, "format": format}
+        if limits:
+            fields["limits"] = limits
+        payload = json.dumps(fields, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Retrieves the cached response for the given key, or None on a miss.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._count(hit=False)
+            return None
+
+        if self.ttl is not None and time.time() - entry.get("created", 0) > self.ttl:
+            self._remove(entry_path)
+            self._count(hit=False)
+            return None
+
+        try:
+            # Refresh the modification time so eviction is least-recently-used
+            os.utime(entry_path)
+        except OSError:
+            pass
+        self._count(hit=True)
+        return entry["value"]
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Stores a response in the cache, evicting old entries if it grows too large.
+        """
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"created": time.time(), "value": value}, f)
+        size = os.path.getsize(tmp_path)
+        previous = os.path.getsize(entry_path) if os.path.exists(entry_path) else 0
+        os.replace(tmp_path, entry_path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry_size for _, entry_size, _ in self._entries())
+            else:
+                self._size += size - previous
+            if self._size > self.max_size:
+                self._evict()
+
+    def clear(self) -> int:
+        """
+        Removes every entry from the cache.
+
+        Returns:
+            The number of entries removed.
+        """
+        removed = 0
+        with self._lock:
+            for entry_path, _, _ in self._entries():
+                self._remove(entry_path)
+                removed += 1
+            self._size = 0
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Gets statistics about the cache contents and its use by this process.
+        """
+        entries = self._entries()
+        return {
+            "path": self.path,
+            "entries": len(entries),
+            "size": sum(size for _, size, _ in entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _evict(self) -> None:
+        """
+        Removes least recently used entries until the cache fits within max_size.
+        Must be called with the lock held.
+        """
+        for entry_path, size, _ in sorted(self._entries(), key=lambda entry: entry[2]):
+            if self._size <= self.max_size:
+                break
+            self._remove(entry_path)
+            self._size -= size
+
+    def _entries(self) -> List[Tuple[str, int, float]]:
+        """
+        Lists the cache entries as (path, size, modification time) tuples.
+        """
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        for shard in os.scandir(self.path):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def _remove(self, entry_path: str) -> None:
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -1,17 +1,47 @@
+import itertools
+import json
+import os
+import stat
+import sys
+import threading
+import time
 import typer
-from typing import Optional
-from ono.parser import OnoParser
-from ono.processor import TwoPassProcessor
+from contextlib import contextmanager
+from typing import IO, TYPE_CHECKING, Any, Callable, Iterator, List, Optional
 from ono.config import OnoConfig
+from ono.cache import ResponseCache
+from ono.build import DEFAULT_FILE_JOBS, build_files, expand_inputs, format_summary, has_magic, infer_format
+from ono.mapped import MMAP_THRESHOLD, file_has_blocks
+from ono.metadata import BuildManifest, BuildProfile
+from ono.scanner import KEYWORD, has_blocks
+
+# The processor pulls in the LLM clients, asyncio and the HTTP stack, so it is
+# only imported once a template with blocks needs it
+if TYPE_CHECKING:
+    from ono.processor import TwoPassProcessor
 
 app = typer.Typer()
+cache_app = typer.Typer(help="Inspect and manage the response cache")
+bench_app = typer.Typer(help="Benchmark Ono against a local mock LLM server")
+
+STREAM_CHUNK_SIZE = 64 * 1024
 
 @app.command()
 def main(
-    input: str = typer.Argument(..., help="Directory, file, or list from globs like *.ono"),
+    inputs: List[str] = typer.Argument(..., metavar="INPUT...", help="Directory, file, or list from globs like *.ono"),
     context: Optional[str] = typer.Option(None, "--context", "-c", help="File that establishes context"),
     format: Optional[str] = typer.Option(None, "--format", "-f", help="Destination format, inferred from the file extension"),
     output: Optional[str] = typer.Option(None, "--output", "-o", help="A place to put the output of the program"),
+    jobs: Optional[int] = typer.Option(None, "--jobs", "-j", help="Maximum number of blocks resolved concurrently (default: llm.max_concurrency)"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="Always call the LLM instead of reusing cached responses"),
+    batch: Optional[int] = typer.Option(None, "--batch", help="Resolve up to N independent blocks per LLM call (default: llm.batch_size)"),
+    stream: bool = typer.Option(False, "--stream", help="Process a single input incrementally, writing output as blocks resolve"),
+    file_jobs: Optional[int] = typer.Option(None, "--file-jobs", help="Number of files processed in parallel in batch mode (default: build.file_jobs)"),
+    force: bool = typer.Option(False, "--force", help="Rebuild templates even if their inputs haven't changed"),
+    persist_context: bool = typer.Option(False, "--persist-context", help="Keep @context history across runs (default: context.persist)"),
+    profile: Optional[str] = typer.Option(None, "--profile", help="Write per-block timings to this JSON file"),
+    trace: Optional[str] = typer.Option(None, "--trace", help="Write a Chrome trace (chrome://tracing, Perfetto) to this file"),
+    mmap: Optional[bool] = typer.Option(None, "--mmap/--no-mmap", help="Memory-map the input instead of reading it (default: for inputs of at least build.mmap_threshold bytes)"),
 ):
     """
     Ono is a universal templating preprocessor that uses AI to solve those annoying
@@ -19,8 +49,61 @@ def main(
     """
 
     config = OnoConfig()
-    processor = TwoPassProcessor()
-    parser = OnoParser()
+    manifest = BuildManifest(config.get("build.manifest"))
+    config_hash = BuildManifest.hash_text(json.dumps(config.config, sort_keys=True, default=str))
+
+    def fingerprint(path: str):
+        return manifest.fingerprint(context, config_hash, format or infer_format(path))
+
+    if no_cache:
+        config.config.setdefault("cache", {})["enabled"] = False
+    if persist_context:
+        config.config.setdefault("context", {})["persist"] = True
+    processor = LazyProcessor(
+        config=config,
+        max_concurrency=jobs,
+        format=format,
+        context=context,
+        batch_size=batch,
+        profile=BuildProfile() if profile or trace else None,
+    )
+
+    input = inputs[0]
+    if len(inputs) > 1 or has_magic(input) or os.path.isdir(input):
+        if stream:
+            print("Error: --stream processes a single input file, not a batch")
+            return
+        succeeded = process_batch(processor, inputs, output,
+                                  file_jobs or config.get("build.file_jobs", DEFAULT_FILE_JOBS),
+                                  manifest, fingerprint, force)
+        processor.report(profile, trace)
+        if not succeeded:
+            raise typer.Exit(code=1)
+        return
+
+    if output and not force and manifest.is_up_to_date(input, output, fingerprint(input)):
+        print(f"Up to date: {output}")
+        return
+
+    format = format or infer_format(input)
+    if stream:
+        succeeded = process_stream(processor, input, output, format)
+        processor.report(profile, trace)
+        if not succeeded:
+            raise typer.Exit(code=1)
+        return
+
+    if mmap is None:
+        mmap = os.path.isfile(input) and os.path.getsize(input) >= config.get("build.mmap_threshold", MMAP_THRESHOLD)
+    if mmap:
+        succeeded = process_mapped(processor, input, output, format)
+        if succeeded and output:
+            manifest.record(input, output, fingerprint(input))
+            manifest.save()
+        processor.report(profile, trace)
+        if not succeeded:
+            raise typer.Exit(code=1)
+        return
 
     try:
         with open(input, "r") as f:
@@ -29,17 +112,367 @@ def main(
         print(f"Error: Input file not found: {input}")
         return
 
-    processed_text = processor.process(text)
+    try:
+        # Without blocks there's nothing to resolve, so the LLM client is never set up
+        processed_text = processor.get(format).process(text, source=input) if has_blocks(text) else text
+    except Exception as e:
+        # Nothing is written or recorded, so the next build tries again
+        print(f"Error processing {input}: {e}")
+        processor.report(profile, trace)
+        raise typer.Exit(code=1)
+    processor.report(profile, trace)
 
     if output:
         try:
             with open(output, "w") as f:
                 f.write(processed_text)
+            manifest.record(input, output, fingerprint(input))
+            manifest.save()
             print(f"Output written to: {output}")
         except Exception as e:
             print(f"Error writing to output file: {e}")
     else:
         print(processed_text)
 
+class LazyProcessor:
+    """
+    Creates the TwoPassProcessor, and with it the LLM client and its
+    connection pool, only once a template with blocks needs it. Templates
+    without blocks are copied through without it.
+    """
+
+    def __init__(self, **options: Any):
+        """
+        Initializes the LazyProcessor.
+
+        Args:
+            **options: The arguments for TwoPassProcessor, including the one
+                OnoConfig shared by the whole run.
+        """
+        self.options = options
+        self.processor: Optional["TwoPassProcessor"] = None
+        self._running = False  # Inside ``run``
+        self._lock = threading.Lock()
+
+    @property
+    def format(self) -> Optional[str]:
+        return self.options.get("format")
+
+    def get(self, format: Optional[str] = None) -> "TwoPassProcessor":
+        """
+        Gets the processor, creating it on first use.
+
+        Args:
+            format: The target format to set, for single-file runs.
+        """
+        with self._lock:
+            if self.processor is None:
+                from ono.processor import TwoPassProcessor
+                self.processor = TwoPassProcessor(**self.options)
+                if self._running:
+                    self.processor.dedup.begin()
+        if format is not None:
+            self.processor.format = format
+        return self.processor
+
+    @contextmanager
+    def run(self) -> Iterator[None]:
+        """
+        Makes the templates processed inside one deduplication run, so the
+        files of a batch share their answers, whenever the processor is created.
+        """
+        with self._lock:
+            self._running = True
+            if self.processor is not None:
+                self.processor.dedup.begin()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._running = False
+                if self.processor is not None:
+                    self.processor.dedup.end()
+
+    def process(self, text: str, format: Optional[str] = None, source: Optional[str] = None) -> str:
+        """
+        Processes a template, or returns it as it is if it has no blocks.
+        """
+        if not has_blocks(text):
+            return text
+        return self.get().process(text, format=format, source=source)
+
+    def report(self, profile_path: Optional[str], trace_path: Optional[str]) -> None:
+        """
+        Reports the metrics and writes the profile of the processor, if one was needed.
+        """
+        if self.processor is not None:
+            report_metrics(self.processor)
+            report_profile(self.processor, profile_path, trace_path)
+
+def process_batch(processor: LazyProcessor, inputs: List[str], output_dir: Optional[str], file_jobs: int,
+                  manifest: Optional[BuildManifest] = None, fingerprint=None, force: bool = False) -> bool:
+    """
+    Processes every template matched by ``inputs``, sharing one processor (and
+    so one connection pool, cache and bound on LLM calls in flight) across
+    parallel files.
+
+    Returns:
+        Whether every template was processed or up to date.
+    """
+    sources = expand_inputs(inputs)
+    if not sources:
+        print(f"Error: No templates found in: {' '.join(inputs)}")
+        return False
+
+    started = time.perf_counter()
+    with processor.run():
+        results = build_files(
+            lambda text, path: processor.process(text, format=processor.format or infer_format(path), source=path),
+            sources,
+            output_dir=output_dir,
+            jobs=int(file_jobs),
+            manifest=manifest,
+            fingerprint=fingerprint,
+            force=force,
+        )
+    typer.echo(format_summary(results, time.perf_counter() - started), err=True)
+    return not any(result.error for result in results)
+
+def report_metrics(processor: "TwoPassProcessor") -> None:
+    """
+    Reports how request batching, deduplication and context compaction
+    performed, if they were used.
+    """
+    metrics = processor.batch_metrics
+    if metrics.batches:
+        typer.echo(
+            f"Batched {metrics.batched_blocks} blocks into {metrics.batches} calls "
+            f"(mean size {metrics.mean_batch_size:.1f}, fallback rate {metrics.fallback_rate:.0%})",
+            err=True,
+        )
+    dedup = processor.dedup.metrics
+    if dedup.shared:
+        near = f", {dedup.fuzzy} near-duplicates" if dedup.fuzzy else ""
+        typer.echo(
+            f"Deduplicated {dedup.shared} of {dedup.blocks} blocks{near}, saving {dedup.calls_saved} LLM calls",
+            err=True,
+        )
+    compaction = processor.compactor.metrics
+    if compaction.compactions:
+        typer.echo(
+            f"Compacted context history {compaction.compactions} times, "
+            f"saving ~{compaction.tokens_saved} tokens ({compaction.summaries} summaries)",
+            err=True,
+        )
+
+def report_profile(processor: "TwoPassProcessor", path: Optional[str], trace_path: Optional[str]) -> None:
+    """
+    Summarizes the build profile and writes it out, if profiling was requested.
+    """
+    profile = processor.profile
+    if profile is None:
+        return
+    summary = profile.summary()
+    typer.echo(
+        f"Profiled {summary['blocks']} blocks in {summary['wall_time']:.2f}s: "
+        f"parse {summary['parse_time'] * 1000:.1f}ms, queue {summary['queue_wait']:.2f}s, "
+        f"LLM {summary['llm_latency']:.2f}s over {summary['llm_calls']} calls ({summary['retries']} retries), "
+        f"validation {summary['validation_time'] * 1000:.1f}ms, {summary['cache_hits']} cache hits, "
+        f"~{summary['tokens_in']} tokens in / ~{summary['tokens_out']} out",
+        err=True,
+    )
+    try:
+        if path:
+            profile.save(path)
+            typer.echo(f"Profile written to: {path}", err=True)
+        if trace_path:
+            profile.save(trace_path, trace=True)
+            typer.echo(f"Trace written to: {trace_path}", err=True)
+    except OSError as e:
+        typer.echo(f"Error writing profile: {e}", err=True)
+
+@contextmanager
+def replacing(path: str, mode: str) -> Iterator[IO]:
+    """
+    Opens a temporary file next to ``path`` and moves it over ``path`` once
+    it is complete. The output may be the very file being read, and a run
+    that fails leaves the previous output as it was.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            if os.path.exists(path):
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def process_mapped(processor: LazyProcessor, input: str, output: Optional[str], format: Optional[str] = None) -> bool:
+    """
+    Processes ``input`` through a memory map, writing to ``output`` (or stdout).
+    A template without blocks is copied through without creating the processor.
+
+    Returns:
+        Whether the output was written. If processing fails, ``output`` is
+        left as it was.
+    """
+    if not os.path.isfile(input):
+        print(f"Error: Input file not found: {input}")
+        return False
+
+    def process(destination: IO) -> None:
+        if not file_has_blocks(input):
+            with open(input, "rb") as source:
+                while True:
+                    chunk = source.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    destination.write(chunk)
+            return
+        processor.get(format).process_file(input, destination)
+
+    if not output:
+        sys.stdout.flush()
+        try:
+            process(sys.stdout.buffer)
+        except Exception as e:
+            print(f"Error processing {input}: {e}")
+            return False
+        return True
+    try:
+        with replacing(output, "wb") as destination:
+            process(destination)
+    except OSError as e:
+        print(f"Error writing to output file: {e}")
+        return False
+    except Exception as e:
+        print(f"Error processing {input}: {e}")
+        return False
+    print(f"Output written to: {output}")
+    return True
+
+def process_stream(processor: LazyProcessor, input: str, output: Optional[str], format: Optional[str] = None) -> bool:
+    """
+    Streams ``input`` through the processor to ``output`` (or stdout) in chunks.
+    Text is copied through until a chunk may hold a block, and the processor
+    is only created then.
+
+    Returns:
+        Whether the output was written. If processing fails, ``output`` is
+        left as it was.
+    """
+    def process(chunks: Iterator[str], write: Callable[[str], Any]) -> None:
+        rest = copy_until_blocks(chunks, write)
+        if rest is not None:
+            processor.get(format).process_stream(rest, write)
+
+    try:
+        source = open(input, "r")
+    except FileNotFoundError:
+        print(f"Error: Input file not found: {input}")
+        return False
+
+    with source:
+        chunks = iter(lambda: source.read(STREAM_CHUNK_SIZE), "")
+        if not output:
+            try:
+                process(chunks, sys.stdout.write)
+            except Exception as e:
+                print(f"Error processing {input}: {e}")
+                return False
+            sys.stdout.flush()
+            return True
+        try:
+            with replacing(output, "w") as destination:
+                process(chunks, destination.write)
+        except OSError as e:
+            print(f"Error writing to output file: {e}")
+            return False
+        except Exception as e:
+            print(f"Error processing {input}: {e}")
+            return False
+        print(f"Output written to: {output}")
+        return True
+
+def copy_until_blocks(chunks: Iterator[str], write: Callable[[str], Any]) -> Optional[Iterator[str]]:
+    """
+    Writes the chunks of a stream as they are until one may hold an Ono block.
+
+    The last few characters are held back, in case a block's opener is split
+    across chunks. A file-level delimiter override has to start the file, so
+    the text copied through never holds one.
+
+    Returns:
+        The rest of the stream, starting with the text held back, or None if
+        the stream has no blocks and was copied through entirely.
+    """
+    held = ""
+    for chunk in chunks:
+        text = held + chunk
+        if has_blocks(text):
+            return itertools.chain([text], chunks)
+        # Enough for the keyword split across chunks, with the character opening it
+        cut = max(0, len(text) - len(KEYWORD))
+        write(text[:cut])
+        held = text[cut:]
+    write(held)
+    return None
+
+@cache_app.command("stats")
+def cache_stats():
+    """
+    Shows the size and location of the response cache.
+    """
+    stats = ResponseCache.from_config(OnoConfig()).stats()
+    print(f"Path:    {stats['path']}")
+    print(f"Entries: {stats['entries']}")
+    print(f"Size:    {stats['size']} / {stats['max_size']} bytes")
+    print(f"TTL:     {stats['ttl'] if stats['ttl'] is not None else 'none'}")
+
+@cache_app.command("clear")
+def cache_clear():
+    """
+    Removes every entry from the response cache.
+    """
+    removed = ResponseCache.from_config(OnoConfig()).clear()
+    print(f"Removed {removed} cached responses")
+
+@bench_app.command()
+def bench(
+    quick: bool = typer.Option(False, "--quick", help="Use smaller inputs for a fast sanity check"),
+    latency: float = typer.Option(0.05, "--latency", help="Seconds the mock server waits before answering"),
+    jitter: float = typer.Option(0.02, "--jitter", help="Random extra seconds per answer"),
+    error_rate: float = typer.Option(0.0, "--error-rate", help="Fraction of requests failing with a 503"),
+    scale: int = typer.Option(4, "--scale", help="How many times each example template is repeated"),
+    concurrency: Optional[List[int]] = typer.Option(None, "--concurrency", "-j", help="max_concurrency levels to measure"),
+):
+    """
+    Measures parse and render throughput, end-to-end latency and requests per
+    second, without a network.
+    """
+    from ono import bench as benchmarks
+
+    benchmarks.main(quick=quick, latency=latency, jitter=jitter, error_rate=error_rate, scale=scale,
+                    concurrency_levels=concurrency or None)
+
+# Subcommands dispatched by name before falling back to file processing
+SUBCOMMANDS = {
+    "cache": cache_app,
+    "bench": bench_app,
+}
+
+def run():
+    """
+    Entry point for the ``ono`` command.
+    """
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        name = sys.argv[1]
+        SUBCOMMANDS[name](args=sys.argv[2:], prog_name=f"ono {name}")
+    else:
+        app()
+
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    run()
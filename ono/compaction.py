@@ -0,0 +1,181 @@
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_TOKEN_BUDGET = 4096
+DEFAULT_STRATEGY = "sliding_window"
+STRATEGIES = ("none", "sliding_window", "summarize")
+SUMMARY_SHARE = 4  # The summarize strategy keeps 1/4 of the free budget for the digest
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation in a few sentences, keeping every fact, "
+    "name and decision a later request might depend on.\n\n"
+)
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in a string without a tokenizer.
+
+    Uses the common approximation of four characters per token, which is close
+    enough for budgeting prompts.
+    """
+    return (len(text) + 3) // 4
+
+def message_tokens(message: Dict[str, str]) -> int:
+    """
+    Estimates the tokens a message takes in a prompt, including its role label.
+    """
+    return estimate_tokens(message["content"]) + 4
+
+@dataclass
+class CompactionMetrics:
+    """
+    Counts how much context compaction shrank the history sent to the LLM.
+    """
+    compactions: int = 0
+    summaries: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, before: int, after: int, summarized: bool) -> None:
+        with self._lock:
+            self.tokens_before += before
+            self.tokens_after += after
+            if after < before:
+                self.compactions += 1
+            if summarized:
+                self.summaries += 1
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "compactions": self.compactions,
+            "summaries": self.summaries,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_saved,
+        }
+
+class ContextCompactor:
+    """
+    Fits a context's conversation history into a per-model token budget.
+
+    Messages whose role is pinned (system messages by default) are always kept.
+    The ``sliding_window`` strategy keeps the most recent messages that fit; the
+    ``summarize`` strategy also replaces the older messages with a digest, which
+    is cached so each stretch of history is summarized only once.
+    """
+
+    def __init__(self, budget: Any = DEFAULT_TOKEN_BUDGET, strategy: str = DEFAULT_STRATEGY,
+                 summarize: Optional[Callable[[str], str]] = None, pinned_roles: Optional[List[str]] = None):
+        """
+        Initializes the ContextCompactor.
+
+        Args:
+            budget: The token budget for history plus prompt, either a number or
+                a mapping from model name to budget with an optional "default".
+            strategy: One of "none", "sliding_window" or "summarize".
+            summarize: Called with older conversation text to produce a digest.
+                Required by the "summarize" strategy.
+            pinned_roles: Roles whose messages are never dropped.
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown context compaction strategy: {strategy}. Valid strategies: {', '.join(STRATEGIES)}")
+        self.budget = budget
+        self.strategy = strategy
+        self.summarize = summarize
+        self.pinned_roles = set(pinned_roles if pinned_roles is not None else ["system"])
+        self.metrics = CompactionMetrics()
+        self._digests: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, summarize: Optional[Callable[[str], str]] = None) -> "ContextCompactor":
+        """
+        Creates a ContextCompactor from the ``context`` section of an OnoConfig.
+        """
+        return cls(
+            budget=config.get("context.token_budget", DEFAULT_TOKEN_BUDGET),
+            strategy=config.get("context.strategy", DEFAULT_STRATEGY),
+            summarize=summarize,
+            pinned_roles=config.get("context.pinned_roles"),
+        )
+
+    def budget_for(self, model: Optional[str] = None) -> int:
+        """
+        Gets the token budget for a model.
+        """
+        if isinstance(self.budget, dict):
+            return int(self.budget.get(model, self.budget.get("default", DEFAULT_TOKEN_BUDGET)))
+        return int(self.budget)
+
+    def compact(self, messages: List[Dict[str, str]], prompt: str, model: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Selects the history to send with a prompt.
+
+        Args:
+            messages: The full conversation history, oldest first.
+            prompt: The new request, which always has to fit.
+            model: The model the request is for.
+
+        Returns:
+            The messages to send, in their original order.
+        """
+        before = sum(message_tokens(message) for message in messages)
+        available = self.budget_for(model) - estimate_tokens(prompt)
+        if self.strategy == "none" or before <= available:
+            self.metrics.record(before, before, summarized=False)
+            return messages
+
+        pinned = [i for i, message in enumerate(messages) if message["role"] in self.pinned_roles]
+        remaining = available - sum(message_tokens(messages[i]) for i in pinned)
+        # Hold back room for the digest so the window can't crowd it out
+        reserve = remaining // SUMMARY_SHARE if self.strategy == "summarize" and self.summarize else 0
+        remaining -= reserve
+
+        # Walk back from the newest message, keeping whatever still fits
+        kept = set(pinned)
+        first_kept = len(messages)
+        for i in range(len(messages) - 1, -1, -1):
+            if i in kept:
+                continue
+            cost = message_tokens(messages[i])
+            if cost > remaining:
+                break
+            kept.add(i)
+            remaining -= cost
+            first_kept = i
+
+        compacted = [message for i, message in enumerate(messages) if i in kept]
+        dropped = [message for i, message in enumerate(messages[:first_kept]) if i not in kept]
+
+        summarized = False
+        if self.strategy == "summarize" and dropped and self.summarize is not None:
+            digest = {"role": "system", "content": f"Summary of earlier conversation: {self._digest(dropped)}"}
+            if message_tokens(digest) <= remaining + reserve:
+                position = sum(1 for i in pinned if i < first_kept)
+                compacted.insert(position, digest)
+                summarized = True
+
+        self.metrics.record(before, sum(message_tokens(message) for message in compacted), summarized)
+        return compacted
+
+    def _digest(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Summarizes messages, reusing the digest if they were summarized before.
+        """
+        key = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._digests:
+                return self._digests[key]
+        text = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        digest = self.summarize(SUMMARY_PROMPT + text).strip()
+        with self._lock:
+            self._digests[key] = digest
+        return digest
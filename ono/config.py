@@ -1,4 +1,3 @@
-import yaml
 import os
 from typing import Optional, Dict, Any
 
@@ -22,14 +21,15 @@ class OnoConfig:
         """
         Loads configuration from global and project-specific files, merging them
         with project-specific settings overriding global settings.
+
+        Sections such as ``llm`` are merged key by key, so a project setting
+        only ``llm.batch_size`` keeps the global ``llm.api_url``.
         """
         global_config = self._load_yaml(self.global_config_path)
         project_config = self._load_yaml(self.project_config_path)
 
         # Merge configurations, with project config overriding global config
-        config = global_config.copy()
-        config.update(project_config)
-        return config
+        return _merge(global_config, project_config)
 
     def _load_yaml(self, path: str) -> Dict[str, Any]:
         """
@@ -38,9 +38,13 @@ class OnoConfig:
         """
         try:
             with open(path, "r") as f:
-                return yaml.safe_load(f) or {}
+                text = f.read()
         except FileNotFoundError:
             return {}
+        import yaml  # Only loaded when there is a configuration file to read
+
+        try:
+            return yaml.safe_load(text) or {}
         except yaml.YAMLError as e:
             print(f"Error loading YAML file: {path} - {e}")
             return {}
@@ -49,8 +53,31 @@ class OnoConfig:
         """
         Retrieves a configuration value for the given key. If the key is not found,
         returns the provided default value.
+
+        Dotted keys such as "llm.max_concurrency" walk into nested sections.
         """
-        return self.config.get(key, default)
+        if key in self.config:
+            return self.config[key]
+
+        value: Any = self.config
+        for part in key.split("."):
+            if not isinstance(value, dict) or part not in value:
+                return default
+            value = value[part]
+        return value
 
     def __repr__(self):
-        return f"OnoConfig(config={self.config})"
\ No newline at end of file
+        return f"OnoConfig(config={self.config})"
+
+def _merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merges two configurations recursively, with ``override`` winning, without
+    changing either of them.
+    """
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
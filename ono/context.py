@@ -1,4 +1,41 @@
-from typing import Dict, Any, Optional
+import datetime
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Any, List, Optional
+from urllib.parse import quote, unquote
+
+DEFAULT_CONTEXT_STORAGE = os.path.join(os.path.expanduser("~"), ".ono", "contexts")
+
+class Context:
+    """
+    A single conversation context.
+
+    A forked context shares its parent's message history copy-on-write: it keeps
+    a reference to the parent and the number of parent messages visible at the
+    fork, and stores only the messages added after the fork. The parent's
+    messages only ever grow while it has forks; before they are cleared or
+    deleted, each fork is given its own copy of what it shares.
+    """
+
+    def __init__(self, name: str, parent: Optional[str] = None, fork_point: int = 0,
+                 created_at: Optional[str] = None):
+        """
+        Initializes the Context.
+
+        Args:
+            name: The context path, e.g. "system/monitoring".
+            parent: The context path this context was forked from.
+            fork_point: The number of parent messages shared with this context.
+            created_at: The creation time as an ISO 8601 string.
+        """
+        self.name = name
+        self.parent = parent
+        self.fork_point = fork_point
+        self.created_at = created_at or datetime.datetime.utcnow().isoformat() + "Z"
+        self.messages: List[Dict[str, str]] = []
+        self.data: Dict[str, Any] = {}
 
 class ContextManager:
     """
@@ -6,23 +43,44 @@ class ContextManager:
 
     This class provides methods for storing, retrieving, and manipulating context
     information during Ono processing.
+
+    With a storage path, every context is persisted as an append-only JSON lines
+    log under ``<storage_path>/<project_hash>/``, so an update writes one line
+    instead of rewriting the whole store. Logs are only read when a context is
+    first used.
     """
 
-    def __init__(self):
+    def __init__(self, storage_path: Optional[str] = None, project_root: Optional[str] = None):
         """
         Initializes the ContextManager.
+
+        Args:
+            storage_path: The directory holding persisted contexts, or None to
+                keep contexts in memory only.
+            project_root: The project the contexts belong to. Defaults to the
+                current directory.
         """
         self.contexts: Dict[str, Dict[str, Any]] = {}
+        self._loaded: Dict[str, Context] = {}
+        self._lock = threading.RLock()
+
+        self.project_dir: Optional[str] = None
+        if storage_path:
+            root = os.path.abspath(project_root or os.getcwd())
+            project_hash = hashlib.sha256(root.encode("utf-8")).hexdigest()[:16]
+            self.project_dir = os.path.join(os.path.expanduser(storage_path), project_hash)
 
     def create_context(self, context_id: str) -> None:
         """
         Creates a new context with the given ID.
 
+        A path such as "system/monitoring" is forked from its parent "system",
+        which is created first if needed.
+
         Args:
             context_id: The ID of the new context.
         """
-        if context_id not in self.contexts:
-            self.contexts[context_id] = {}
+        self._load(context_id)
 
     def get_context(self, context_id: str) -> Dict[str, Any]:
         """
@@ -34,9 +92,7 @@ class ContextManager:
         Returns:
             The context as a dictionary.
         """
-        if context_id not in self.contexts:
-            self.create_context(context_id)
-        return self.contexts[context_id]
+        return self._load(context_id).data
 
     def update_context(self, context_id: str, data: Dict[str, Any]) -> None:
         """
@@ -46,8 +102,10 @@ class ContextManager:
             context_id: The ID of the context to update.
             data: A dictionary containing the data to update the context with.
         """
-        context = self.get_context(context_id)
-        context.update(data)
+        with self._lock:
+            context = self._load(context_id)
+            context.data.update(data)
+            self._append(context_id, {"op": "update", "data": data})
 
     def clear_context(self, context_id: str) -> None:
         """
@@ -56,8 +114,15 @@ class ContextManager:
         Args:
             context_id: The ID of the context to clear.
         """
-        if context_id in self.contexts:
-            self.contexts[context_id] = {}
+        with self._lock:
+            if not self._exists(context_id):
+                return
+            self._detach_forks(context_id)
+            context = self._load(context_id)
+            context.data.clear()
+            context.messages = []
+            context.parent, context.fork_point = None, 0
+            self._append(context_id, {"op": "clear"})
 
     def delete_context(self, context_id: str) -> None:
         """
@@ -66,5 +131,178 @@ class ContextManager:
         Args:
             context_id: The ID of the context to delete.
         """
-        if context_id in self.contexts:
-            del self.contexts[context_id]
\ No newline at end of file
+        with self._lock:
+            if self._exists(context_id):
+                self._detach_forks(context_id)
+            self._loaded.pop(context_id, None)
+            self.contexts.pop(context_id, None)
+            path = self._log_path(context_id)
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def fork_context(self, source_id: str, target_id: str) -> None:
+        """
+        Creates a new context branch sharing the history of an existing context.
+
+        Args:
+            source_id: The ID of the context to fork.
+            target_id: The ID of the new branch.
+        """
+        with self._lock:
+            fork_point = len(self.get_messages(source_id))
+            context = Context(target_id, parent=source_id, fork_point=fork_point)
+            self._register(context)
+            self._append(target_id, {"op": "create", "parent": source_id, "fork_point": fork_point,
+                                     "created_at": context.created_at})
+
+    def append_message(self, context_id: str, role: str, content: str) -> None:
+        """
+        Adds a message to the conversation history of a context.
+
+        Args:
+            context_id: The ID of the context.
+            role: The speaker, e.g. "user" or "assistant".
+            content: The message text.
+        """
+        with self._lock:
+            context = self._load(context_id)
+            message = {"role": role, "content": content}
+            context.messages.append(message)
+            self._append(context_id, {"op": "message", **message})
+
+    def get_messages(self, context_id: str) -> List[Dict[str, str]]:
+        """
+        Gets the full conversation history of a context, including the history
+        shared with the contexts it was forked from.
+
+        Args:
+            context_id: The ID of the context.
+
+        Returns:
+            The messages, oldest first.
+        """
+        with self._lock:
+            context = self._load(context_id)
+            if context.parent is None:
+                return list(context.messages)
+            return self.get_messages(context.parent)[:context.fork_point] + context.messages
+
+    def list_contexts(self) -> List[str]:
+        """
+        Lists the IDs of all known contexts without loading them.
+        """
+        names = set(self._loaded)
+        if self.project_dir and os.path.isdir(self.project_dir):
+            names.update(unquote(name[:-len(".jsonl")]) for name in os.listdir(self.project_dir)
+                         if name.endswith(".jsonl"))
+        return sorted(names)
+
+    def _load(self, context_id: str) -> Context:
+        """
+        Gets a context, reading its log on first use or creating it if it doesn't exist.
+        """
+        with self._lock:
+            if context_id in self._loaded:
+                return self._loaded[context_id]
+
+            path = self._log_path(context_id)
+            if path and os.path.exists(path):
+                context = self._read_log(context_id, path)
+                self._register(context)
+                return context
+
+            if "/" in context_id:
+                self.fork_context(context_id.rsplit("/", 1)[0], context_id)
+                return self._loaded[context_id]
+
+            context = Context(context_id)
+            self._register(context)
+            self._append(context_id, {"op": "create", "parent": None, "fork_point": 0,
+                                      "created_at": context.created_at})
+            return context
+
+    def _read_log(self, context_id: str, path: str) -> Context:
+        """
+        Rebuilds a context by replaying its log.
+        """
+        context = Context(context_id)
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A torn final line from an interrupted write
+                op = record.get("op")
+                if op == "create":
+                    context.parent = record.get("parent")
+                    context.fork_point = record.get("fork_point", 0)
+                    context.created_at = record.get("created_at", context.created_at)
+                elif op == "message":
+                    context.messages.append({"role": record["role"], "content": record["content"]})
+                elif op == "update":
+                    context.data.update(record.get("data", {}))
+                elif op == "clear":
+                    context.data.clear()
+                    context.messages = []
+                    context.parent, context.fork_point = None, 0
+                elif op == "detach":
+                    context.messages = record.get("messages", []) + context.messages
+                    context.parent, context.fork_point = None, 0
+        return context
+
+    def _detach_forks(self, context_id: str) -> None:
+        """
+        Copies the history each fork of a context shares with it into the
+        fork, before that history is cleared or deleted. Every known context
+        is loaded to find the forks, which is fine for an operation this rare.
+        """
+        shared = self.get_messages(context_id)
+        for name in self.list_contexts():
+            fork = self._load(name) if name != context_id else None
+            if fork is None or fork.parent != context_id:
+                continue
+            prefix = shared[:fork.fork_point]
+            fork.messages = prefix + fork.messages
+            fork.parent, fork.fork_point = None, 0
+            self._append(name, {"op": "detach", "messages": prefix})
+
+    def _register(self, context: Context) -> None:
+        self._loaded[context.name] = context
+        self.contexts[context.name] = context.data
+
+    def _exists(self, context_id: str) -> bool:
+        path = self._log_path(context_id)
+        return context_id in self._loaded or bool(path and os.path.exists(path))
+
+    def _append(self, context_id: str, record: Dict[str, Any]) -> None:
+        """
+        Appends one record to a context's log, if contexts are persisted.
+        """
+        path = self._log_path(context_id)
+        if not path:
+            return
+        os.makedirs(self.project_dir, exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _log_path(self, context_id: str) -> Optional[str]:
+        if not self.project_dir:
+            return None
+        # Quoting keeps context paths like "../x" inside the project directory
+        return os.path.join(self.project_dir, quote(context_id, safe="") + ".jsonl")
+
+def format_history(messages: List[Dict[str, str]], prompt: str) -> str:
+    """
+    Prepends a conversation history to a prompt.
+
+    Args:
+        messages: The earlier messages of the context.
+        prompt: The new request.
+
+    Returns:
+        The prompt to send to the LLM.
+    """
+    if not messages:
+        return prompt
+    lines = [f"{message['role']}: {message['content']}" for message in messages]
+    return "\n".join(["Previous conversation:", *lines, "", prompt])
@@ -0,0 +1,314 @@
+"""
+This module contains the deduplication stage that lets matching blocks share
+one LLM call.
+
+Blocks asking the same question are common across the templates of a
+project, often with trivial differences in wording or whitespace. Each
+request is reduced to a key, and every request with the same key in a run
+(in one file or across the files of one batch) is answered by a single
+call. Answers are forgotten when the run ends, so deduplication never acts
+as a cache that outlives it. There are four levels:
+
+- ``off``: every block is sent.
+- ``exact`` (the default): prompts match when they differ only in
+  whitespace.
+- ``loose``: prompts also match when they differ in case or trailing
+  punctuation, which can change what some targets (like a shell command in
+  quotes) should produce.
+- ``fuzzy``: prompts also match when they are near-duplicates, found with a
+  MinHash index over character shingles of their canonical words. No
+  external service is involved.
+"""
+
+import json
+import random
+import re
+import threading
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+DEDUP_LEVELS = {"off": 0, "exact": 1, "loose": 2, "fuzzy": 3}
+DEFAULT_LEVEL = "exact"
+DEFAULT_THRESHOLD = 0.8  # Minimum Jaccard similarity of the shingles of fuzzy matches
+
+NUM_PERMUTATIONS = 64
+BANDS = 16  # Rows per band = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 3
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x0e0)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+_WORD = re.compile(r"[a-z0-9]+")
+_POSSESSIVE = re.compile(r"['’]s\b")
+
+# Words that rarely change what a prompt asks for
+STOPWORDS = frozenset(
+    "a an the of for to in on at by from with and or my our your their its is are be this that it me us please"
+    .split()
+)
+
+# Common abbreviations, mapped to the word they stand for
+ABBREVIATIONS = {
+    "dir": "directory", "folder": "directory", "tmp": "temp", "temporary": "temp", "cfg": "configuration",
+    "config": "configuration", "conf": "configuration", "env": "environment", "pkg": "package",
+    "repo": "repository", "db": "database", "info": "information", "num": "number", "max": "maximum",
+    "min": "minimum", "app": "application", "arg": "argument", "param": "parameter", "str": "string",
+    "proc": "process", "usr": "user", "cmd": "command", "msg": "message", "err": "error",
+}
+
+def normalize(prompt: str, loose: bool = False) -> str:
+    """
+    Normalizes a prompt for matching: runs of whitespace are ignored, and
+    with ``loose`` also case and trailing punctuation.
+    """
+    if not loose:
+        return " ".join(prompt.split())
+    return " ".join(prompt.casefold().split()).rstrip(".?! ")
+
+def canonical_words(prompt: str) -> List[str]:
+    """
+    Reduces a prompt to its canonical words for fuzzy matching, without
+    possessives, stopwords, abbreviations or plural endings.
+    """
+    words = []
+    for word in _WORD.findall(_POSSESSIVE.sub("", prompt.casefold())):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(ABBREVIATIONS.get(word, word))
+    return words
+
+@dataclass
+class DedupMetrics:
+    """
+    Counts the LLM calls saved by deduplication.
+    """
+    blocks: int = 0  # Blocks that went through deduplication
+    shared: int = 0  # Blocks answered by another block's call
+    fuzzy: int = 0  # Of those, blocks matched as near-duplicates
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self) -> None:
+        """
+        Records one block.
+        """
+        with self._lock:
+            self.blocks += 1
+
+    def record_shared(self, fuzzy: bool = False) -> None:
+        """
+        Records a block that was answered with another block's answer.
+        """
+        with self._lock:
+            self.shared += 1
+            if fuzzy:
+                self.fuzzy += 1
+
+    @property
+    def calls_saved(self) -> int:
+        return self.shared
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "blocks": self.blocks,
+            "shared": self.shared,
+            "fuzzy": self.fuzzy,
+            "calls_saved": self.calls_saved,
+        }
+
+class MinHashIndex:
+    """
+    Finds near-duplicate texts with MinHash signatures and locality-sensitive
+    hashing.
+
+    Each text is reduced to character shingles of its canonical words. Texts
+    sharing any band of their signature are candidates, which are then
+    compared on their actual shingles.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        """
+        Initializes the MinHashIndex.
+
+        Args:
+            threshold: The minimum Jaccard similarity of a match.
+        """
+        self.threshold = threshold
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        self._entries: List[Tuple[str, FrozenSet[str], FrozenSet[str]]] = []  # (key, shingles, numbers)
+
+    def match(self, key: str, text: str) -> str:
+        """
+        Finds the key of the most similar text added so far, or adds ``text``
+        under ``key`` if there is none.
+
+        Numbers must match exactly, so "python 3.11" and "python 3.12" are
+        never merged.
+
+        Returns:
+            The key of the matching text, or ``key`` itself.
+        """
+        words = canonical_words(text)
+        shingles = _shingles(" ".join(words))
+        numbers = frozenset(word for word in words if word.isdigit())
+        signature = _signature(shingles)
+        rows = NUM_PERMUTATIONS // BANDS
+        bands = [(band, tuple(signature[band * rows:(band + 1) * rows])) for band in range(BANDS)]
+
+        best, best_similarity = None, self.threshold
+        seen = set()
+        for band in bands:
+            for index in self._buckets.get(band, ()):
+                if index in seen:
+                    continue
+                seen.add(index)
+                other_key, other_shingles, other_numbers = self._entries[index]
+                if other_numbers != numbers:
+                    continue
+                similarity = len(shingles & other_shingles) / len(shingles | other_shingles)
+                if similarity >= best_similarity:
+                    best, best_similarity = other_key, similarity
+        if best is not None:
+            return best
+
+        index = len(self._entries)
+        self._entries.append((key, shingles, numbers))
+        for band in bands:
+            self._buckets.setdefault(band, []).append(index)
+        return key
+
+class Deduplicator:
+    """
+    Shares one LLM call among the requests of a run that ask the same thing.
+
+    Requests only match when they also share a model, parameters, context,
+    format and answer limits. The answer of each call is kept for the rest of
+    the run, so a duplicate that comes later, in the same file or another
+    one, is answered without a call. A run lasts from ``begin`` to the
+    matching ``end``; runs that overlap, such as the files of a batch, share
+    their answers, and once the last one ends every answer is forgotten.
+    """
+
+    def __init__(self, level: Any = DEFAULT_LEVEL, threshold: float = DEFAULT_THRESHOLD):
+        """
+        Initializes the Deduplicator.
+
+        Args:
+            level: "off", "exact", "loose" or "fuzzy" (or 0 to 3).
+            threshold: The minimum similarity of fuzzy matches, from 0 to 1.
+        """
+        if isinstance(level, str):
+            if level.lower() not in DEDUP_LEVELS:
+                raise ValueError(f"Unknown deduplication level: {level}")
+            level = DEDUP_LEVELS[level.lower()]
+        self.level = int(level)  # YAML reads a bare "off" as False
+        self.threshold = float(threshold)
+        self.metrics = DedupMetrics()
+        self._answers: Dict[str, Future] = {}
+        self._indexes: Dict[str, MinHashIndex] = {}
+        self._runs = 0  # Runs begun and not yet ended
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> "Deduplicator":
+        """
+        Creates a Deduplicator from the ``dedup`` section of an OnoConfig.
+        """
+        return cls(
+            level=config.get("dedup.level", DEFAULT_LEVEL),
+            threshold=config.get("dedup.threshold", DEFAULT_THRESHOLD),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.level > 0
+
+    def begin(self) -> None:
+        """
+        Starts a run, whose requests share their answers.
+        """
+        with self._lock:
+            self._runs += 1
+
+    def end(self) -> None:
+        """
+        Ends a run. When no other run is still going, every answer and fuzzy
+        index is forgotten, so none of them can outlive the response cache's
+        settings (``cache.enabled``, ``cache.ttl``).
+        """
+        with self._lock:
+            self._runs = max(0, self._runs - 1)
+            if not self._runs:
+                self._answers.clear()
+                self._indexes.clear()
+
+    @contextmanager
+    def run(self) -> Iterator[None]:
+        """
+        Scopes the answers shared by the requests made inside to one run.
+        """
+        self.begin()
+        try:
+            yield
+        finally:
+            self.end()
+
+    def claim(self, prompt: str, scope: Any) -> Tuple[Optional[Future], bool, bool]:
+        """
+        Looks up the call answering a prompt, claiming it if there isn't one yet.
+
+        A caller that uses another call's answer records that with
+        ``metrics.record_shared``, since it may still have to make its own
+        call if that one fails.
+
+        Args:
+            prompt: The prompt sent to the LLM.
+            scope: Everything else that must match, such as the model and
+                parameters. Must be JSON serializable.
+
+        Returns:
+            The future for the answer, or None if deduplication is off,
+            whether the caller claimed it and so must make the call and set
+            the future's result, and whether it matched as a near-duplicate.
+        """
+        if not self.enabled:
+            return None, False, False
+        scope_key = json.dumps(scope, sort_keys=True, default=str)
+        key = scope_key + "\0" + normalize(prompt, loose=self.level >= DEDUP_LEVELS["loose"])
+        with self._lock:
+            fuzzy = False
+            if key not in self._answers and self.level >= DEDUP_LEVELS["fuzzy"]:
+                index = self._indexes.setdefault(scope_key, MinHashIndex(self.threshold))
+                matched = index.match(key, prompt)
+                fuzzy = matched != key
+                key = matched
+            future = self._answers.get(key)
+            claimed = future is None
+            if claimed:
+                future = self._answers[key] = Future()
+                future.set_running_or_notify_cancel()
+        self.metrics.record()
+        return future, claimed, fuzzy
+
+    def release(self, future: Future) -> None:
+        """
+        Forgets a claim whose call failed, so the next matching request makes
+        its own call.
+        """
+        with self._lock:
+            for key in [key for key, claim in self._answers.items() if claim is future]:
+                del self._answers[key]
+
+def _shingles(text: str) -> FrozenSet[str]:
+    padded = f" {text} "
+    return frozenset(padded[i:i + SHINGLE_SIZE] for i in range(max(1, len(padded) - SHINGLE_SIZE + 1)))
+
+def _signature(shingles: FrozenSet[str]) -> List[int]:
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+    return [min((a * value + b) % _PRIME for value in hashes) for a, b in _PERMUTATIONS]
@@ -1,5 +1,226 @@
 """
 This module contains the demo server for Ono.
+
+``MockLLMServer`` is a local stand-in for an OpenAI-compatible completion
+endpoint. It answers every prompt with deterministic filler text after a
+configurable delay, so templates can be rendered and benchmarked without a
+network or a model. Run it on its own with ``python -m ono.demo.server``.
 """
 
-# TODO: Implement the demo server
\ No newline at end of file
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple, Union
+
+from ono.batching import BATCH_INSTRUCTIONS
+
+WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel")
+
+class MockLLMServer:
+    """
+    A local OpenAI-compatible completion server with simulated latency and errors.
+
+    Answers use Ono's ``{"text": ...}`` shape together with the OpenAI
+    ``choices`` shape, and are sent as server-sent events when the request
+    asks for ``stream``. Ono batch prompts get a JSON array with one answer
+    per request.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, response_size: Union[int, Tuple[int, int]] = 16,
+                 token_delay: float = 0.0, seed: Optional[int] = None):
+        """
+        Initializes the MockLLMServer.
+
+        Args:
+            host: The interface to listen on.
+            port: The port to listen on, or 0 for any free port.
+            latency: Seconds before each response starts.
+            jitter: Up to this many seconds are added to the latency at random.
+            error_rate: The fraction of requests answered with a 503.
+            response_size: The answer length in characters, or a (min, max) range.
+            token_delay: Seconds between streamed events.
+            seed: Seeds the random latency, errors and sizes for repeatable runs.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.response_size = response_size
+        self.token_delay = token_delay
+        self.stats: Dict[str, int] = {"requests": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self.reply(400, {"error": "request body is not JSON"})
+                    return
+                delay, fail, size = server._draw()
+                with server._lock:
+                    server.stats["requests"] += 1
+                    server.stats["in_flight"] += 1
+                    server.stats["max_in_flight"] = max(server.stats["max_in_flight"], server.stats["in_flight"])
+                try:
+                    time.sleep(delay)
+                    if fail:
+                        with server._lock:
+                            server.stats["errors"] += 1
+                        self.reply(503, {"error": "simulated failure"}, {"Retry-After": "0"})
+                        return
+                    text = server.answer(str(body.get("prompt", "")), size)
+                    if body.get("stream"):
+                        self.stream(text)
+                    else:
+                        self.reply(200, {"text": text, "choices": [{"index": 0, "text": text, "finish_reason": "stop"}]})
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server._lock:
+                        server.stats["in_flight"] -= 1
+
+            def reply(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def stream(self, text: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                pieces = re.findall(r"\S+\s*|\s+", text) or [""]
+                events = [{"choices": [{"index": 0, "text": piece}]} for piece in pieces]
+                for i, event in enumerate(events):
+                    self.chunk(f"data: {json.dumps(event)}\n\n")
+                    if server.token_delay and i < len(events) - 1:
+                        time.sleep(server.token_delay)
+                self.chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def chunk(self, text: str):
+                data = text.encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                pass  # Clients hang up early on purpose, e.g. once a streamed answer is complete
+
+        self.httpd = Server((host, port), Handler)
+
+    @property
+    def url(self) -> str:
+        """
+        The completion endpoint, suitable for ``ONO_API_URL``.
+        """
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/completions"
+
+    def start(self) -> "MockLLMServer":
+        """
+        Starts serving on a background thread.
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops serving and closes the listening socket.
+        """
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def answer(self, prompt: str, size: int) -> str:
+        """
+        Builds the deterministic answer to a prompt.
+
+        Args:
+            prompt: The prompt sent by the client.
+            size: The answer length in characters.
+
+        Returns:
+            A single line of filler text derived from the prompt, or a JSON
+            array of such lines for an Ono batch prompt.
+        """
+        if prompt.startswith(BATCH_INSTRUCTIONS):
+            requests = re.findall(r"^\d+\. (.*)$", prompt[len(BATCH_INSTRUCTIONS):], flags=re.MULTILINE)
+            return json.dumps([self.answer(json.loads(request), size) for request in requests])
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        head = f"value-{digest[:8]}"
+        filler = " ".join(WORDS[int(char, 16) % len(WORDS)] for char in digest)
+        text = head
+        while len(text) < size:
+            text += " " + filler
+        return text[:max(size, len(head))]
+
+    def _draw(self) -> Tuple[float, bool, int]:
+        """
+        Draws the delay, failure and answer size for one request.
+        """
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self._random.random() < self.error_rate
+            if isinstance(self.response_size, (tuple, list)):
+                size = self._random.randint(*self.response_size)
+            else:
+                size = int(self.response_size)
+        return delay, fail, size
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI-compatible LLM server for Ono.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Random extra seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 503")
+    parser.add_argument("--response-size", type=int, default=16, help="Answer length in characters")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed events")
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, response_size=args.response_size,
+                           token_delay=args.token_delay)
+    print(f"Mock LLM server listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
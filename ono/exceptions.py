@@ -4,6 +4,12 @@ class OnoError(Exception):
     """
     pass
 
+class ParseError(OnoError):
+    """
+    Raised when a template can't be parsed.
+    """
+    pass
+
 class ConfigError(OnoError):
     """
     Raised when there is an error with the Ono configuration.
@@ -16,6 +22,12 @@ class LLMError(OnoError):
     """
     pass
 
+class DeadlineExceeded(LLMError):
+    """
+    Raised when an LLM call or a render doesn't finish before its deadline.
+    """
+    pass
+
 class ValidationError(OnoError):
     """
     Raised when there is a validation error.
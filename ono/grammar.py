@@ -0,0 +1,98 @@
+"""
+This module contains the grammar-based parser for Ono templates.
+
+``GrammarParser`` parses every delimiter pair from the specification
+(``<?ono ?>``, ``"?ono ?"``, ``'?ono ?'``, ``{?ono ?}``, ``[?ono ?]`` and
+``🐊?ono 🦋``) with the LALR grammar in ``grammar.lark``. It needs the
+optional ``lark`` dependency. The grammar is compiled once per process, and
+lark caches the compiled parser on disk, so later processes load it instead
+of building it again.
+"""
+
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+
+from ono.exceptions import ParseError
+from ono.parser import Kind, OnoParser, ParsedItem
+
+GRAMMAR_PATH = Path(__file__).with_name("grammar.lark")
+
+GRAMMAR_INSTALL_HINT = "GrammarParser requires lark. Install it with: pip install 'ono-preprocessor[grammar]'"
+
+@lru_cache(maxsize=None)
+def load_grammar():
+    """
+    Builds the LALR parser for the Ono grammar, once per process.
+
+    Returns:
+        A ``lark.Lark`` instance. Parsing with it is thread-safe.
+    """
+    try:
+        from lark import Lark
+    except ImportError as e:
+        raise ImportError(GRAMMAR_INSTALL_HINT) from e
+    return Lark(GRAMMAR_PATH.read_text(encoding="utf-8"), parser="lalr", lexer="basic", cache=True)
+
+class GrammarParser(OnoParser):
+    """
+    Parses Ono templates with the Lark grammar, accepting every delimiter pair.
+
+    The parse tree has the same shape as ``OnoParser.parse`` output, so the
+    two are interchangeable. Unlike OnoParser, which leaves an unclosed block
+    as text, GrammarParser reports it as a ParseError.
+    """
+
+    def __init__(self):
+        """
+        Initializes the GrammarParser, building the grammar on first use.
+        """
+        super().__init__()
+        self.lark = load_grammar()
+
+    def parse(self, text: str) -> List[ParsedItem]:
+        """
+        Parses the given text and returns a list of ParsedItem objects.
+
+        Raises:
+            ParseError: If a block isn't closed, with the line and column of
+                the problem.
+        """
+        from lark import Tree
+        from lark.exceptions import UnexpectedInput
+
+        try:
+            tree = self.lark.parse(text)
+        except UnexpectedInput as e:
+            raise ParseError(f"Unmatched Ono delimiter at line {e.line}, column {e.column}") from e
+
+        root: List[ParsedItem] = []
+        # Each frame is (remaining children, items built so far, the block being built or None)
+        stack = [(iter(tree.children), root, None)]
+        while stack:
+            nodes, items, block = stack[-1]
+            for node in nodes:
+                if isinstance(node, Tree):
+                    stack.append((iter(node.children[1:-1]), [], node))
+                    break
+                self._add_text(items, text, node.start_pos, node.end_pos)
+            else:
+                stack.pop()
+                if block is not None:
+                    opener, closer = block.children[0], block.children[-1]
+                    stack[-1][1].append(self._make_block(text, opener.start_pos, opener.end_pos,
+                                                         closer.start_pos, closer.end_pos, items))
+
+        for block_id, item in enumerate(self._iter_blocks(root)):
+            item.block_id = block_id
+
+        return root
+
+    def _add_text(self, items: List[ParsedItem], text: str, start: int, end: int) -> None:
+        """
+        Appends a text token, extending the previous item if that is adjacent text.
+        """
+        if items and items[-1].kind is Kind.TEXT and items[-1].end == start:
+            items[-1].end = items[-1].content_end = end
+        else:
+            items.append(ParsedItem(Kind.TEXT, source=text, start=start, end=end))
@@ -1,52 +1,490 @@
+import asyncio
+import email.utils
+import json
 import os
-import requests
-from typing import Optional, Dict, Any
+import random
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Optional, Dict, Any, AsyncIterator, Iterator, List, Union, Tuple
+from ono.exceptions import DeadlineExceeded, LLMError
 
-class LLMClient:
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # Seconds before the first retry
+DEFAULT_MAX_BACKOFF = 30.0
+
+# Retries made by the most recent call in the current thread or task
+_last_retries: ContextVar[int] = ContextVar("ono_last_retries", default=0)
+
+def last_retries() -> int:
+    """
+    Gets the number of retries the most recent LLM call in this thread (or
+    asyncio task) needed.
+    """
+    return _last_retries.get()
+
+ASYNC_INSTALL_HINT = "AsyncLLMClient requires httpx. Install it with: pip install 'ono-preprocessor[async]'"
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def limit_answer(text: str, single_line: bool = False, max_chars: Optional[int] = None) -> str:
+    """
+    Cuts an answer down the same way ``stream_text`` stops early, so streamed
+    and buffered responses agree.
+    """
+    text, _ = AnswerLimit(single_line, max_chars).take(text)
+    return text
+
+class AnswerLimit:
+    """
+    Decides when a streamed answer is complete.
+
+    A single-line answer ends at the first newline after any content (leading
+    newlines are dropped), and ``max_chars`` guards against rambling answers.
+    """
+
+    def __init__(self, single_line: bool = False, max_chars: Optional[int] = None):
+        self.single_line = single_line
+        self.max_chars = max_chars
+        self.length = 0
+
+    def take(self, piece: str) -> Tuple[str, bool]:
+        """
+        Takes the next piece of a streamed answer.
+
+        Returns:
+            The part of the piece to keep and whether the answer is complete.
+        """
+        done = False
+        if self.single_line:
+            if self.length == 0:
+                piece = piece.lstrip("\r\n")
+            end = piece.find("\n")
+            if end != -1:
+                piece, done = piece[:end].rstrip("\r"), True
+        if self.max_chars is not None and self.length + len(piece) >= self.max_chars:
+            piece, done = piece[:self.max_chars - self.length], True
+        self.length += len(piece)
+        return piece, done
+
+class BaseLLMClient:
+    """
+    The settings and helpers shared by the synchronous and asynchronous clients.
+    """
+
+    def __init__(self, api_url: Optional[str] = None, api_key: Optional[str] = None, config=None,
+                 timeout: Optional[Union[float, Tuple[float, float]]] = None, max_retries: Optional[int] = None,
+                 pool_size: Optional[int] = None):
+        """
+        Initializes the client settings.
+
+        Args:
+            api_url: The URL of the LLM API.
+            api_key: The API key for accessing the LLM API.
+            config: An OnoConfig providing defaults from its ``llm`` section.
+            timeout: Seconds to wait for a response, or a (connect, read) tuple.
+            max_retries: How many times a failed request is retried.
+            pool_size: The maximum number of pooled connections to the API.
+        """
+        def setting(key: str, default: Any = None) -> Any:
+            return config.get(f"llm.{key}", default) if config is not None else default
+
+        self.api_url = api_url or os.environ.get("ONO_API_URL") or setting("api_url")
+        self.api_key = api_key or os.environ.get("ONO_API_KEY") or setting("api_key")
+
+        if not self.api_url:
+            raise ValueError("LLM API URL is not set. Please set the ONO_API_URL environment variable or pass it to the LLMClient constructor.")
+
+        self.timeout = self._parse_timeout(timeout if timeout is not None else setting("timeout", DEFAULT_TIMEOUT))
+        self.max_retries = int(max_retries if max_retries is not None else setting("max_retries", DEFAULT_MAX_RETRIES))
+        self.backoff = float(setting("backoff", DEFAULT_BACKOFF))
+        self.max_backoff = float(setting("max_backoff", DEFAULT_MAX_BACKOFF))
+        self.stream = bool(setting("stream", False))
+        self.pool_size = int(pool_size or setting("pool_size", DEFAULT_POOL_SIZE))
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def _event_text(self, event: Dict[str, Any]) -> str:
+        """
+        Extracts the text from a stream event, in Ono's own shape or the
+        OpenAI completion and chat completion shapes.
+        """
+        if "text" in event:
+            return event["text"] or ""
+        choice = (event.get("choices") or [{}])[0]
+        return choice.get("text") or (choice.get("delta") or {}).get("content") or ""
+
+    def _parse_event(self, lines: List[str]) -> Optional[str]:
+        """
+        Reads the text of one server-sent event from its data lines, or None
+        for the ``[DONE]`` event that ends the stream.
+        """
+        payload = "\n".join(lines)
+        if payload.strip() == "[DONE]":
+            return None
+        try:
+            return self._event_text(json.loads(payload))
+        except ValueError as e:
+            raise LLMError(f"LLM API sent a malformed stream event: {payload[:200]}") from e
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """
+        Computes a "full jitter" exponential backoff delay for the given attempt.
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def _retry_after(self, response: Any) -> Optional[float]:
+        """
+        Reads the delay requested by a Retry-After header, in seconds or as an HTTP date.
+        """
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0.0), self.max_backoff)
+
+    def _parse_timeout(self, timeout: Any) -> Union[float, Tuple[float, float]]:
+        """
+        Accepts a number of seconds, a (connect, read) pair or a mapping with
+        ``connect`` and ``read`` keys.
+        """
+        if isinstance(timeout, dict):
+            return (float(timeout.get("connect", DEFAULT_TIMEOUT)), float(timeout.get("read", DEFAULT_TIMEOUT)))
+        if isinstance(timeout, (list, tuple)):
+            return (float(timeout[0]), float(timeout[1]))
+        return float(timeout)
+
+class LLMClient(BaseLLMClient):
     """
     A client for interacting with an LLM (Language Model) API.
 
     This class provides methods for sending requests to an LLM API and
-    retrieving responses.
+    retrieving responses. Requests share a pooled HTTP session, so connections
+    are kept alive between blocks, and failed requests are retried with
+    jittered exponential backoff.
+
+    With ``llm.stream`` enabled, responses are read as server-sent events and
+    the connection is dropped as soon as the answer is complete.
     """
 
-    def __init__(self, api_url: Optional[str] = None, api_key: Optional[str] = None):
+    def __init__(self, api_url: Optional[str] = None, api_key: Optional[str] = None, config=None,
+                 timeout: Optional[Union[float, Tuple[float, float]]] = None, max_retries: Optional[int] = None,
+                 pool_size: Optional[int] = None):
         """
         Initializes the LLMClient.
 
         Args:
             api_url: The URL of the LLM API.
             api_key: The API key for accessing the LLM API.
+            config: An OnoConfig providing defaults from its ``llm`` section.
+            timeout: Seconds to wait for a response, or a (connect, read) tuple.
+            max_retries: How many times a failed request is retried.
+            pool_size: The maximum number of pooled connections to the API.
         """
-        self.api_url = api_url or os.environ.get("ONO_API_URL")
-        self.api_key = api_key or os.environ.get("ONO_API_KEY")
+        # Imported here so that runs without any blocks never load the HTTP stack
+        import requests
+        from requests.adapters import HTTPAdapter
 
-        if not self.api_url:
-            raise ValueError("LLM API URL is not set. Please set the ONO_API_URL environment variable or pass it to the LLMClient constructor.")
+        super().__init__(api_url, api_key, config, timeout, max_retries, pool_size)
+        self.session = requests.Session()
+        self._transport_errors = (requests.ConnectionError, requests.Timeout)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self.headers)
 
-    def generate_text(self, prompt: str, model: Optional[str] = None, **kwargs) -> str:
+    def generate_text(self, prompt: str, model: Optional[str] = None, single_line: bool = False,
+                      max_chars: Optional[int] = None, **kwargs) -> str:
         """
         Generates text using the LLM API.
 
         Args:
             prompt: The prompt to send to the LLM API.
             model: The model to use for generating text.
+            single_line: Keep only the first line of the answer.
+            max_chars: Keep at most this many characters of the answer.
             **kwargs: Additional parameters to pass to the LLM API.
 
         Returns:
             The generated text.
+
+        Raises:
+            LLMError: If the request still fails after all retries.
         """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
+        if self.stream:
+            return "".join(self.stream_text(prompt, model, single_line=single_line, max_chars=max_chars, **kwargs))
+
+        data = {
+            "prompt": prompt,
+            "model": model,
+            **kwargs,
         }
+
+        response = self._post(data)
+        return limit_answer(response.json()["text"], single_line, max_chars)
+
+    def stream_text(self, prompt: str, model: Optional[str] = None, single_line: bool = False,
+                    max_chars: Optional[int] = None, **kwargs) -> Iterator[str]:
+        """
+        Generates text using the LLM API, yielding it as it arrives.
+
+        The request asks for a server-sent event stream. Endpoints that answer
+        with a plain JSON body are handled too.
+
+        Args:
+            prompt: The prompt to send to the LLM API.
+            model: The model to use for generating text.
+            single_line: Stop at the end of the first line of the answer.
+            max_chars: Stop after this many characters of the answer.
+            **kwargs: Additional parameters to pass to the LLM API.
+
+        Yields:
+            Pieces of the generated text.
+
+        Raises:
+            LLMError: If the request still fails after all retries.
+        """
         data = {
             "prompt": prompt,
             "model": model,
             **kwargs,
+            "stream": True,
         }
+        limit = AnswerLimit(single_line, max_chars)
+
+        # Closing the response early drops the connection, which ends the generation
+        with self._post(data, stream=True) as response:
+            if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                yield limit.take(response.json()["text"])[0]
+                return
+            for text in self._events(response):
+                piece, done = limit.take(text)
+                if piece:
+                    yield piece
+                if done:
+                    return
+
+    def close(self) -> None:
+        """
+        Closes the pooled connections.
+        """
+        self.session.close()
+
+    def _events(self, response: "requests.Response") -> Iterator[str]:
+        """
+        Reads the text carried by each event of a server-sent event stream,
+        until the stream ends or sends ``[DONE]``.
+        """
+        lines = []
+        for raw in response.iter_lines(chunk_size=None):
+            line = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+            if line.startswith("data:"):
+                lines.append(line[5:].lstrip(" "))
+                continue
+            if line or not lines:
+                continue  # Comments, other fields and keep-alive blank lines
+            text, lines = self._parse_event(lines), []
+            if text is None:
+                return
+            yield text
+
+    def _post(self, data: Dict[str, Any], stream: bool = False) -> "requests.Response":
+        """
+        Posts a request to the API, retrying connection errors, timeouts and
+        retryable status codes.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.api_url, json=data, timeout=self.timeout, stream=stream)
+            except self._transport_errors as e:
+                if attempt == self.max_retries:
+                    raise LLMError(f"LLM API request failed after {attempt + 1} attempts: {e}") from e
+                delay = self._backoff_delay(attempt)
+            else:
+                if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    delay = self._retry_after(response)
+                    if delay is None:
+                        delay = self._backoff_delay(attempt)
+                    response.close()
+                elif response.status_code >= 400:
+                    raise LLMError(f"LLM API returned {response.status_code}: {response.text[:200]}")
+                else:
+                    _last_retries.set(attempt)
+                    return response
+            time.sleep(delay)
+
+        raise LLMError("LLM API request failed")  # Not reached; the loop returns or raises
+
+class AsyncLLMClient(BaseLLMClient):
+    """
+    An asyncio client for the LLM API, for embedding Ono in async services.
+
+    It takes the same settings as LLMClient and keeps its own connection pool.
+    Every call can be given a deadline, and cancelling the awaiting task
+    aborts the request. Requires the optional ``httpx`` dependency.
+    """
+
+    def __init__(self, api_url: Optional[str] = None, api_key: Optional[str] = None, config=None,
+                 timeout: Optional[Union[float, Tuple[float, float]]] = None, max_retries: Optional[int] = None,
+                 pool_size: Optional[int] = None, deadline: Optional[float] = None):
+        """
+        Initializes the AsyncLLMClient.
+
+        Args:
+            api_url: The URL of the LLM API.
+            api_key: The API key for accessing the LLM API.
+            config: An OnoConfig providing defaults from its ``llm`` section.
+            timeout: Seconds to wait for a response, or a (connect, read) tuple.
+            max_retries: How many times a failed request is retried.
+            pool_size: The maximum number of pooled connections to the API.
+            deadline: The default number of seconds a call may take, retries
+                included. Defaults to ``llm.deadline``, or no deadline.
+        """
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError(ASYNC_INSTALL_HINT) from e
 
-        response = requests.post(self.api_url, headers=headers, json=data)
-        response.raise_for_status()  # Raise an exception for bad status codes
+        super().__init__(api_url, api_key, config, timeout, max_retries, pool_size)
+        self.deadline = deadline if deadline is not None else (config.get("llm.deadline") if config is not None else None)
+        connect, read = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+        self.session = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+        self._transport_errors = (httpx.TransportError,)
+
+    async def generate_text(self, prompt: str, model: Optional[str] = None, single_line: bool = False,
+                            max_chars: Optional[int] = None, deadline: Optional[float] = None, **kwargs) -> str:
+        """
+        Generates text using the LLM API.
+
+        Args:
+            prompt: The prompt to send to the LLM API.
+            model: The model to use for generating text.
+            single_line: Keep only the first line of the answer.
+            max_chars: Keep at most this many characters of the answer.
+            deadline: Seconds the call may take, overriding the client default.
+            **kwargs: Additional parameters to pass to the LLM API.
+
+        Returns:
+            The generated text.
+
+        Raises:
+            LLMError: If the request still fails after all retries.
+            DeadlineExceeded: If the call doesn't finish before its deadline.
+        """
+        async def generate() -> Tuple[str, int]:
+            if self.stream:
+                pieces = [piece async for piece in self.stream_text(prompt, model, single_line=single_line,
+                                                                    max_chars=max_chars, **kwargs)]
+                return "".join(pieces), last_retries()
+            response = await self._post({"prompt": prompt, "model": model, **kwargs})
+            return limit_answer(response.json()["text"], single_line, max_chars), last_retries()
+
+        # The deadline may run the call in its own task, so carry its retry count out
+        text, retries = await self._with_deadline(generate(), deadline)
+        _last_retries.set(retries)
+        return text
+
+    async def stream_text(self, prompt: str, model: Optional[str] = None, single_line: bool = False,
+                          max_chars: Optional[int] = None, **kwargs) -> AsyncIterator[str]:
+        """
+        Generates text using the LLM API, yielding it as it arrives.
+
+        Works like ``LLMClient.stream_text``. Wrap the iteration in
+        ``asyncio.timeout`` to bound it.
+
+        Yields:
+            Pieces of the generated text.
+        """
+        data = {
+            "prompt": prompt,
+            "model": model,
+            **kwargs,
+            "stream": True,
+        }
+        limit = AnswerLimit(single_line, max_chars)
+
+        response = await self._post(data, stream=True)
+        try:
+            if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                await response.aread()
+                yield limit.take(response.json()["text"])[0]
+                return
+            lines: List[str] = []
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    lines.append(line[5:].lstrip(" "))
+                    continue
+                if line or not lines:
+                    continue
+                text, lines = self._parse_event(lines), []
+                if text is None:
+                    return
+                piece, done = limit.take(text)
+                if piece:
+                    yield piece
+                if done:
+                    return
+        finally:
+            await response.aclose()
+
+    async def aclose(self) -> None:
+        """
+        Closes the pooled connections.
+        """
+        await self.session.aclose()
+
+    async def _with_deadline(self, call, deadline: Optional[float]):
+        deadline = deadline if deadline is not None else self.deadline
+        if deadline is None:
+            return await call
+        try:
+            return await asyncio.wait_for(call, deadline)
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceeded(f"LLM call did not finish within {deadline}s") from e
+
+    async def _post(self, data: Dict[str, Any], stream: bool = False):
+        """
+        Posts a request to the API, retrying connection errors, timeouts and
+        retryable status codes.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                request = self.session.build_request("POST", self.api_url, json=data)
+                response = await self.session.send(request, stream=stream)
+            except self._transport_errors as e:
+                if attempt == self.max_retries:
+                    raise LLMError(f"LLM API request failed after {attempt + 1} attempts: {e}") from e
+                delay = self._backoff_delay(attempt)
+            else:
+                if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    delay = self._retry_after(response)
+                    if delay is None:
+                        delay = self._backoff_delay(attempt)
+                    await response.aclose()
+                elif response.status_code >= 400:
+                    body = (await response.aread()).decode("utf-8", "replace")
+                    await response.aclose()
+                    raise LLMError(f"LLM API returned {response.status_code}: {body[:200]}")
+                else:
+                    _last_retries.set(attempt)
+                    return response
+            await asyncio.sleep(delay)
 
-        return response.json()["text"]
\ No newline at end of file
+        raise LLMError("LLM API request failed")  # Not reached; the loop returns or raises
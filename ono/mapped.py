@@ -0,0 +1,162 @@
+"""
+This module contains the memory-mapped input path for large templates.
+
+A template is mapped into memory rather than read, and the delimiter scanner
+searches the mapped bytes directly. Only the Ono blocks are decoded into
+``str``; the passthrough text between them is copied from the input file to
+the output by the kernel where it can be (``copy_file_range`` or
+``sendfile``), and otherwise written straight from slices of the mapping.
+"""
+
+import mmap
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional, Sequence, Tuple
+
+from ono.scanner import DEFAULT_DELIMITERS, HEADER_LIMIT, KEYWORD, file_delimiters, get_scanner
+
+MMAP_THRESHOLD = 16 * 1024 * 1024  # Templates at least this large are mapped instead of read
+
+@contextmanager
+def map_file(file: BinaryIO) -> Iterator[Optional[mmap.mmap]]:
+    """
+    Maps an open file read-only for the duration of the block.
+
+    Yields:
+        The mapping, or None for an empty file, which can't be mapped.
+    """
+    if os.fstat(file.fileno()).st_size == 0:
+        yield None
+        return
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        yield data
+
+def file_has_blocks(path: str) -> bool:
+    """
+    Checks cheaply whether a template file may contain Ono blocks, like
+    ``has_blocks``, by searching its mapped bytes without decoding them.
+    """
+    with open(path, 'rb') as source, map_file(source) as data:
+        return data is not None and data.find(KEYWORD.encode('utf-8')) >= 0
+
+def mapped_delimiters(data, delimiters: Sequence[Tuple[str, str]] = DEFAULT_DELIMITERS) -> Tuple[Tuple[str, str], ...]:
+    """
+    Gets the delimiter set for a mapped template, honoring a ``delimiters=``
+    override in its file-level configuration, as ``OnoParser.parse`` does.
+    """
+    header = bytes(data[:HEADER_LIMIT]).decode('utf-8', errors='ignore')
+    return file_delimiters(header) or tuple(delimiters)
+
+def split_blocks(data, delimiters: Sequence[Tuple[str, str]] = DEFAULT_DELIMITERS) -> Iterator[Tuple[bool, int, int]]:
+    """
+    Splits UTF-8 bytes into passthrough text and complete top-level Ono blocks.
+
+    Passthrough text is skipped with a substring search for the next opener;
+    only the blocks themselves are scanned for every delimiter. An unclosed
+    block is passed through as text, as ``OnoParser.parse`` does.
+
+    Args:
+        data: The template, as bytes or an ``mmap``.
+        delimiters: The (opener, closer) pairs to recognize.
+
+    Yields:
+        (is_block, start, end) byte ranges that together cover ``data``, in order.
+    """
+    scanner = get_scanner(delimiters)
+    last = 0
+    while True:
+        block_start = scanner.find_opener_bytes(data, last)
+        if block_start < 0:
+            break
+        block_end = _block_end(scanner, data, block_start)
+        if block_end < 0:
+            break
+        if block_start > last:
+            yield False, last, block_start
+        yield True, block_start, block_end
+        last = block_end
+    if len(data) > last:
+        yield False, last, len(data)
+
+def _block_end(scanner, data, start: int) -> int:
+    """
+    Finds the end of the block whose opener is at ``start``, or -1 if it isn't closed.
+    """
+    open_pairs = []
+    for opens, pair, _, end in scanner.scan_bytes(data, start):
+        if opens:
+            open_pairs.append(pair)
+        elif open_pairs[-1] == pair:
+            open_pairs.pop()
+            if not open_pairs:
+                return end
+    return -1
+
+class RangeWriter:
+    """
+    Writes output that is mostly byte ranges of a mapped input file.
+
+    Ranges are copied between the files by the kernel with
+    ``os.copy_file_range``, or ``os.sendfile`` where that isn't supported
+    (e.g. writing to a pipe). When neither works for the output, the range is
+    written from a slice of the mapping, which still avoids decoding it.
+    """
+
+    def __init__(self, source: BinaryIO, data, output: BinaryIO):
+        """
+        Initializes the RangeWriter.
+
+        Args:
+            source: The input file, opened in binary mode.
+            data: The mapping of ``source``.
+            output: The binary file to write to.
+        """
+        self.source_fd = source.fileno()
+        self.data = data
+        self.output = output
+        try:
+            self.output_fd: Optional[int] = output.fileno()
+        except (AttributeError, OSError):
+            self.output_fd = None
+        self.methods = [name for name in ('copy_file_range', 'sendfile') if hasattr(os, name)]
+        self.copied = 0  # Bytes copied by the kernel rather than written from memory
+
+    def write(self, data: bytes) -> None:
+        """
+        Writes bytes produced by processing, such as a rendered block.
+        """
+        self.output.write(data)
+
+    def copy(self, start: int, end: int) -> None:
+        """
+        Copies ``data[start:end]`` of the input to the output.
+        """
+        if self.output_fd is not None and self.methods:
+            self.output.flush()
+            start = self._copy_in_kernel(start, end)
+        if end > start:
+            with memoryview(self.data) as view:
+                self.output.write(view[start:end])
+
+    def _copy_in_kernel(self, start: int, end: int) -> int:
+        """
+        Copies as much of the range as the kernel will, dropping methods that
+        the output doesn't support.
+
+        Returns:
+            The offset of the first byte left to copy.
+        """
+        while start < end and self.methods:
+            try:
+                if self.methods[0] == 'copy_file_range':
+                    count = os.copy_file_range(self.source_fd, self.output_fd, end - start, start)
+                else:
+                    count = os.sendfile(self.output_fd, self.source_fd, start, end - start)
+            except OSError:
+                self.methods.pop(0)
+                continue
+            if count == 0:
+                break
+            start += count
+            self.copied += count
+        return start
@@ -1,6 +1,12 @@
 import datetime
+import hashlib
+import json
+import os
+import threading
+import time
 import uuid
-from typing import Dict, Any, Optional
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
 
 class BuildMetadata:
     """
@@ -51,4 +57,314 @@ class BuildMetadata:
             The formatted metadata as a string.
         """
         # TODO: Implement format-specific metadata formatting
-        return str(metadata)
\ No newline at end of file
+        return str(metadata)
+
+class BuildManifest:
+    """
+    Records what each template was built from so unchanged templates can be skipped.
+
+    For every source the manifest keeps the hashes of the source, context file
+    and configuration, the target format and the hash of the generated output.
+    A template is up to date when all of these still match. File sizes and
+    modification times are compared first so unchanged files aren't re-hashed.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initializes the BuildManifest, loading any existing manifest file.
+
+        Args:
+            path: The manifest file. Defaults to ``.ono/manifest.json``.
+        """
+        self.path = path or os.path.join(".ono", "manifest.json")
+        self.entries: Dict[str, Dict[str, Any]] = self._load()
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f).get("entries", {})
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """
+        Hashes a string, such as serialized configuration.
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def hash_file(path: Optional[str]) -> Optional[str]:
+        """
+        Hashes a file's contents, or returns None if there is no such file.
+        """
+        if not path:
+            return None
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            return None
+        return digest.hexdigest()
+
+    def fingerprint(self, context_path: Optional[str], config_hash: str, format: Optional[str]) -> Dict[str, Any]:
+        """
+        Collects the inputs shared by the templates of a build.
+
+        Args:
+            context_path: The context file given on the command line, if any.
+            config_hash: The hash of the effective configuration.
+            format: The target format.
+        """
+        return {
+            "context_hash": self.hash_file(context_path),
+            "config_hash": config_hash,
+            "format": format,
+        }
+
+    def is_up_to_date(self, source: str, output: str, fingerprint: Dict[str, Any]) -> bool:
+        """
+        Checks whether ``output`` was built from the current ``source`` and inputs.
+        """
+        entry = self.entries.get(os.path.abspath(source))
+        if entry is None or entry.get("output") != os.path.abspath(output):
+            return False
+        if any(entry.get(key) != value for key, value in fingerprint.items()):
+            return False
+        return (self._matches(source, entry, "source")
+                and self._matches(output, entry, "output"))
+
+    def record(self, source: str, output: str, fingerprint: Dict[str, Any]) -> None:
+        """
+        Records a successful build of ``output`` from ``source``.
+        """
+        entry = {
+            "output": os.path.abspath(output),
+            "source_hash": self.hash_file(source),
+            "source_stat": self._stat(source),
+            "output_hash": self.hash_file(output),
+            "output_stat": self._stat(output),
+            **fingerprint,
+        }
+        with self._lock:
+            self.entries[os.path.abspath(source)] = entry
+
+    def save(self) -> None:
+        """
+        Writes the manifest to disk.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump({"entries": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _matches(self, path: str, entry: Dict[str, Any], kind: str) -> bool:
+        """
+        Checks a file against its recorded size and mtime, falling back to its hash.
+        """
+        stat = self._stat(path)
+        if stat is None:
+            return False
+        if stat == entry.get(f"{kind}_stat"):
+            return True
+        return self.hash_file(path) == entry.get(f"{kind}_hash")
+
+    def _stat(self, path: str) -> Optional[List[int]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+QUEUE_ROW = -1  # Timeline row for time blocks spend waiting for a worker
+
+@dataclass
+class BlockExecution:
+    """
+    What happened while one Ono block was resolved.
+
+    Times are seconds since the BuildProfile started. Token counts are
+    estimated from text length. The blocks resolved by one batched call each
+    count its full latency and an equal share of its tokens.
+    """
+    block_id: int
+    source: Optional[str] = None  # The template the block came from
+    content: str = ""  # The prompt, after nested blocks were substituted
+    resolved_value: Optional[str] = None
+    model: Optional[str] = None
+    context_path: Optional[str] = None
+    ready_at: float = 0.0  # Every block it depends on was resolved
+    started_at: Optional[float] = None  # A worker picked it up
+    finished_at: Optional[float] = None
+    thread_id: Optional[int] = None
+    cache_hit: bool = False
+    batched: bool = False
+    llm_calls: int = 0
+    llm_latency: float = 0.0
+    tokens_in: int = 0
+    tokens_out: int = 0
+    retries: int = 0
+    validation_time: float = 0.0
+    # (name, start, end, thread) for the timeline
+    spans: List[Tuple[str, float, float, int]] = field(default_factory=list)
+
+    @property
+    def queue_wait(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return self.started_at - self.ready_at
+
+    @property
+    def execution_time(self) -> float:
+        if self.finished_at is None:
+            return 0.0
+        return self.finished_at - (self.started_at if self.started_at is not None else self.ready_at)
+
+    @property
+    def tokens_used(self) -> int:
+        return self.tokens_in + self.tokens_out
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        del data["spans"]
+        data.update(queue_wait=self.queue_wait, execution_time=self.execution_time, tokens_used=self.tokens_used)
+        return data
+
+class BuildProfile:
+    """
+    Collects per-block timings for a build, for ``ono --profile`` and ``--trace``.
+
+    The processor records into a BuildProfile only when it is given one, so
+    builds without profiling pay nothing for it. Recording is thread-safe.
+    """
+
+    def __init__(self):
+        """
+        Initializes the BuildProfile.
+        """
+        self.started = time.perf_counter()
+        self.blocks: List[BlockExecution] = []
+        self.parses: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        """
+        Gets the seconds elapsed since the profile started.
+        """
+        return time.perf_counter() - self.started
+
+    def start_block(self, block_id: int, source: Optional[str] = None, **details: Any) -> BlockExecution:
+        """
+        Records that a block is ready to run.
+
+        Args:
+            block_id: The block's ID within its template.
+            source: The template the block came from.
+            **details: Further BlockExecution fields, such as ``content`` and ``model``.
+
+        Returns:
+            The BlockExecution to fill in as the block is resolved.
+        """
+        execution = BlockExecution(block_id=block_id, source=source, ready_at=self.now(), **details)
+        with self._lock:
+            self.blocks.append(execution)
+        return execution
+
+    def record_parse(self, source: Optional[str], started: float, seconds: float) -> None:
+        """
+        Records how long a template took to parse.
+
+        Args:
+            source: The template, if known.
+            started: When parsing started, in seconds since the profile started.
+            seconds: How long it took.
+        """
+        with self._lock:
+            self.parses.append({"source": source, "start": started, "seconds": seconds,
+                                "thread_id": threading.get_ident()})
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Totals the recorded timings.
+        """
+        with self._lock:
+            blocks = list(self.blocks)
+            parses = list(self.parses)
+        return {
+            "wall_time": self.now(),
+            "blocks": len(blocks),
+            "cache_hits": sum(block.cache_hit for block in blocks),
+            "llm_calls": sum(block.llm_calls for block in blocks),
+            "retries": sum(block.retries for block in blocks),
+            "tokens_in": sum(block.tokens_in for block in blocks),
+            "tokens_out": sum(block.tokens_out for block in blocks),
+            "parse_time": sum(parse["seconds"] for parse in parses),
+            "queue_wait": sum(block.queue_wait for block in blocks),
+            "llm_latency": sum(block.llm_latency for block in blocks),
+            "validation_time": sum(block.validation_time for block in blocks),
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Formats the profile for JSON output.
+        """
+        with self._lock:
+            blocks = [block.as_dict() for block in self.blocks]
+            parses = list(self.parses)
+        return {"summary": self.summary(), "parses": parses, "blocks": blocks}
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        Formats the profile in the Chrome trace event format, which
+        ``chrome://tracing`` and Perfetto (ui.perfetto.dev) display as a timeline
+        with one row per worker thread.
+        """
+        events: List[Dict[str, Any]] = []
+        threads: Dict[int, int] = {}
+
+        def tid(thread_id: Optional[int]) -> int:
+            return threads.setdefault(thread_id or 0, len(threads) + 1)
+
+        def span(name: str, category: str, start: float, end: float, thread_id: Optional[int],
+                 args: Dict[str, Any]) -> None:
+            events.append({"name": name, "cat": category, "ph": "X", "pid": 1, "tid": tid(thread_id),
+                           "ts": round(start * 1e6), "dur": round(max(end - start, 0.0) * 1e6), "args": args})
+
+        with self._lock:
+            blocks = list(self.blocks)
+            parses = list(self.parses)
+        for parse in parses:
+            span(f"parse {parse['source'] or ''}".strip(), "parse", parse["start"],
+                 parse["start"] + parse["seconds"], parse["thread_id"], {"source": parse["source"]})
+        for block in blocks:
+            label = f"block {block.block_id}" + (f" ({block.source})" if block.source else "")
+            args = {key: value for key, value in block.as_dict().items() if key not in ("content", "resolved_value")}
+            if block.started_at is not None and block.started_at > block.ready_at:
+                span(f"{label} queued", "queue", block.ready_at, block.started_at, QUEUE_ROW, args)
+            if block.finished_at is not None:
+                start = block.started_at if block.started_at is not None else block.ready_at
+                span(label, "cache" if block.cache_hit else "block", start, block.finished_at, block.thread_id, args)
+            for name, start, end, thread_id in block.spans:
+                span(f"{label} {name}", name, start, end, thread_id, {})
+
+        for thread_id, number in threads.items():
+            name = "queue" if thread_id == QUEUE_ROW else f"thread {thread_id}"
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": number, "args": {"name": name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path: str, trace: bool = False) -> None:
+        """
+        Writes the profile to a file as JSON, or as a Chrome trace if ``trace`` is set.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace() if trace else self.as_dict(), f, indent=None if trace else 2)
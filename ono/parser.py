@@ -1,136 +1,292 @@
-from typing import List, Optional, Tuple
-from dataclasses import dataclass
+import re
+from enum import IntEnum
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass, field
+from ono.scanner import DEFAULT_DELIMITERS, file_delimiters, get_scanner
+
+# Ono-specific parameters; these may be written with or without the '@' prefix.
+ONO_DIRECTIVES = {'context', 'execution', 'meta', 'type', 'scope'}
+
+_CONFIG_PARAM = re.compile(r'\s*(@?[A-Za-z_][A-Za-z0-9_]*)=("[^"]*"|\'[^\']*\'|\S+)')
+
+class Kind(IntEnum):
+    """
+    The kinds of parsed item.
+    """
+    TEXT = 0
+    ONO = 1
+
+_KIND_NAMES = ('text', 'ono')
 
 @dataclass
+class BlockConfig:
+    """
+    The configuration parameters found at the start of an Ono block.
+    """
+    prompt: str
+    params: Dict[str, Any] = field(default_factory=dict)  # Passed through to the LLM
+    directives: Dict[str, str] = field(default_factory=dict)  # Ono-specific, without '@'
+
 class ParsedItem:
     """
     Represents a parsed item, which can be either text or an Ono block.
+
+    Items don't copy the text they cover. They keep offsets into the source
+    they were parsed from, which all the items of a document share, and
+    ``content`` is sliced from it when asked for. A leaf block has no
+    ``parsed`` children, since its content is its whole prompt.
     """
-    type: str  # 'text' or 'ono'
-    content: str
-    parsed: Optional[List['ParsedItem']] = None
+    __slots__ = ('kind', 'source', 'start', 'end', 'content_start', 'content_end', 'parsed', 'block_id', '_config')
+
+    def __init__(self, type: Union[Kind, str], content: Optional[str] = None,
+                 parsed: Optional[List['ParsedItem']] = None, start: int = 0, end: int = 0, block_id: int = -1,
+                 source: Optional[str] = None, content_start: Optional[int] = None,
+                 content_end: Optional[int] = None):
+        """
+        Initializes the ParsedItem.
+
+        Args:
+            type: The kind of item, as a Kind or as 'text' or 'ono'.
+            content: The item's content, for items built without a shared source.
+            parsed: The children of an Ono block with nested blocks.
+            start: Offset of the item in the source text, including tags.
+            end: Offset of the end of the item in the source text.
+            block_id: Position of an Ono block in document order.
+            source: The text the item was parsed from.
+            content_start: Offset of the content in ``source``; ``start`` by default.
+            content_end: Offset of the end of the content; ``end`` by default.
+        """
+        self.kind = type if isinstance(type, Kind) else Kind(_KIND_NAMES.index(type))
+        self.parsed = parsed
+        self.start = start
+        self.end = end
+        self.block_id = block_id
+        self._config: Optional[BlockConfig] = None
+        if source is None:
+            self.source = content or ''
+            self.content_start, self.content_end = 0, len(self.source)
+        else:
+            self.source = source
+            self.content_start = start if content_start is None else content_start
+            self.content_end = end if content_end is None else content_end
+
+    @property
+    def type(self) -> str:
+        """
+        'text' or 'ono', for code written before ``kind``.
+        """
+        return _KIND_NAMES[self.kind]
+
+    @property
+    def content(self) -> str:
+        """
+        The text of the item, without the tags and surrounding whitespace of a block.
+        """
+        return self.source[self.content_start:self.content_end]
+
+    @property
+    def config(self) -> BlockConfig:
+        """
+        The configuration at the start of an Ono block, parsed on first use.
+        In a block with nested blocks, it is read from the text before the
+        first of them, so their answers are never taken for configuration.
+        """
+        if self._config is None:
+            if self.parsed is None:
+                text = self.content
+            else:
+                first = self.parsed[0] if self.parsed else None
+                text = first.content if first is not None and first.kind is Kind.TEXT else ''
+            self._config = parse_block_config(text)
+        return self._config
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ParsedItem):
+            return NotImplemented
+        return (self.kind == other.kind and self.start == other.start and self.end == other.end
+                and self.block_id == other.block_id and self.content == other.content
+                and self.parsed == other.parsed)
+
+    def __repr__(self) -> str:
+        return (f"ParsedItem(type={self.type!r}, content={self.content!r}, parsed={self.parsed!r}, "
+                f"start={self.start}, end={self.end}, block_id={self.block_id})")
 
 class OnoParser:
     """
     Parses text and extracts Ono blocks.
     Handles nested Ono blocks correctly.
+
+    Every delimiter pair of the specification is recognized (``<?ono ?>``,
+    ``"?ono ?"``, ``{?ono ?}`` and so on), as is a custom pair set with
+    ``delimiters=<open>, <close>`` in a template's file-level configuration.
     """
-    def __init__(self):
+    def __init__(self, delimiters: Optional[Sequence[Tuple[str, str]]] = None):
         """
-        Initializes the OnoParser with the start and end tags for Ono blocks.
+        Initializes the OnoParser.
+
+        Args:
+            delimiters: The (opener, closer) pairs to recognize, instead of
+                ``DEFAULT_DELIMITERS``.
         """
         self.start_tag = '<?ono'
         self.end_tag = '?>'
+        self.delimiters = tuple(delimiters) if delimiters else DEFAULT_DELIMITERS
     
     def parse(self, text: str) -> List[ParsedItem]:
         """
         Parses the given text and returns a list of ParsedItem objects.
+
+        The text is scanned once for the openers and closers of every delimiter
+        pair, keeping a stack of open blocks, so the whole tree is built in
+        linear time. A closer only ends an open block of its own pair; anywhere
+        else it is text. Every item records its ``start`` and ``end`` offsets in
+        ``text``, and Ono blocks are numbered in the order
+        ``extract_ono_blocks`` returns them.
         """
-        result = []
-        current_index = 0
-        
-        while current_index < len(text):
-            start_index = text.find(self.start_tag, current_index)
-            
-            if start_index == -1:
-                # No more Ono tags, add remaining text
-                if current_index < len(text):
-                    result.append(ParsedItem(
-                        type='text',
-                        content=text[current_index:]
-                    ))
-                break
-            
-            # Add text before the tag
-            if start_index > current_index:
-                result.append(ParsedItem(
-                    type='text',
-                    content=text[current_index:start_index]
-                ))
-            
-            # Find the matching closing tag with proper nesting
-            end_index, content = self._find_matching_closing_tag(text, start_index)
-            
-            if end_index == -1:
-                # Malformed - no matching closing tag
-                result.append(ParsedItem(
-                    type='text',
-                    content=text[start_index:]
-                ))
-                break
-            
-            # Parse the content inside the tags recursively
-            inner_content = content.strip()
-            parsed_inner = self.parse(inner_content)
-            
-            result.append(ParsedItem(
-                type='ono',
-                content=inner_content,
-                parsed=parsed_inner
-            ))
-            
-            current_index = end_index + len(self.end_tag)
-        
-        return result
-    
-    def _find_matching_closing_tag(self, text: str, start_index: int) -> Tuple[int, str]:
-        """
-        Finds the matching closing tag, handling nested tags properly.
-        Returns the index of the closing tag and the content within the tags.
-        """
-        depth = 0
-        current_index = start_index
-        
-        while current_index < len(text):
-            next_start = text.find(self.start_tag, current_index)
-            next_end = text.find(self.end_tag, current_index)
-            
-            if next_end == -1:
-                # No closing tag found
-                return -1, ''
-            
-            if next_start != -1 and next_start < next_end:
-                # Found another opening tag before the next closing tag
-                depth += 1
-                current_index = next_start + len(self.start_tag)
-            else:
-                # Found a closing tag
-                if depth == 0:
-                    # This is our matching closing tag
-                    content_start = start_index + len(self.start_tag)
-                    content = text[content_start:next_end]
-                    return next_end, content
-                else:
-                    # This closing tag belongs to a nested opening tag
-                    depth -= 1
-                    current_index = next_end + len(self.end_tag)
-        
-        return -1, ''
-    
+        root: List[ParsedItem] = []
+        # Each frame is [tag start, content start, children, pair]
+        stack: List[list] = []
+        children, last = root, 0
+        scanner = get_scanner(file_delimiters(text) or self.delimiters)
+        tokens = scanner.tokens
+
+        for match in scanner.pattern.finditer(text):
+            opens, pair = tokens[match.group()]
+            position, end = match.span()
+            if opens:
+                self._append_text(children, text, last, position)
+                stack.append([position, end, children, pair])
+                children, last = [], end
+            elif stack and stack[-1][3] == pair:
+                self._append_text(children, text, last, position)
+                tag_start, content_start, parent, _ = stack.pop()
+                parent.append(self._make_block(text, tag_start, content_start, position, end, children))
+                children, last = parent, end
+
+        if stack:
+            # Malformed - no matching closing tag for the outermost open block
+            root.append(ParsedItem(Kind.TEXT, source=text, start=stack[0][0], end=len(text)))
+        else:
+            self._append_text(root, text, last, len(text))
+
+        for block_id, item in enumerate(self._iter_blocks(root)):
+            item.block_id = block_id
+
+        return root
+
+    def _append_text(self, items: List[ParsedItem], text: str, start: int, end: int) -> None:
+        """
+        Appends a text item covering ``text[start:end]`` unless it would be empty.
+        """
+        if end > start:
+            items.append(ParsedItem(Kind.TEXT, source=text, start=start, end=end))
+
+    def _make_block(self, text: str, tag_start: int, content_start: int, content_end: int,
+                    tag_end: int, children: List[ParsedItem]) -> ParsedItem:
+        """
+        Builds an Ono item, trimming surrounding whitespace from its content and
+        from the text children at either edge. Blocks without nested blocks
+        keep no children.
+        """
+        while content_start < content_end and text[content_start].isspace():
+            content_start += 1
+        while content_end > content_start and text[content_end - 1].isspace():
+            content_end -= 1
+
+        parsed: Optional[List[ParsedItem]] = None
+        if any(child.kind is Kind.ONO for child in children):
+            first, last = children[0], children[-1]
+            if first.kind is Kind.TEXT and first.start < content_start:
+                first.start = first.content_start = content_start
+            if last.kind is Kind.TEXT and last.end > content_end:
+                last.end = last.content_end = max(content_end, last.start)
+            parsed = [child for child in children if child.kind is Kind.ONO or child.end > child.start]
+
+        return ParsedItem(Kind.ONO, parsed=parsed, start=tag_start, end=tag_end, source=text,
+                          content_start=content_start, content_end=content_end)
+
     def extract_ono_blocks(self, parsed_content: List[ParsedItem]) -> List[str]:
         """
         Extracts all Ono content blocks, including nested ones.
         """
-        ono_blocks = []
-        
-        def extract_recursive(items: List[ParsedItem]):
-            for item in items:
-                if item.type == 'ono':
-                    ono_blocks.append(item.content)
-                    if item.parsed:
-                        extract_recursive(item.parsed)
-        
-        extract_recursive(parsed_content)
-        return ono_blocks
+        return [item.content for item in self._iter_blocks(parsed_content)]
+
+    def _iter_blocks(self, parsed_content: List[ParsedItem]) -> Iterator[ParsedItem]:
+        """
+        Yields every Ono item, parents before their nested blocks, in document order.
+        """
+        pending = list(reversed(parsed_content))
+
+        # Depth-first with an explicit stack so deep nesting can't hit the recursion limit
+        while pending:
+            item = pending.pop()
+            if item.kind is Kind.ONO:
+                yield item
+                if item.parsed:
+                    pending.extend(reversed(item.parsed))
     
-    def render(self, parsed_content: List[ParsedItem]) -> str:
+    def render(self, parsed_content: List[ParsedItem], results: Optional[Sequence[str]] = None) -> str:
         """
         Renders the parsed content back into a string.
+
+        Args:
+            parsed_content: The items returned by ``parse``.
+            results: Replacement text for each Ono block, indexed by ``block_id``.
+                Blocks are rendered back as written when omitted.
+
+        Returns:
+            The rendered text, built with a single join over the top-level items.
         """
         result = []
         for item in parsed_content:
-            if item.type == 'text':
-                result.append(item.content)
-            elif item.type == 'ono':
-                result.append(f'<?ono {item.content} ?>')
-        return ''.join(result)
\ No newline at end of file
+            if item.kind is Kind.TEXT or results is None:
+                result.append(item.source[item.start:item.end])
+            else:
+                result.append(results[item.block_id])
+        return ''.join(result)
+
+    def parse_block_config(self, content: str) -> BlockConfig:
+        """
+        Splits leading ``key=value`` parameters off the content of an Ono block.
+
+        Keys prefixed with '@', or naming an Ono directive, become directives;
+        everything else is passed through to the LLM.
+        """
+        return parse_block_config(content)
+
+def parse_block_config(content: str) -> BlockConfig:
+    """
+    Splits leading ``key=value`` parameters off the content of an Ono block,
+    like ``OnoParser.parse_block_config``.
+    """
+    config = BlockConfig(prompt=content)
+    index = 0
+
+    while True:
+        match = _CONFIG_PARAM.match(content, index)
+        if not match:
+            break
+        key, value = match.group(1), match.group(2)
+        if value[0] in '"\'' and len(value) > 1:
+            value = value[1:-1]
+
+        name = key.lstrip('@')
+        if key.startswith('@') or name in ONO_DIRECTIVES:
+            config.directives[name] = value
+        else:
+            config.params[name] = _coerce_value(value)
+        index = match.end()
+
+    config.prompt = content[index:].strip()
+    return config
+
+def _coerce_value(value: str) -> Any:
+    """
+    Converts numeric parameter values to numbers, leaving other values as strings.
+    """
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
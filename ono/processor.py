@@ -1,7 +1,65 @@
-from typing import List, Dict, Any
-from ono.parser import OnoParser
-from ono.llm import LLMClient
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import List, Dict, Any, BinaryIO, Optional, Callable, Deque, Iterable, Iterator, Tuple, Union
+from ono.parser import BlockConfig, Kind, OnoParser, ParsedItem
+from ono.llm import AsyncLLMClient, LLMClient, last_retries, limit_answer
+from ono.exceptions import DeadlineExceeded, LLMError
 from ono.config import OnoConfig
+from ono.cache import ResponseCache
+from ono.batching import BatchMetrics, build_batch_prompt, parse_batch_response
+from ono.stream import StreamScanner
+from ono.mapped import RangeWriter, map_file, mapped_delimiters, split_blocks
+from ono.context import DEFAULT_CONTEXT_STORAGE, ContextManager, format_history
+from ono.compaction import ContextCompactor, estimate_tokens
+from ono.metadata import BlockExecution, BuildProfile
+from ono.scheduler import AsyncScheduler, BlockGraph, Scheduler, Task
+from ono.validator import ValidatorPool
+from ono.substitution import load_variables, substitute
+from ono.dedup import Deduplicator
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+# Formats where a block placed inline after other text (``NAME=<?ono ... ?>``) is a single-line value.
+# None by default, since cutting an answer at its first newline can drop part of a valid value.
+DEFAULT_SINGLE_LINE_FORMATS: List[str] = []
+
+SYNTAX_PROMPT = (
+    "Rewrite the following so that it is valid {format}. Fix only syntax, quoting and "
+    "escaping, keep the meaning, and return nothing but the result.\n\n{text}"
+)
+
+# For blocks spliced into a larger document, which can't be valid on their own
+FRAGMENT_SYNTAX_PROMPT = (
+    "The following is a fragment of a larger {format} document. Fix only its syntax, quoting and "
+    "escaping, keep the meaning, don't add anything to make it a complete document, and return "
+    "nothing but the fragment.\n\n{text}"
+)
+
+@dataclass
+class BlockRequest:
+    """
+    A block prompt ready to be sent to the LLM.
+    """
+    prompt: str
+    model: Optional[str] = None
+    params: Dict[str, Any] = field(default_factory=dict)
+    context: Optional[str] = None
+    key: Optional[str] = None  # Response cache key, None when caching is disabled
+    use_cache: bool = True
+    conversation: Optional[str] = None  # Context path whose history the block continues
+    format: Optional[str] = None
+    single_line: bool = False  # The answer ends at its first newline
+    stage: str = "concept"  # The pass the request belongs to
+    execution: Optional[BlockExecution] = field(default=None, repr=False)  # Profiling record, if profiling
+    claim: Optional[Future] = field(default=None, repr=False)  # Deduplicated answer this request provides
+    copies: List["BlockRequest"] = field(default_factory=list, repr=False)  # Duplicates answered with it
+    fuzzy: bool = False  # Matched the request it duplicates as a near-duplicate
 
 class TwoPassProcessor:
     """
@@ -10,42 +68,1038 @@ class TwoPassProcessor:
     This class handles the processing of Ono blocks in two passes:
     1. Concept Pass: Focuses on semantic understanding and context injection.
     2. Syntax Pass: Focuses on format-specific syntax generation.
+
+    The syntax pass is enabled with ``passes.syntax.enabled`` and can use its own
+    model and endpoint. It runs on top-level blocks as soon as their concept
+    pass finishes, overlapping the concept passes of later blocks, and is
+    skipped when the format's validator already accepts the concept output.
+    Validators run on their own thread pool, so even slow external tools
+    don't hold up LLM calls.
+
+    Blocks are scheduled as a dependency graph and sent to the LLM
+    concurrently. At most ``max_concurrency`` calls are in flight at once,
+    even when several documents are processed in parallel. Nested blocks are
+    resolved before their parents so that each parent is sent with its inner
+    results already substituted.
+    Responses are served from the response cache when an identical request
+    has been resolved before, unless the block asks for ``@execution=always``.
+    With ``batch_size`` above one, independent blocks sharing a model and
+    context are resolved together in a single LLM call.
+
+    Blocks with a ``context=`` directive continue that context's conversation:
+    they are sent with its history, compacted to the model's token budget, and
+    resolved one at a time, inner blocks before outer ones, in parallel with
+    everything else.
+
+    ``aprocess`` is the asyncio equivalent of ``process``, for services that
+    render templates on an event loop. It uses an AsyncLLMClient (which needs
+    the optional ``httpx`` dependency) and can be cancelled or given a deadline.
+
+    Given a BuildProfile, the processor records parse time, queue wait, LLM
+    latency, tokens, cache hits, validation time and retries for every block.
     """
 
-    def __init__(self):
+    def __init__(self, config: Optional[OnoConfig] = None, llm_client: Optional[LLMClient] = None,
+                 max_concurrency: Optional[int] = None, cache: Optional[ResponseCache] = None,
+                 format: Optional[str] = None, context: Optional[str] = None, batch_size: Optional[int] = None,
+                 context_manager: Optional[ContextManager] = None, compactor: Optional[ContextCompactor] = None,
+                 syntax_client: Optional[LLMClient] = None, async_client: Optional[AsyncLLMClient] = None,
+                 profile: Optional[BuildProfile] = None, variables: Optional[Dict[str, Any]] = None):
         """
         Initializes the TwoPassProcessor.
+
+        Args:
+            config: The configuration to use. Loaded from the default locations if omitted.
+            llm_client: The LLM client to use. Created from the environment if omitted.
+            max_concurrency: The maximum number of LLM requests in flight at once,
+                across every document being processed. Defaults to the
+                ``llm.max_concurrency`` configuration value.
+            cache: The response cache to use. Created from the configuration if
+                omitted and ``cache.enabled`` is not false.
+            format: The target output format.
+            context: The default context path for blocks that don't set one.
+            batch_size: The maximum number of blocks combined into one LLM call.
+                Defaults to the ``llm.batch_size`` configuration value, 1 (off).
+            context_manager: The store of conversation contexts. If omitted,
+                contexts live for the processor's lifetime, or are persisted
+                under ``defaults.context_storage`` when ``context.persist`` is true.
+            compactor: Fits context history into a token budget. Created from the
+                ``context`` configuration section if omitted.
+            syntax_client: The LLM client for the syntax pass. Created for
+                ``passes.syntax.api_url`` if set, otherwise ``llm_client`` is used.
+            async_client: The client used by ``aprocess``. Created from the
+                configuration on first use if omitted.
+            profile: Records per-block timings when given.
+            variables: Values substituted for ``$name`` references in blocks.
+                Loaded from ``context`` if that names a YAML or JSON file.
         """
-        self.config = OnoConfig()
-        self.llm_client = LLMClient()
+        self.config = config or OnoConfig()
+        self.max_concurrency = max(1, int(max_concurrency or self.config.get("llm.max_concurrency", DEFAULT_MAX_CONCURRENCY)))
+        # Bounds the calls in flight across every document processed at once, e.g. the files of a batch
+        self._call_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.llm_client = llm_client or LLMClient(
+            config=self.config,
+            pool_size=self.config.get("llm.pool_size", self.max_concurrency),
+        )
         self.parser = OnoParser()
+        if cache is None and self.config.get("cache.enabled", True):
+            cache = ResponseCache.from_config(self.config)
+        self.cache = cache
+        self.format = format
+        self.context = context
+        self.variables = load_variables(context) if variables is None else variables
+        self.batch_size = max(1, int(batch_size or self.config.get("llm.batch_size", 1)))
+        self.batch_metrics = BatchMetrics()
+        # Persisted history would change prompts (and cache keys) on every rebuild, so it is opt-in
+        persist = self.config.get("context.persist", False)
+        self.context_manager = context_manager or ContextManager(
+            storage_path=self.config.get("defaults.context_storage", DEFAULT_CONTEXT_STORAGE) if persist else None,
+        )
+        self.compactor = compactor or ContextCompactor.from_config(self.config, summarize=self._summarize)
+        self.dedup = Deduplicator.from_config(self.config)
+        self.syntax_pass = bool(self.config.get("passes.syntax.enabled", False))
+        self.syntax_model = self.config.get("passes.syntax.model") or self.config.get("llm.default_model")
+        if syntax_client is None and self.syntax_pass and self.config.get("passes.syntax.api_url"):
+            syntax_client = LLMClient(
+                api_url=self.config.get("passes.syntax.api_url"),
+                api_key=self.config.get("passes.syntax.api_key"),
+                config=self.config,
+                pool_size=self.config.get("llm.pool_size", self.max_concurrency),
+            )
+        self.syntax_client = syntax_client or self.llm_client
+        self.async_client = async_client
+        self.async_syntax_client: Optional[AsyncLLMClient] = None
+        self.single_line_formats = set(self.config.get("llm.single_line_formats", DEFAULT_SINGLE_LINE_FORMATS))
+        self.max_answer_chars = self.config.get("llm.max_answer_chars")
+        self.profile = profile
+        self.validators = ValidatorPool(self.config)
 
-    def process(self, text: str) -> str:
+    def process(self, text: str, format: Optional[str] = None, source: Optional[str] = None) -> str:
         """
         Processes the input text, extracting Ono blocks, sending them to the LLM,
         and replacing them with the processed content.
 
         Args:
             text: The input text to process.
+            format: The target output format, overriding the processor's default.
+            source: The file the text came from, used to label profiles.
+
+        Returns:
+            The processed text.
+
+        Raises:
+            LLMError: If a block can't be resolved. Nothing is rendered, so a
+                failed block is never mistaken for output.
+        """
+        parsed_content = self._parse(text, source)
+        with self.dedup.run():
+            processed_blocks = self._resolve_blocks(parsed_content, format or self.format, source)
+
+        # Splice the processed content in place of the top-level Ono blocks
+        return self.parser.render(parsed_content, processed_blocks)
+
+    def process_stream(self, chunks: Iterable[str], write: Callable[[str], Any], format: Optional[str] = None) -> None:
+        """
+        Processes a stream of text chunks, writing the output as it becomes ready.
+
+        Passthrough text is written as soon as every block before it has been
+        written, and top-level blocks are resolved concurrently while reading
+        continues. Memory use is bounded by the blocks in flight rather than
+        the size of the input.
+
+        Every block joins one dependency graph, so blocks continuing a context
+        still wait for the previous block of their chain, and all of them share
+        one pool of ``max_concurrency`` workers.
+
+        Args:
+            chunks: The input text, in pieces of any size.
+            write: Called with each piece of output, in order.
+            format: The target output format, overriding the processor's default.
+
+        Raises:
+            LLMError: If a block can't be resolved. The output written up to
+                that block is incomplete.
+        """
+        scanner = StreamScanner(delimiters=self.parser.delimiters)
+
+        def segments() -> Iterator[Tuple[bool, Any, bool]]:
+            inline = False  # Whether the current line has text before the next block
+            for chunk in itertools.chain(chunks, [None]):
+                for kind, value in (scanner.close() if chunk is None else scanner.feed(chunk)):
+                    if kind == 'text':
+                        inline = _ends_with_text(value) if '\n' in value else inline or bool(value.strip())
+                        yield False, value, False
+                    else:
+                        # The scanner settles on the file's own delimiters before its first block
+                        yield True, self._parse(value, None, self._parser_for(scanner.delimiters)), inline
+                        inline = False
+
+        with self.dedup.run():
+            self._resolve_incrementally(segments(), format, None, write, write)
+
+    def process_file(self, path: str, output: BinaryIO, format: Optional[str] = None) -> None:
+        """
+        Processes a template file through a memory map, for templates too large
+        to read into a string.
+
+        The delimiters are found by scanning the mapped bytes. Only the Ono
+        blocks are decoded, and they are resolved as one document, as in
+        ``process_stream``. The passthrough text between them is copied from
+        the input to ``output`` byte for byte, by the kernel where possible,
+        so it is never decoded or held in memory. The template must be UTF-8,
+        or an encoding that agrees with it on the delimiters, such as ASCII.
+
+        Args:
+            path: The template file.
+            output: The binary file to write to. Writing to a real file (not a
+                wrapper such as ``io.BytesIO``) lets the kernel copy the
+                passthrough text.
+            format: The target output format, overriding the processor's default.
+
+        Raises:
+            LLMError: If a block can't be resolved. The output written up to
+                that block is incomplete.
+        """
+        with open(path, 'rb') as source, map_file(source) as data:
+            if data is None:
+                return
+            delimiters = mapped_delimiters(data, self.parser.delimiters)
+            parser = self._parser_for(delimiters)
+            writer = RangeWriter(source, data, output)
+
+            def segments() -> Iterator[Tuple[bool, Any, bool]]:
+                previous = None  # The passthrough range just before the next block
+                for is_block, start, end in split_blocks(data, delimiters):
+                    if not is_block:
+                        previous = (start, end)
+                        yield False, previous, False
+                        continue
+                    inline = False
+                    if previous is not None and previous[1] == start:
+                        newline = data.rfind(b'\n', previous[0], start)
+                        inline = bool(data[newline + 1 if newline >= 0 else previous[0]:start].strip())
+                    yield True, self._parse(data[start:end].decode('utf-8'), path, parser), inline
+                    previous = None
+
+            with self.dedup.run():
+                self._resolve_incrementally(segments(), format, path, lambda span: writer.copy(*span),
+                                            lambda result: writer.write(result.encode('utf-8')))
+            output.flush()
+
+    async def aprocess(self, text: str, format: Optional[str] = None, deadline: Optional[float] = None,
+                       source: Optional[str] = None) -> str:
+        """
+        Processes the input text like ``process``, without blocking the event loop.
+
+        Cancelling the awaiting task cancels every LLM call in flight.
+
+        Args:
+            text: The input text to process.
+            format: The target output format, overriding the processor's default.
+            deadline: Seconds the whole render may take. Each LLM call is also
+                bounded by ``llm.deadline`` if set.
+            source: The file the text came from, used to label profiles.
 
         Returns:
             The processed text.
+
+        Raises:
+            DeadlineExceeded: If the render doesn't finish before ``deadline``,
+                or an LLM call doesn't finish before ``llm.deadline``.
+            LLMError: If a block can't be resolved, as in ``process``.
         """
-        parsed_content = self.parser.parse(text)
-        ono_blocks = self.parser.extract_ono_blocks(parsed_content)
+        parsed_content = self._parse(text, source)
+
+        try:
+            with self.dedup.run():
+                processed_blocks = await asyncio.wait_for(
+                    self._aresolve_blocks(parsed_content, format or self.format, source), deadline,
+                )
+        except DeadlineExceeded:
+            raise  # A single call's deadline, not the render's
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceeded(f"Rendering did not finish within {deadline}s") from e
+
+        return self.parser.render(parsed_content, processed_blocks)
+
+    async def aclose(self) -> None:
+        """
+        Closes the connection pools of the asynchronous clients.
+        """
+        if self.async_syntax_client is not None and self.async_syntax_client is not self.async_client:
+            await self.async_syntax_client.aclose()
+        if self.async_client is not None:
+            await self.async_client.aclose()
+
+    def _parse(self, text: str, source: Optional[str], parser: Optional[OnoParser] = None) -> List[ParsedItem]:
+        parser = parser or self.parser
+        if self.profile is None:
+            return parser.parse(text)
+        started = self.profile.now()
+        parsed_content = parser.parse(text)
+        self.profile.record_parse(source, started, self.profile.now() - started)
+        return parsed_content
+
+    def _resolve_blocks(self, parsed_content: List[ParsedItem], format: Optional[str] = None,
+                        source: Optional[str] = None) -> List[str]:
+        """
+        Resolves every Ono block in the parsed content and returns the results
+        indexed by ``block_id``.
+
+        Blocks are scheduled as a dependency graph: a block starts as soon as
+        its nested blocks and the previous block of its context chain are
+        resolved, so independent work anywhere in the document runs in parallel.
+        """
+        graph = BlockGraph(parsed_content, chain_of=self._chain_of)
+        top_level = {item.block_id for item in parsed_content if item.kind is Kind.ONO}
+        inline = self._inline_blocks(parsed_content) if format in self.single_line_formats else set()
+        documents = self._document_blocks(parsed_content)
+        executions: Dict[int, BlockExecution] = {}
+        dispatch = self._dispatcher(graph, format, inline, self._call_group, self._call_chain, executions, source)
+        formatted: Dict[int, Future] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            on_result = self._result_handler(executor, format, top_level, inline, documents, executions, formatted)
+            resolved = Scheduler(executor).run(graph, dispatch, on_result=on_result)
+            results = [resolved[block_id] for block_id in range(len(graph))]
+            for block_id, future in formatted.items():
+                results[block_id] = future.result()
+
+        return results
+
+    def _resolve_incrementally(self, segments: Iterable[Tuple[bool, Any, bool]], format: Optional[str],
+                               source: Optional[str], write_text: Callable[[Any], Any],
+                               write_block: Callable[[str], Any]) -> None:
+        """
+        Resolves the blocks of a document as its segments arrive, writing every
+        segment in order as soon as it is ready.
+
+        Each top-level block joins one dependency graph, run on one pool of
+        ``max_concurrency`` workers, so a block continuing a context still
+        waits for the previous block of its chain, whichever top-level block
+        that is in.
+
+        Args:
+            segments: (False, passthrough, _) for text, passed to ``write_text``
+                as it is, and (True, parsed block, inline) for the items parsed
+                from a top-level block, whose result goes to ``write_block``.
+                ``inline`` tells whether text precedes the block on its line.
+            format: The target output format, overriding the processor's default.
+            source: The file the document came from, used to label profiles.
+        """
+        format = format or self.format
+        graph = BlockGraph([], chain_of=self._chain_of)
+        top_level: set = set()
+        inline: set = set()
+        executions: Dict[int, BlockExecution] = {}
+        dispatch = self._dispatcher(graph, format, inline, self._call_group, self._call_chain, executions, source)
+        formatted: Dict[int, Future] = {}
+        pending: Deque[Tuple[bool, Any]] = deque()  # Passthrough, or the ID of a top-level block
+        limit = self.max_concurrency * 2
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            scheduler = Scheduler(executor)
+            # The rest of a stream isn't known yet, so every block is treated as a fragment
+            on_result = self._result_handler(executor, format, top_level, inline, set(), executions, formatted)
+
+            def emit() -> None:
+                is_block, value = pending.popleft()
+                if not is_block:
+                    write_text(value)
+                    return
+                while value not in graph.results:
+                    scheduler.wait(graph, dispatch, on_result)
+                write_block(formatted[value].result() if value in formatted else graph.results[value])
+
+            def resolved(entry: Tuple[bool, Any]) -> bool:
+                is_block, value = entry
+                return not is_block or (value in graph.results and (value not in formatted or formatted[value].done()))
+
+            for is_block, value, is_inline in segments:
+                if not is_block:
+                    pending.append((False, value))
+                else:
+                    roots = [item for item in value if item.kind is Kind.ONO]
+                    ready = graph.extend(value)
+                    for item in roots:
+                        top_level.add(item.block_id)
+                        if is_inline and format in self.single_line_formats:
+                            inline.add(item.block_id)
+                        pending.append((True, item.block_id))
+                    scheduler.start(graph, ready, dispatch, on_result)
+                if scheduler.running:
+                    scheduler.wait(graph, dispatch, on_result, timeout=0)
+                while pending and (len(pending) > limit or resolved(pending[0])):
+                    # Past the limit, too much is buffered behind a slow block; wait for the oldest
+                    emit()
+            while pending:
+                emit()
+
+    async def _aresolve_blocks(self, parsed_content: List[ParsedItem], format: Optional[str] = None,
+                               source: Optional[str] = None) -> List[str]:
+        """
+        Resolves every Ono block like ``_resolve_blocks``, as asyncio tasks.
+        """
+        self._start_async_clients()
+        graph = BlockGraph(parsed_content, chain_of=self._chain_of)
+        top_level = {item.block_id for item in parsed_content if item.kind is Kind.ONO}
+        inline = self._inline_blocks(parsed_content) if format in self.single_line_formats else set()
+        documents = self._document_blocks(parsed_content)
+        executions: Dict[int, BlockExecution] = {}
+        dispatch = self._dispatcher(graph, format, inline, self._acall_group, self._acall_chain, executions, source)
+        formatted: Dict[int, asyncio.Future] = {}
+
+        def on_result(block_id: int, result: str) -> None:
+            execution = executions.get(block_id)
+            if execution is not None:
+                self._finish_execution(execution, result)
+            if self.syntax_pass and format and block_id in top_level:
+                formatted[block_id] = asyncio.ensure_future(
+                    self._asyntax(result, format, block_id in inline, execution, fragment=block_id not in documents))
+
+        try:
+            resolved = await AsyncScheduler(self.max_concurrency).run(graph, dispatch, on_result=on_result)
+            results = [resolved[block_id] for block_id in range(len(graph))]
+            for block_id, future in formatted.items():
+                results[block_id] = await future
+        finally:
+            for future in formatted.values():
+                future.cancel()
+
+        return results
+
+    def _start_async_clients(self) -> None:
+        """
+        Creates the asynchronous clients on first use, inside the event loop.
+        """
+        if self.async_client is None:
+            self.async_client = AsyncLLMClient(
+                config=self.config,
+                pool_size=self.config.get("llm.pool_size", self.max_concurrency),
+            )
+        if self.async_syntax_client is None:
+            if self.syntax_pass and self.config.get("passes.syntax.api_url"):
+                self.async_syntax_client = AsyncLLMClient(
+                    api_url=self.config.get("passes.syntax.api_url"),
+                    api_key=self.config.get("passes.syntax.api_key"),
+                    config=self.config,
+                    pool_size=self.config.get("llm.pool_size", self.max_concurrency),
+                )
+            else:
+                self.async_syntax_client = self.async_client
+
+    def _result_handler(self, executor: ThreadPoolExecutor, format: Optional[str], top_level: set, inline: set,
+                        documents: set, executions: Dict[int, BlockExecution],
+                        formatted: Dict[int, Future]) -> Callable[[int, str], None]:
+        """
+        Creates the scheduler callback that finishes each block's profile and
+        starts the syntax pass of top-level blocks, adding its future to ``formatted``.
+        """
+        def on_result(block_id: int, result: str) -> None:
+            execution = executions.get(block_id)
+            if execution is not None:
+                self._finish_execution(execution, result)
+            # Only top-level results end up in the output; nested ones feed prompts
+            if self.syntax_pass and format and block_id in top_level:
+                formatted[block_id] = self._start_syntax_pass(executor, result, format, block_id in inline,
+                                                              execution, fragment=block_id not in documents)
+        return on_result
+
+    def _dispatcher(self, graph: BlockGraph, format: Optional[str], inline: set,
+                    call_group: Callable[[List[BlockRequest]], Any],
+                    call_chain: Callable[[List[BlockRequest]], Any], executions: Dict[int, BlockExecution],
+                    source: Optional[str] = None) -> Callable[[List[int]], Tuple[Dict[int, str], List[Task]]]:
+        """
+        Creates the scheduler callback that prepares blocks once they are ready.
+        When profiling, it also starts a BlockExecution for each of them in ``executions``.
+        """
+        def dispatch(block_ids: List[int]) -> Tuple[Dict[int, str], List[Task]]:
+            requests = {}
+            for block_id in block_ids:
+                item = graph.nodes[block_id].item
+                request = requests[block_id] = self._prepare(self._bound_config(item, graph.results), format,
+                                                             single_line=block_id in inline)
+                if self.profile is not None:
+                    request.execution = executions[block_id] = self.profile.start_block(
+                        block_id, source, content=request.prompt, model=request.model, context_path=request.context,
+                    )
+            return self._plan(requests, call_group, call_chain)
+        return dispatch
+
+    def _inline_blocks(self, parsed_content: List[ParsedItem]) -> set:
+        """
+        Finds the top-level blocks that follow other text on the same line,
+        such as ``NAME=<?ono ... ?>``, whose answers are single-line values.
+        """
+        inline = set()
+        for previous, item in zip(parsed_content, parsed_content[1:]):
+            if item.kind is Kind.ONO and previous.kind is Kind.TEXT:
+                if _ends_with_text(previous.source[previous.start:previous.end]):
+                    inline.add(item.block_id)
+        return inline
+
+    def _document_blocks(self, parsed_content: List[ParsedItem]) -> set:
+        """
+        Finds the block that makes up the whole document, with nothing but
+        whitespace around it. Only its result can be checked by the format's
+        validator; any other block is a fragment of the document.
+        """
+        blocks = [item for item in parsed_content if item.kind is Kind.ONO]
+        if len(blocks) != 1 or any(item.content.strip() for item in parsed_content if item.kind is Kind.TEXT):
+            return set()
+        return {blocks[0].block_id}
+
+    def _parser_for(self, delimiters: Tuple[Tuple[str, str], ...]) -> OnoParser:
+        """
+        Gets a parser for a document's delimiters, reusing the processor's own when they match.
+        """
+        return self.parser if tuple(delimiters) == self.parser.delimiters else OnoParser(delimiters)
+
+    def _chain_of(self, item: ParsedItem) -> Optional[str]:
+        """
+        Gets the context tree a block continues, read from its own directives.
+        Forks such as "system/backup" read the history of "system", so they
+        share its chain.
+        """
+        conversation = item.config.directives.get("context")
+        if not conversation or conversation == "new":
+            return None
+        return conversation.split("/")[0]
+
+    def _prepare(self, block_config: BlockConfig, format: Optional[str] = None,
+                 single_line: bool = False) -> BlockRequest:
+        """
+        Turns a block's configuration into a request and computes its cache key.
+        """
+        params = dict(block_config.params)
+        model = params.pop("model", None) or self.config.get("passes.concept.model") or self.config.get("llm.default_model")
+        conversation = block_config.directives.get("context")
+        if conversation == "new":
+            conversation = None  # A fresh context, same as not setting one
+        context = conversation or self.context
+        key = None
+        if self.cache is not None:
+            key = ResponseCache.make_key(block_config.prompt, model, params, context, format, self._limits(single_line))
+        return BlockRequest(
+            prompt=block_config.prompt,
+            model=model,
+            params=params,
+            context=context,
+            key=key,
+            use_cache=block_config.directives.get("execution") != "always",
+            conversation=conversation,
+            format=format,
+            single_line=single_line,
+        )
+
+    def _plan(self, requests: Dict[int, BlockRequest], call_group: Callable[[List[BlockRequest]], Any],
+              call_chain: Callable[[List[BlockRequest]], Any]) -> Tuple[Dict[int, str], List[Task]]:
+        """
+        Turns requests for blocks that are ready into cached results and tasks.
+
+        Independent requests are served from the cache first and the rest sent to
+        the LLM individually or in batches. A request that duplicates another
+        one of the run shares its call: it rides along with the request that
+        claimed the answer if that is planned here, and otherwise waits for
+        it. Each request continuing a conversation is its own task; the graph
+        already orders it after the previous block of its chain.
+        ``call_group`` and ``call_chain`` resolve the tasks, synchronously or
+        as coroutines.
+        """
+        immediate: Dict[int, str] = {}
+        missing = []
+        tasks: List[Task] = []
+        owners: Dict[Future, BlockRequest] = {}
+        for block_id, request in requests.items():
+            if request.conversation:
+                tasks.append(([block_id], partial(call_chain, [request])))
+                continue
+            response = self._cached(request)
+            if response is not None:
+                immediate[block_id] = response
+                if request.execution is not None:
+                    request.execution.cache_hit = True
+                continue
+            claim, claimed, request.fuzzy = self._claim(request)
+            if claim is None or claimed:
+                request.claim = claim
+                missing.append(block_id)
+                if claim is not None:
+                    owners[claim] = request
+            elif claim in owners:
+                owners[claim].copies.append(request)
+            elif claim.done() and claim.exception() is None:
+                immediate[block_id] = self._copy(request, claim.result())
+            else:
+                tasks.append(([block_id], self._wait_for(claim, request, call_group)))
+
+        block_ids = {id(request): block_id for block_id, request in requests.items()}
+        for group in self._group(requests, missing):
+            group_requests = [requests[block_id] for block_id in group]
+            # The task answers the duplicates riding along after the group itself
+            copies = [block_ids[id(copy)] for request in group_requests for copy in request.copies]
+            tasks.append((group + copies, self._sharing(call_group, group_requests)))
+        return immediate, tasks
 
-        processed_blocks = []
-        for block in ono_blocks:
+    def _claim(self, request: BlockRequest) -> Tuple[Optional[Future], bool, bool]:
+        """
+        Looks the request up in the run's deduplication stage, unless it must
+        always be sent.
+        """
+        if not request.use_cache:
+            return None, False, False
+        scope = [request.model, request.params, request.context, request.format, request.single_line]
+        return self.dedup.claim(request.prompt, scope)
+
+    def _copy(self, request: BlockRequest, answer: str) -> str:
+        """
+        Answers a duplicate request with the answer of the request it matched.
+        """
+        self.dedup.metrics.record_shared(request.fuzzy)
+        self._store(request, answer)
+        if request.execution is not None:
+            request.execution.cache_hit = True
+        return answer
+
+    def _sharing(self, call_group: Callable[[List[BlockRequest]], Any], requests: List[BlockRequest]) -> Callable[[], Any]:
+        """
+        Wraps a group call so that it settles the group's deduplication claims
+        and answers their duplicates too, after the group's own answers.
+        """
+        def settle(answers: List[str]) -> List[str]:
+            for request, answer in zip(requests, answers):
+                if request.claim is not None:
+                    request.claim.set_result(answer)
+            return answers + [self._copy(copy, answer) for request, answer in zip(requests, answers)
+                              for copy in request.copies]
+
+        def fail(error: BaseException) -> None:
+            if not isinstance(error, Exception):
+                # Waiting duplicates mustn't take the owner's cancellation for their own
+                error = LLMError("The shared call was cancelled")
+            for request in requests:
+                if request.claim is not None and not request.claim.done():
+                    self.dedup.release(request.claim)
+                    request.claim.set_exception(error)
+
+        if asyncio.iscoroutinefunction(call_group):
+            async def run_async() -> List[str]:
+                try:
+                    return settle(await call_group(requests))
+                except BaseException as e:
+                    fail(e)
+                    raise
+            return run_async
+
+        def run() -> List[str]:
+            try:
+                return settle(call_group(requests))
+            except BaseException as e:
+                fail(e)
+                raise
+        return run
+
+    def _wait_for(self, claim: Future, request: BlockRequest,
+                  call_group: Callable[[List[BlockRequest]], Any]) -> Callable[[], Any]:
+        """
+        Creates the task for a duplicate of a request still in flight elsewhere
+        in the run. If that call fails, the duplicate makes its own.
+        """
+        if asyncio.iscoroutinefunction(call_group):
+            async def wait_async() -> List[str]:
+                try:
+                    return [self._copy(request, await asyncio.wrap_future(claim))]
+                except Exception:
+                    return await call_group([request])
+            return wait_async
+
+        def wait() -> List[str]:
+            try:
+                return [self._copy(request, claim.result())]
+            except Exception:
+                return call_group([request])
+        return wait
+
+    def _cached(self, request: BlockRequest) -> Optional[str]:
+        """
+        Returns the cached response for a request, if caching applies to it.
+        """
+        if request.key is None or not request.use_cache:
+            return None
+        return self.cache.get(request.key)
+
+    def _group(self, requests: Dict[int, BlockRequest], indexes: List[int]) -> List[List[int]]:
+        """
+        Groups requests that share a model, parameters and context into batches
+        of at most ``batch_size``. Without batching every request is its own group.
+        """
+        if self.batch_size <= 1:
+            return [[i] for i in indexes]
+
+        groups: Dict[str, List[int]] = {}
+        for i in indexes:
+            request = requests[i]
+            signature = json.dumps([request.model, request.params, request.context], sort_keys=True, default=str)
+            groups.setdefault(signature, []).append(i)
+
+        return [
+            members[start:start + self.batch_size]
+            for members in groups.values()
+            for start in range(0, len(members), self.batch_size)
+        ]
+
+    def _call_group(self, requests: List[BlockRequest]) -> List[str]:
+        """
+        Sends a group of requests to the LLM, as one batched prompt when there is
+        more than one. Falls back to individual calls if the batched answer
+        can't be split back into one result per block.
+        """
+        if len(requests) == 1:
+            return [self._call(requests[0])]
+
+        first = requests[0]
+        prompt = build_batch_prompt([request.prompt for request in requests])
+        started = self._begin(requests)
+        with self._call_slots:
+            response = self.llm_client.generate_text(prompt, model=first.model, **first.params)
+        self._record_call(requests, started, prompt, response)
+        answers = parse_batch_response(response, len(requests))
+        self.batch_metrics.record(len(requests), fallback=answers is None)
+        if answers is None:
+            return [self._call(request) for request in requests]
+        return self._finish_group(requests, answers)
+
+    async def _acall_group(self, requests: List[BlockRequest]) -> List[str]:
+        """
+        Sends a group of requests to the LLM like ``_call_group``, asynchronously.
+        """
+        if len(requests) == 1:
+            return [await self._acall(requests[0])]
+
+        first = requests[0]
+        prompt = build_batch_prompt([request.prompt for request in requests])
+        started = self._begin(requests)
+        response = await self.async_client.generate_text(prompt, model=first.model, **first.params)
+        self._record_call(requests, started, prompt, response)
+        answers = parse_batch_response(response, len(requests))
+        self.batch_metrics.record(len(requests), fallback=answers is None)
+        if answers is None:
+            return [await self._acall(request) for request in requests]
+        return self._finish_group(requests, answers)
+
+    def _finish_group(self, requests: List[BlockRequest], answers: List[str]) -> List[str]:
+        """
+        Applies answer limits to the answers of a batched call and caches them.
+        """
+        answers = [limit_answer(answer, request.single_line, self.max_answer_chars)
+                   for request, answer in zip(requests, answers)]
+        for request, answer in zip(requests, answers):
+            self._store(request, answer)
+        return answers
+
+    def _call_chain(self, requests: List[BlockRequest]) -> List[str]:
+        """
+        Resolves requests that continue conversations, one after another, adding
+        each exchange to its context's history.
+        """
+        responses = []
+        for request in requests:
+            self._begin([request])
+            contextual = self._contextual(request)
+            response = self._cached(contextual)
+            if response is None:
+                response = self._call(contextual)
+            elif request.execution is not None:
+                request.execution.cache_hit = True
+            self._record(request, response)
+            responses.append(response)
+        return responses
+
+    async def _acall_chain(self, requests: List[BlockRequest]) -> List[str]:
+        """
+        Resolves requests that continue conversations like ``_call_chain``, asynchronously.
+        """
+        responses = []
+        for request in requests:
+            self._begin([request])
+            # Compaction may summarize history with a blocking call
+            contextual = await asyncio.to_thread(self._contextual, request)
+            response = self._cached(contextual)
+            if response is None:
+                response = await self._acall(contextual)
+            elif request.execution is not None:
+                request.execution.cache_hit = True
+            self._record(request, response)
+            responses.append(response)
+        return responses
+
+    def _contextual(self, request: BlockRequest) -> BlockRequest:
+        """
+        Builds the request for a block continuing a conversation, with the
+        context's compacted history prepended.
+        """
+        messages = self.context_manager.get_messages(request.conversation)
+        messages = self.compactor.compact(messages, request.prompt, request.model)
+        prompt = format_history(messages, request.prompt)
+        return BlockRequest(
+            prompt=prompt,
+            model=request.model,
+            params=request.params,
+            context=request.context,
+            key=ResponseCache.make_key(prompt, request.model, request.params, request.context, request.format,
+                                       self._limits(request.single_line))
+            if request.key is not None else None,
+            use_cache=request.use_cache,
+            format=request.format,
+            single_line=request.single_line,
+            execution=request.execution,
+        )
+
+    def _record(self, request: BlockRequest, response: str) -> None:
+        """
+        Adds an exchange to its context's history.
+        """
+        self.context_manager.append_message(request.conversation, "user", request.prompt)
+        self.context_manager.append_message(request.conversation, "assistant", response)
+
+    def _start_syntax_pass(self, executor: ThreadPoolExecutor, text: str, format: str, single_line: bool = False,
+                           execution: Optional[BlockExecution] = None, fragment: bool = False) -> Future:
+        """
+        Validates a concept result on the validator pool and, unless it is
+        valid, sends it through the syntax pass on ``executor``. A fragment of
+        a larger document isn't validated, since validators check whole
+        documents; it always gets the syntax pass.
+
+        Returns:
+            A future for the final text.
+        """
+        outcome: Future = Future()
+
+        def validated(validation: Future) -> None:
             try:
-                response = self.llm_client.generate_text(block)
-                processed_blocks.append(response)
+                if validation.result():
+                    outcome.set_result(text)
+                    return
+                syntax = executor.submit(self._syntax, text, format, single_line, execution, fragment)
             except Exception as e:
-                print(f"Error processing block: {e}")
-                return text  # Return original text in case of error
+                outcome.set_exception(e)
+                return
+            syntax.add_done_callback(partial(_transfer, target=outcome))
+
+        if fragment:
+            validated(_finished(False))
+        else:
+            self.validators.submit(self._validate, text, format, execution).add_done_callback(validated)
+        return outcome
+
+    def _validate(self, text: str, format: str, execution: Optional[BlockExecution] = None) -> bool:
+        """
+        Checks whether the format's validator accepts a concept result. Output
+        that can't be validated goes through the syntax pass.
+        """
+        if not self.validators.validator(format).can_validate:
+            return False
+        if execution is None:
+            return not self.validators.errors(format, text)
+        started = self.profile.now()
+        valid = not self.validators.errors(format, text)
+        finished = self.profile.now()
+        execution.validation_time += finished - started
+        execution.spans.append(("validate", started, finished, threading.get_ident()))
+        return valid
+
+    def _syntax(self, text: str, format: str, single_line: bool = False,
+                execution: Optional[BlockExecution] = None, fragment: bool = False) -> str:
+        """
+        Runs the syntax pass on a concept result that didn't validate.
+        """
+        request = self._syntax_request(text, format, single_line, execution, fragment)
+        response = self._cached(request)
+        if response is None:
+            response = self._call(request, self.syntax_client)
+        if execution is not None:
+            execution.resolved_value = response
+        return response
+
+    async def _asyntax(self, text: str, format: str, single_line: bool = False,
+                       execution: Optional[BlockExecution] = None, fragment: bool = False) -> str:
+        """
+        Validates a concept result and runs the syntax pass on it like
+        ``_start_syntax_pass``, asynchronously.
+        """
+        if not fragment and await asyncio.wrap_future(self.validators.submit(self._validate, text, format, execution)):
+            return text
+        request = self._syntax_request(text, format, single_line, execution, fragment)
+        response = self._cached(request)
+        if response is None:
+            response = await self._acall(request, self.async_syntax_client)
+        if execution is not None:
+            execution.resolved_value = response
+        return response
 
-        # Replace Ono blocks with processed content
-        output_text = text
-        for i, block in enumerate(ono_blocks):
-            output_text = output_text.replace(f"<?ono {block} ?>", processed_blocks[i])
+    def _syntax_request(self, text: str, format: str, single_line: bool,
+                        execution: Optional[BlockExecution] = None, fragment: bool = False) -> BlockRequest:
+        """
+        Builds the syntax pass request for a concept result.
+        """
+        prompt = (FRAGMENT_SYNTAX_PROMPT if fragment else SYNTAX_PROMPT).format(format=format, text=text)
+        key = None
+        if self.cache is not None:
+            key = ResponseCache.make_key(prompt, self.syntax_model, format=format, limits=self._limits(single_line))
+        return BlockRequest(prompt=prompt, model=self.syntax_model, key=key, format=format, single_line=single_line,
+                            stage="syntax", execution=execution)
 
-        return output_text
\ No newline at end of file
+    def _limits(self, single_line: bool) -> Optional[Dict[str, Any]]:
+        """
+        Describes how answers are cut short, for cache keys.
+        """
+        limits = {"single_line": True} if single_line else {}
+        if self.max_answer_chars is not None:
+            limits["max_chars"] = self.max_answer_chars
+        return limits or None
+
+    def _summarize(self, prompt: str) -> str:
+        """
+        Asks the default model for a digest of older context history.
+        """
+        model = self.config.get("llm.default_model")
+        key = ResponseCache.make_key(prompt, model) if self.cache is not None else None
+        request = BlockRequest(prompt=prompt, model=model, key=key)
+        return self._cached(request) or self._call(request)
+
+    def _call(self, request: BlockRequest, client: Optional[LLMClient] = None) -> str:
+        """
+        Sends a single request to the LLM (``llm_client`` unless another client
+        is given) and caches the response.
+        """
+        client = client or self.llm_client
+        started = self._begin([request])
+        with self._call_slots:
+            answer = client.generate_text(request.prompt, model=request.model, single_line=request.single_line,
+                                          max_chars=self.max_answer_chars, **request.params)
+        # The client stops streamed answers early; cutting again covers clients that don't
+        response = limit_answer(answer, request.single_line, self.max_answer_chars)
+        self._record_call([request], started, request.prompt, response)
+        self._store(request, response)
+        return response
+
+    async def _acall(self, request: BlockRequest, client: Optional[AsyncLLMClient] = None) -> str:
+        """
+        Sends a single request to the LLM like ``_call``, asynchronously.
+        """
+        client = client or self.async_client
+        started = self._begin([request])
+        response = limit_answer(
+            await client.generate_text(request.prompt, model=request.model, single_line=request.single_line,
+                                       max_chars=self.max_answer_chars, **request.params),
+            request.single_line, self.max_answer_chars,
+        )
+        self._record_call([request], started, request.prompt, response)
+        self._store(request, response)
+        return response
+
+    def _begin(self, requests: List[BlockRequest]) -> Optional[float]:
+        """
+        Marks profiled requests as picked up by a worker.
+
+        Returns:
+            The current profile time, or None when not profiling.
+        """
+        if self.profile is None:
+            return None
+        now = self.profile.now()
+        for request in requests:
+            execution = request.execution
+            if execution is not None and execution.started_at is None:
+                execution.started_at = now
+                execution.thread_id = threading.get_ident()
+        return now
+
+    def _record_call(self, requests: List[BlockRequest], started: Optional[float], prompt: str, response: str) -> None:
+        """
+        Adds an LLM call to the profile of the blocks it resolved. Each of them
+        waited for the whole call; the tokens are split between them.
+        """
+        if started is None:
+            return
+        finished = self.profile.now()
+        retries = last_retries()
+        tokens_in = estimate_tokens(prompt) // len(requests)
+        tokens_out = estimate_tokens(response) // len(requests)
+        for request in requests:
+            execution = request.execution
+            if execution is None:
+                continue
+            execution.llm_calls += 1
+            execution.llm_latency += finished - started
+            execution.tokens_in += tokens_in
+            execution.tokens_out += tokens_out
+            execution.retries += retries
+            execution.batched = execution.batched or len(requests) > 1
+            execution.spans.append((request.stage, started, finished, threading.get_ident()))
+
+    def _finish_execution(self, execution: BlockExecution, result: str) -> None:
+        execution.finished_at = self.profile.now()
+        execution.resolved_value = result
+        if execution.started_at is None:
+            execution.started_at = execution.finished_at  # Served from the cache without queueing
+
+    def _store(self, request: BlockRequest, response: str) -> None:
+        if request.key is not None:
+            self.cache.set(request.key, response)
+
+    def _block_prompt(self, item: ParsedItem, results: Union[List[str], Dict[int, str]]) -> str:
+        """
+        Builds the prompt for a block, without its configuration, substituting
+        the results of its nested blocks and binding variables in its own text
+        (but not in those results).
+        """
+        config = item.config
+        if item.parsed is None:
+            return substitute(config.prompt, self.variables)
+        parts = []
+        for index, child in enumerate(item.parsed):
+            if child.kind is Kind.ONO:
+                parts.append(results[child.block_id])
+                continue
+            text = child.content
+            if index == 0:
+                # Only the prompt, with the whitespace before the next nested block, follows the configuration
+                end = len(text.rstrip())
+                text = text[end - len(config.prompt):] if config.prompt else text[end:]
+            parts.append(substitute(text, self.variables))
+        return ''.join(parts).strip()
+
+    def _bound_config(self, item: ParsedItem, results: Union[List[str], Dict[int, str]]) -> BlockConfig:
+        """
+        Gets a block's configuration, read from its own text, with the prompt
+        built by ``_block_prompt``.
+        """
+        config = item.config
+        prompt = self._block_prompt(item, results)
+        return config if prompt == config.prompt else replace(config, prompt=prompt)
+
+def _ends_with_text(text: str) -> bool:
+    """
+    Checks whether the last line of some text has anything but whitespace on it.
+    """
+    return bool(text[text.rfind('\n') + 1:].strip())
+
+def _finished(result: Any) -> Future:
+    """
+    Creates a future that already has its result.
+    """
+    future: Future = Future()
+    future.set_result(result)
+    return future
+
+def _transfer(source: Future, target: Future) -> None:
+    """
+    Copies the outcome of a finished future to another.
+    """
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
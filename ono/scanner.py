@@ -0,0 +1,190 @@
+"""
+This module contains the delimiter scanner shared by Ono's parsers.
+
+Every delimiter pair in a set is compiled into one regular expression, so a
+single pass over the text finds all the openers and closers of all the pairs
+at once. Compiled scanners are cached per delimiter set.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+# (opener, closer) pairs, in the order of the specification's delimiter table
+DEFAULT_DELIMITERS: Tuple[Tuple[str, str], ...] = (
+    ('<?ono', '?>'),
+    ('"?ono', '?"'),
+    ("'?ono", "?'"),
+    ('{?ono', '?}'),
+    ('[?ono', '?]'),
+    ('🐊?ono', '🦋'),
+)
+
+KEYWORD = '?ono'
+HEADER_LIMIT = 4096  # File-level configuration must start within this many characters
+
+# A file-level configuration block, e.g. "# ?ono" ... "# ?", optionally after a shebang line
+_HEADER = re.compile(
+    r'\A(?:#![^\n]*\n)?\s*(?:#|//|--|;)?[^\S\n]*\?ono[^\S\n]*\n(.*?)^[^\S\n]*(?:#|//|--|;)?[^\S\n]*\?[^\S\n]*$',
+    re.DOTALL | re.MULTILINE,
+)
+# The line opening a file-level configuration block, e.g. "# ?ono"
+_HEADER_START = re.compile(r'\A(?:#![^\n]*\n)?\s*(?:#|//|--|;)?[^\S\n]*\?ono[^\S\n]*\n')
+_DELIMITERS_SETTING = re.compile(r'^[^\S\n]*(?:#|//|--|;)?[^\S\n]*delimiters\s*=\s*(\S+?)\s*,\s*(\S+)', re.MULTILINE)
+
+class DelimiterScanner:
+    """
+    Finds the openers and closers of a set of delimiter pairs in one pass.
+
+    A closer that doesn't itself start with '?' may be written with one in
+    front, as in ``🐊?ono ... ?🦋``. The '?' is then part of the closer.
+    """
+
+    def __init__(self, pairs: Sequence[Tuple[str, str]]):
+        """
+        Initializes the DelimiterScanner.
+
+        Args:
+            pairs: The (opener, closer) pairs to recognize.
+        """
+        self.pairs = tuple(pairs)
+        tokens: Dict[str, Tuple[bool, int]] = {}
+        alternatives = []
+        for index, (opener, closer) in enumerate(self.pairs):
+            tokens.setdefault(opener, (True, index))
+            tokens.setdefault(closer, (False, index))
+            alternatives.append((len(opener), re.escape(opener)))
+            if closer.startswith('?'):
+                alternatives.append((len(closer), re.escape(closer)))
+            else:
+                tokens.setdefault('?' + closer, (False, index))
+                alternatives.append((len(closer) + 1, re.escape('?' + closer)))
+                alternatives.append((len(closer), re.escape(closer)))
+        # Longest first, so a delimiter that starts with a shorter one still wins. Every
+        # alternative starts with a literal, which lets ``re`` skip ahead to candidate characters.
+        alternatives.sort(key=lambda alternative: -alternative[0])
+        self.pattern = re.compile('|'.join(pattern for _, pattern in alternatives))
+        self.tokens = tokens
+        self.longest = max(length for length, _ in alternatives)
+        # The same search over UTF-8 bytes. UTF-8 never encodes one character inside
+        # another, so the byte pattern matches exactly where the text pattern would.
+        self.byte_tokens = {token.encode('utf-8'): value for token, value in tokens.items()}
+        encoded = sorted(self.byte_tokens, key=len, reverse=True)
+        self.byte_pattern = re.compile(b'|'.join(re.escape(token) for token in encoded))
+        self.longest_bytes = len(encoded[0])
+        # The ending every opener shares ('?ono' unless the pairs are unusual), found with a
+        # plain substring search to skip over passthrough text
+        openers = [opener.encode('utf-8') for opener, _ in self.pairs]
+        self.opener_suffix = openers[0]
+        for opener in openers[1:]:
+            while not opener.endswith(self.opener_suffix):
+                self.opener_suffix = self.opener_suffix[1:]
+
+    def scan(self, text: str, pos: int = 0) -> Iterator[Tuple[bool, int, int, int]]:
+        """
+        Finds every delimiter in ``text`` from ``pos`` on.
+
+        Yields:
+            (is_opener, pair index, start, end) for each delimiter, in order.
+        """
+        tokens = self.tokens
+        for match in self.pattern.finditer(text, pos):
+            opens, pair = tokens[match.group()]
+            yield opens, pair, match.start(), match.end()
+
+    def scan_bytes(self, data, pos: int = 0) -> Iterator[Tuple[bool, int, int, int]]:
+        """
+        Finds every delimiter in UTF-8 ``data`` from byte ``pos`` on, like ``scan``.
+
+        Args:
+            data: Any bytes-like object, such as an ``mmap``.
+            pos: The byte offset to start at.
+
+        Yields:
+            (is_opener, pair index, start, end) for each delimiter, in bytes.
+        """
+        tokens = self.byte_tokens
+        for match in self.byte_pattern.finditer(data, pos):
+            opens, pair = tokens[match.group()]
+            yield opens, pair, match.start(), match.end()
+
+    def find_opener_bytes(self, data, pos: int = 0) -> int:
+        """
+        Finds the next opener in UTF-8 ``data`` from byte ``pos`` on.
+
+        Rather than running the full pattern over text that can't be inside a
+        block, this searches for the ending all the openers share, which runs
+        at memory speed, and checks the few bytes before each hit.
+
+        Returns:
+            The byte offset of the opener, or -1 if there isn't one.
+        """
+        if not self.opener_suffix:
+            return next((start for opens, _, start, _ in self.scan_bytes(data, pos) if opens), -1)
+        find, suffix = data.find, self.opener_suffix
+        while True:
+            hit = find(suffix, pos)
+            if hit < 0:
+                return -1
+            end = hit + len(suffix)
+            # Rescan a little before the hit, so a closer that overlaps the opener takes
+            # precedence as it would in a full scan
+            for match in self.byte_pattern.finditer(data, max(pos, end - 2 * self.longest_bytes), end):
+                if match.end() == end and self.byte_tokens[match.group()][0]:
+                    return match.start()
+            pos = hit + 1
+
+def get_scanner(pairs: Sequence[Tuple[str, str]] = DEFAULT_DELIMITERS) -> DelimiterScanner:
+    """
+    Gets the scanner for a delimiter set, compiling it only the first time.
+    """
+    return _compile(tuple(tuple(pair) for pair in pairs))
+
+@lru_cache(maxsize=32)
+def _compile(pairs: Tuple[Tuple[str, str], ...]) -> DelimiterScanner:
+    return DelimiterScanner(pairs)
+
+def has_blocks(text: str) -> bool:
+    """
+    Checks cheaply whether a template may contain Ono blocks. Every opener,
+    including a file-level override, ends with ``?ono``, so text without it
+    has nothing to process.
+    """
+    return KEYWORD in text
+
+def file_delimiters(text: str) -> Optional[Tuple[Tuple[str, str], ...]]:
+    """
+    Reads a ``delimiters=<open>, <close>`` override from a template's
+    file-level configuration block.
+
+    Returns:
+        The custom pair as a one-pair delimiter set, which replaces the
+        defaults for the file, or None if the file doesn't set one.
+    """
+    if KEYWORD not in text[:HEADER_LIMIT]:
+        return None
+    header = _HEADER.match(text[:HEADER_LIMIT])
+    if header is None:
+        return None
+    setting = _DELIMITERS_SETTING.search(header.group(1))
+    if setting is None:
+        return None
+    return ((setting.group(1) + KEYWORD, setting.group(2)),)
+
+def header_complete(text: str) -> bool:
+    """
+    Checks whether the start of a template is long enough for
+    ``file_delimiters`` to give the same answer as for the whole template,
+    so a stream can choose its delimiters before reading everything.
+    """
+    if len(text) >= HEADER_LIMIT:
+        return True
+    header = _HEADER.match(text)
+    if header is not None and header.end() < len(text):
+        return True  # Closed, with its closing line complete
+    if _HEADER_START.match(text):
+        return False  # Opened, but not closed yet
+    # Without a header opener, the first line with any text (after a shebang) decides it
+    if text.startswith('#!'):
+        text = text[text.find('\n') + 1:] if '\n' in text else ''
+    return '\n' in text.lstrip()
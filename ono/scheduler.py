@@ -0,0 +1,257 @@
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from ono.parser import Kind, ParsedItem
+
+# A unit of work: the block IDs it resolves and a callable returning their results in order
+# (or, for AsyncScheduler, a coroutine function returning them)
+Task = Tuple[List[int], Callable[[], Any]]
+
+@dataclass
+class BlockNode:
+    """
+    One Ono block in the dependency graph.
+    """
+    item: ParsedItem
+    chain: Optional[str] = None  # The context tree the block continues, if any
+    dependencies: Set[int] = field(default_factory=set)
+    dependents: List[int] = field(default_factory=list)
+
+class BlockGraph:
+    """
+    The dependencies between the Ono blocks of a document.
+
+    A block depends on the blocks nested inside it, whose results are
+    substituted into its prompt. Blocks continuing the same context tree also
+    depend on the previous block of that chain. Chains are ordered by where
+    blocks end, so a nested block always comes before the block containing it
+    and the graph can't have cycles.
+    """
+
+    def __init__(self, parsed: List[ParsedItem], chain_of: Optional[Callable[[ParsedItem], Optional[str]]] = None):
+        """
+        Initializes the BlockGraph.
+
+        Args:
+            parsed: The parsed document, with blocks numbered by ``block_id``.
+            chain_of: Called with a block; returns the context chain it belongs
+                to, or None for an independent block.
+        """
+        self.nodes: Dict[int, BlockNode] = {}
+        self.results: Dict[int, Any] = {}
+        self.chain_of = chain_of
+        self._waiting: Dict[int, int] = {}
+        self._chain_tails: Dict[str, int] = {}  # The last block of each chain so far
+        self.extend(parsed)
+
+    def extend(self, parsed: List[ParsedItem]) -> List[int]:
+        """
+        Adds blocks that follow every block already in the graph, such as the
+        next top-level block of a stream.
+
+        The blocks are renumbered to follow the ones in the graph, so a
+        fragment parsed on its own (numbered from 0) can be added as it is.
+        Its chained blocks depend on the last block of their chain so far,
+        even if that one is already resolved.
+
+        Returns:
+            The added blocks that are ready to run, in document order.
+        """
+        base = len(self.nodes)
+        added: List[BlockNode] = []
+        pending = [(item, None) for item in parsed]
+        while pending:
+            item, parent = pending.pop()
+            if item.kind is not Kind.ONO:
+                continue
+            item.block_id += base
+            node = self.nodes[item.block_id] = BlockNode(item, self.chain_of(item) if self.chain_of else None)
+            added.append(node)
+            if parent is not None:
+                self._add_edge(item.block_id, parent)
+            pending.extend((child, item.block_id) for child in item.parsed or [])
+
+        chains: Dict[str, List[BlockNode]] = {}
+        for node in added:
+            if node.chain is not None:
+                chains.setdefault(node.chain, []).append(node)
+        for chain, members in chains.items():
+            members.sort(key=lambda node: node.item.end)
+            previous = self._chain_tails.get(chain)
+            for node in members:
+                if previous is not None:
+                    self._add_edge(previous, node.item.block_id)
+                previous = node.item.block_id
+            self._chain_tails[chain] = previous
+
+        for node in added:
+            block_id = node.item.block_id
+            self._waiting[block_id] = sum(1 for dependency in node.dependencies if dependency not in self.results)
+        return sorted(node.item.block_id for node in added if self._waiting[node.item.block_id] == 0)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def ready(self) -> List[int]:
+        """
+        Gets the blocks that have no dependencies, in document order.
+        """
+        return sorted(block_id for block_id, count in self._waiting.items() if count == 0)
+
+    def complete(self, block_id: int, result: Any) -> List[int]:
+        """
+        Records the result of a block.
+
+        Returns:
+            The blocks that became ready because of it.
+        """
+        self.results[block_id] = result
+        released = []
+        for dependent in self.nodes[block_id].dependents:
+            self._waiting[dependent] -= 1
+            if self._waiting[dependent] == 0:
+                released.append(dependent)
+        return released
+
+    def _add_edge(self, before: int, after: int) -> None:
+        if before not in self.nodes[after].dependencies:
+            self.nodes[after].dependencies.add(before)
+            self.nodes[before].dependents.append(after)
+
+class Scheduler:
+    """
+    Runs a BlockGraph on a thread pool, starting every block as soon as the
+    blocks it depends on are resolved.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor):
+        """
+        Initializes the Scheduler.
+
+        Args:
+            executor: The thread pool tasks are submitted to.
+        """
+        self.executor = executor
+        self.running: Dict[Future, List[int]] = {}  # Tasks in flight and the blocks they resolve
+
+    def run(self, graph: BlockGraph,
+            dispatch: Callable[[List[int]], Tuple[Dict[int, Any], Iterable[Task]]],
+            on_result: Optional[Callable[[int, Any], None]] = None) -> Dict[int, Any]:
+        """
+        Resolves every block in the graph.
+
+        Args:
+            graph: The blocks and their dependencies.
+            dispatch: Called with the IDs of blocks that just became ready.
+                Returns the results available immediately (e.g. from a cache)
+                and the tasks to run for the rest, which may each cover several
+                blocks.
+            on_result: Called with each block ID and its result as soon as the
+                block is resolved, e.g. to start a follow-up stage.
+
+        Returns:
+            The results indexed by block ID, also kept in ``graph.results``.
+        """
+        self.start(graph, graph.ready(), dispatch, on_result)
+        while self.running:
+            self.wait(graph, dispatch, on_result)
+        return graph.results
+
+    def start(self, graph: BlockGraph, block_ids: List[int],
+              dispatch: Callable[[List[int]], Tuple[Dict[int, Any], Iterable[Task]]],
+              on_result: Optional[Callable[[int, Any], None]] = None) -> None:
+        """
+        Dispatches blocks that are ready, and the blocks their immediate
+        results release, without waiting for any task. Together with ``wait``
+        this runs a graph that grows while it is resolved (see
+        ``BlockGraph.extend``); the arguments are those of ``run``.
+        """
+        ready = list(block_ids)
+        while ready:
+            immediate, tasks = dispatch(sorted(ready))
+            ready = []
+            for task_block_ids, task in tasks:
+                self.running[self.executor.submit(task)] = task_block_ids
+            for block_id, result in immediate.items():
+                ready.extend(_complete(graph, block_id, result, on_result))
+
+    def wait(self, graph: BlockGraph,
+             dispatch: Callable[[List[int]], Tuple[Dict[int, Any], Iterable[Task]]],
+             on_result: Optional[Callable[[int, Any], None]] = None, timeout: Optional[float] = None) -> None:
+        """
+        Waits until a running task finishes (or ``timeout`` seconds pass),
+        records its results and dispatches the blocks they release.
+
+        Raises:
+            Exception: Whatever a finished task raised.
+        """
+        done, _ = wait(self.running, timeout=timeout, return_when=FIRST_COMPLETED)
+        ready = []
+        for future in sorted(done, key=lambda future: self.running[future][0]):
+            block_ids = self.running.pop(future)
+            for block_id, result in zip(block_ids, future.result()):
+                ready.extend(_complete(graph, block_id, result, on_result))
+        self.start(graph, ready, dispatch, on_result)
+
+class AsyncScheduler:
+    """
+    Runs a BlockGraph on the running event loop, like Scheduler, with at most
+    ``max_concurrency`` tasks awaited at once.
+
+    If the run fails or is cancelled, every task still in flight is cancelled.
+    """
+
+    def __init__(self, max_concurrency: int):
+        """
+        Initializes the AsyncScheduler.
+
+        Args:
+            max_concurrency: The maximum number of tasks running at once.
+        """
+        self.max_concurrency = max_concurrency
+
+    async def run(self, graph: BlockGraph,
+                  dispatch: Callable[[List[int]], Tuple[Dict[int, Any], Iterable[Task]]],
+                  on_result: Optional[Callable[[int, Any], None]] = None) -> Dict[int, Any]:
+        """
+        Resolves every block in the graph. Takes the same arguments as
+        ``Scheduler.run``, except that tasks are coroutine functions.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        running: Dict[asyncio.Future, List[int]] = {}
+        ready = graph.ready()
+
+        async def limited(task: Callable[[], Any]) -> Any:
+            async with semaphore:
+                return await task()
+
+        try:
+            while ready or running:
+                if ready:
+                    immediate, tasks = dispatch(sorted(ready))
+                    ready = []
+                    for block_ids, task in tasks:
+                        running[asyncio.ensure_future(limited(task))] = block_ids
+                    for block_id, result in immediate.items():
+                        ready.extend(_complete(graph, block_id, result, on_result))
+                    continue
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for future in sorted(done, key=lambda future: running[future][0]):
+                    block_ids = running.pop(future)
+                    for block_id, result in zip(block_ids, future.result()):
+                        ready.extend(_complete(graph, block_id, result, on_result))
+        finally:
+            for future in running:
+                future.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        return graph.results
+
+def _complete(graph: BlockGraph, block_id: int, result: Any,
+              on_result: Optional[Callable[[int, Any], None]]) -> List[int]:
+    if on_result is not None:
+        on_result(block_id, result)
+    return graph.complete(block_id, result)
@@ -0,0 +1,117 @@
+from typing import Iterator, List, Optional, Sequence, Tuple
+from ono.scanner import DelimiterScanner, file_delimiters, get_scanner, header_complete
+
+class StreamScanner:
+    """
+    Incrementally splits a stream of text into passthrough text and complete
+    top-level Ono blocks.
+
+    Chunks are fed in as they are read. Passthrough text is released as soon as
+    it can't be the start of a tag, so only the current block (and at most a
+    partial tag) is ever held in memory. A ``delimiters=`` override in the
+    template's file-level configuration replaces the given delimiters, as in
+    ``OnoParser.parse``; text is held back only until the start of the
+    template shows whether it has one.
+    """
+
+    def __init__(self, start_tag: str = '<?ono', end_tag: str = '?>',
+                 delimiters: Optional[Sequence[Tuple[str, str]]] = None):
+        """
+        Initializes the StreamScanner.
+
+        Args:
+            start_tag: The tag opening an Ono block.
+            end_tag: The tag closing an Ono block.
+            delimiters: The (opener, closer) pairs to recognize, instead of
+                just ``start_tag`` and ``end_tag``.
+        """
+        self.start_tag = start_tag
+        self.end_tag = end_tag
+        self.delimiters = tuple(delimiters) if delimiters else ((start_tag, end_tag),)
+        self._scanner: Optional[DelimiterScanner] = None  # Chosen once the header is read
+        self._holdback = 0
+        self._buffer = ''
+        self._scan_from = 0
+        self._open: List[int] = []  # The pair of each block open at this point
+
+    def feed(self, chunk: str) -> Iterator[Tuple[str, str]]:
+        """
+        Scans the next chunk of the stream.
+
+        Args:
+            chunk: The next piece of text.
+
+        Yields:
+            ('text', passthrough) and ('block', raw block including its tags) pairs in stream order.
+        """
+        if self._scanner is None:
+            self._buffer += chunk
+            if not header_complete(self._buffer):
+                return iter(())
+            self._choose_delimiters()
+            chunk, self._buffer = self._buffer, ''
+        return iter(self._scan(chunk, final=False))
+
+    def close(self) -> Iterator[Tuple[str, str]]:
+        """
+        Flushes whatever is left at the end of the stream.
+
+        An unclosed block is passed through as text, as ``OnoParser.parse`` does.
+        """
+        if self._scanner is None:
+            # The whole stream was shorter than its header could be
+            self._choose_delimiters()
+        events = self._scan('', final=True)
+        remainder, self._buffer, self._scan_from, self._open = self._buffer, '', 0, []
+        if remainder:
+            events.append(('text', remainder))
+        return iter(events)
+
+    def _scan(self, chunk: str, final: bool) -> List[Tuple[str, str]]:
+        """
+        Scans the buffered text and the next chunk for complete blocks.
+
+        Until the stream ends, the last few characters are held back: a
+        delimiter found there may be the start of a longer one that is still
+        to come, such as ``%%`` in ``%%?ono``.
+        """
+        buffer = self._buffer + chunk
+        holdback = 0 if final else self._holdback
+        events: List[Tuple[str, str]] = []
+        block_start = 0
+        last_end = self._scan_from
+
+        for opens, pair, start, end in self._scanner.scan(buffer, self._scan_from):
+            if start >= len(buffer) - holdback:
+                break
+            if opens:
+                if not self._open:
+                    if start > block_start:
+                        events.append(('text', buffer[block_start:start]))
+                    block_start = start
+                self._open.append(pair)
+            elif self._open and self._open[-1] == pair:
+                self._open.pop()
+                if not self._open:
+                    events.append(('block', buffer[block_start:end]))
+                    block_start = end
+            last_end = end
+
+        # Resume after the last tag, but rescan the tail in case a tag straddles chunks
+        resume = max(last_end, len(buffer) - holdback, block_start)
+        if not self._open:
+            if resume > block_start:
+                events.append(('text', buffer[block_start:resume]))
+            block_start = resume
+
+        self._buffer = buffer[block_start:]
+        self._scan_from = resume - block_start
+        return events
+
+    def _choose_delimiters(self) -> None:
+        """
+        Compiles the scanner for the delimiters set in the buffered header, if any.
+        """
+        self.delimiters = file_delimiters(self._buffer) or self.delimiters
+        self._scanner = get_scanner(self.delimiters)
+        self._holdback = self._scanner.longest - 1
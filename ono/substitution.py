@@ -0,0 +1,276 @@
+"""
+This module contains the variable substitution engine for Ono blocks.
+
+Block text may refer to variables (``$name``), function calls
+(``$name(arg, ...)``) and expressions (``$(expression)``), as in section 4 of
+the specification. Each distinct text is compiled once into a Template, and
+binding a Template to a set of variables only joins its parts, so
+re-rendering with other variables never parses a block again.
+
+Variables without a value are left as written, for the LLM to translate into
+the target language. An expression is evaluated when every name in it is
+bound and it is plain arithmetic; otherwise it is left as written too.
+"""
+
+import ast
+import json
+import operator
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+
+TEMPLATE_CACHE_SIZE = 4096  # Compiled block texts kept per process
+
+_TOKEN = re.compile(r'\$\$|\$\(|\$([A-Za-z_][A-Za-z0-9_]*)(\()?|[(),]')
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+MAX_EXPONENT = 64  # Larger powers are left for the LLM rather than computed
+
+Part = Union[str, 'Variable', 'Call', 'Expression']
+
+class Variable:
+    """
+    A ``$name`` reference.
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def bind(self, variables: Mapping[str, Any]) -> str:
+        if self.name in variables:
+            return format_value(variables[self.name])
+        return '$' + self.name
+
+class Call:
+    """
+    A ``$name(arg, ...)`` call. The arguments keep their original spacing.
+    """
+    __slots__ = ('name', 'args')
+
+    def __init__(self, name: str, args: Tuple[Tuple[Part, ...], ...]):
+        self.name = name
+        self.args = args
+
+    def bind(self, variables: Mapping[str, Any]) -> str:
+        name = format_value(variables[self.name]) if self.name in variables else '$' + self.name
+        return name + '(' + ','.join(_bind(arg, variables) for arg in self.args) + ')'
+
+class Expression:
+    """
+    A ``$(expression)`` stanza.
+    """
+    __slots__ = ('parts', 'tree')
+
+    def __init__(self, parts: Tuple[Part, ...]):
+        self.parts = parts
+        self.tree = _parse_expression(parts)
+
+    def bind(self, variables: Mapping[str, Any]) -> str:
+        if self.tree is not None:
+            try:
+                return format_value(_evaluate(self.tree, variables))
+            except (KeyError, TypeError, ValueError, ArithmeticError):
+                pass
+        return '$(' + _bind(self.parts, variables) + ')'
+
+class Template:
+    """
+    Block text compiled into literal text and substitutions.
+    """
+    __slots__ = ('parts', 'names')
+
+    def __init__(self, parts: Tuple[Part, ...]):
+        """
+        Initializes the Template.
+
+        Args:
+            parts: Literal strings and Variable, Call or Expression nodes, in order.
+        """
+        self.parts = parts
+        self.names = frozenset(_names(parts))
+
+    def bind(self, variables: Mapping[str, Any]) -> str:
+        """
+        Renders the text with the given variables substituted.
+
+        Args:
+            variables: Values by variable name. Names without a value are left as written.
+
+        Returns:
+            The bound text, which only changes when a variable it uses changes.
+        """
+        return _bind(self.parts, variables)
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(text: str) -> Template:
+    """
+    Parses block text into a Template, once per distinct text.
+
+    The parser keeps a stack of the calls and expressions that are open:
+    ``$name(`` and ``$(`` push one, and the ``)`` that closes it pops it.
+    Parentheses inside are balanced, and commas directly inside a call
+    separate its arguments. ``$$`` is kept as it is, so ``$$name`` isn't a
+    reference. A call or expression that is never closed is left as literal
+    text, and binding no variables gives back the original text.
+    """
+    root: List[Part] = []
+    # Each frame is [kind (a name for calls, None for expressions), start, finished args, current part list, depth]
+    stack: List[list] = []
+    parts, last = root, 0
+
+    for match in _TOKEN.finditer(text):
+        token, start, end = match.group(), match.start(), match.end()
+        _add_text(parts, text[last:start])
+        last = end
+        if token == '$$':
+            _add_text(parts, token)
+        elif token == '$(' or match.group(2):
+            stack.append([match.group(1), start, [], [], 0])
+            parts = stack[-1][3]
+        elif match.group(1):
+            parts.append(Variable(match.group(1)))
+        elif not stack:
+            _add_text(parts, token)
+        elif token == '(':
+            stack[-1][4] += 1
+            _add_text(parts, token)
+        elif token == ',' and (stack[-1][0] is None or stack[-1][4]):
+            _add_text(parts, token)
+        elif token == ',':
+            stack[-1][2].append(tuple(parts))
+            parts = stack[-1][3] = []
+        elif stack[-1][4]:
+            stack[-1][4] -= 1
+            _add_text(parts, token)
+        else:
+            name, _, args, current, _ = stack.pop()
+            if name is None:
+                node: Part = Expression(tuple(current))
+            else:
+                node = Call(name, tuple(args) + (tuple(current),))
+            parts = stack[-1][3] if stack else root
+            parts.append(node)
+
+    if stack:
+        # Unclosed - everything from the outermost open stanza on is text
+        _add_text(root, text[stack[0][1]:])
+    else:
+        _add_text(root, text[last:])
+    return Template(tuple(root))
+
+def substitute(text: str, variables: Optional[Mapping[str, Any]]) -> str:
+    """
+    Binds the variables in block text, compiling it on first use.
+    """
+    if not variables or '$' not in text:
+        return text
+    return compile_template(text).bind(variables)
+
+def format_value(value: Any) -> str:
+    """
+    Renders a variable's value as text: strings as they are, anything else as JSON.
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return json.dumps(value)
+
+def load_variables(path: Optional[str]) -> Dict[str, Any]:
+    """
+    Loads the variables defined in a context file, a YAML or JSON mapping of
+    names to values.
+
+    Returns:
+        The variables, or an empty dictionary if ``path`` isn't a file or
+        doesn't hold a mapping.
+    """
+    if not path or not os.path.isfile(path):
+        return {}
+    import yaml
+
+    try:
+        with open(path, "r") as f:
+            data = yaml.safe_load(f)
+    except yaml.YAMLError as e:
+        print(f"Error loading context file: {path} - {e}")
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {str(name): value for name, value in data.items()}
+
+def _add_text(parts: List[Part], text: str) -> None:
+    if not text:
+        return
+    if parts and isinstance(parts[-1], str):
+        parts[-1] += text
+    else:
+        parts.append(text)
+
+def _bind(parts: Tuple[Part, ...], variables: Mapping[str, Any]) -> str:
+    return ''.join(part if isinstance(part, str) else part.bind(variables) for part in parts)
+
+def _names(parts: Tuple[Part, ...]) -> List[str]:
+    names = []
+    for part in parts:
+        if isinstance(part, Variable):
+            names.append(part.name)
+        elif isinstance(part, Call):
+            names.append(part.name)
+            for arg in part.args:
+                names.extend(_names(arg))
+        elif isinstance(part, Expression):
+            names.extend(_names(part.parts))
+            if part.tree is not None:
+                names.extend(node.id for node in ast.walk(part.tree) if isinstance(node, ast.Name))
+    return names
+
+def _parse_expression(parts: Tuple[Part, ...]) -> Optional[ast.AST]:
+    """
+    Parses an expression stanza for evaluation, if it is plain arithmetic over
+    names, ``$name`` references and constants.
+    """
+    source = []
+    for part in parts:
+        if isinstance(part, str):
+            source.append(part)
+        elif isinstance(part, Variable):
+            source.append(part.name)
+        else:
+            return None  # Calls and nested stanzas are left to the LLM
+    try:
+        tree = ast.parse(''.join(source).strip(), mode='eval').body
+    except SyntaxError:
+        return None
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load, ast.operator, ast.unaryop)):
+            return None
+        if isinstance(node, ast.BinOp) and type(node.op) not in _BINARY_OPERATORS:
+            return None
+        if isinstance(node, ast.UnaryOp) and type(node.op) not in _UNARY_OPERATORS:
+            return None
+    return tree
+
+def _evaluate(node: ast.AST, variables: Mapping[str, Any]) -> Any:
+    if isinstance(node, (ast.Constant, ast.Name)):
+        value = node.value if isinstance(node, ast.Constant) else variables[node.id]
+        if not isinstance(value, (int, float)):
+            raise TypeError("Only numbers are evaluated")
+        return value
+    if isinstance(node, ast.UnaryOp):
+        return _UNARY_OPERATORS[type(node.op)](_evaluate(node.operand, variables))
+    left, right = _evaluate(node.left, variables), _evaluate(node.right, variables)
+    if isinstance(node.op, ast.Pow) and isinstance(right, (int, float)) and abs(right) > MAX_EXPONENT:
+        raise ValueError("Exponent too large")
+    return _BINARY_OPERATORS[type(node.op)](left, right)
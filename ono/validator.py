@@ -1,19 +1,103 @@
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_TIMEOUT = 10.0  # Seconds an external validator may run
+RESULT_CACHE_SIZE = 1024  # Validation results kept per pool
+
+def _check_json(text: str) -> None:
+    json.loads(text)
+
+def _check_python(text: str) -> None:
+    compile(text, "<ono>", "exec")
+
+# Formats that can be checked in-process; each check raises on invalid output
+CHECKS: Dict[str, Callable[[str], None]] = {
+    "json": _check_json,
+    "python": _check_python,
+}
+
+# Validator commands that the in-process checks replace, so they never fork
+IN_PROCESS_COMMANDS = {
+    "python -m py_compile": "python",
+    "python3 -m py_compile": "python",
+    "jq": "json",
+    "jq .": "json",
+}
+
+# External tools used when ``formats.<format>.validator`` isn't configured. They read standard input.
+DEFAULT_COMMANDS = {
+    "bash": "shellcheck --shell=bash -",
+    "sh": "shellcheck --shell=sh -",
+    "dockerfile": "hadolint -",
+}
+
+@lru_cache(maxsize=None)
+def find_tool(name: str) -> Optional[str]:
+    """
+    Finds an executable on the PATH, looking each name up only once per process.
+    """
+    return shutil.which(name)
+
 class Validator:
     """
     Validates the output of Ono processing.
 
-    This class provides methods for running format-specific validation tools,
-    parsing validation errors, and suggesting corrections.
+    JSON and Python are checked in-process with ``json.loads`` and
+    ``compile``. Other formats are checked by piping the output into an
+    external tool such as ``shellcheck`` or ``hadolint``. Formats without a
+    check, or whose tool isn't installed, are always reported as valid.
     """
 
-    def __init__(self, format: str):
+    def __init__(self, format: str, command: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT):
         """
         Initializes the Validator.
 
         Args:
             format: The output format (e.g., "bash", "python", "json").
+            command: The external validator to run, overriding the default for
+                the format. An empty string turns validation off.
+            timeout: Seconds the external validator may run before it is
+                treated as unavailable.
         """
         self.format = format
+        self.timeout = timeout
+        if command is None:
+            self.check = CHECKS.get(format)
+            command = None if self.check else DEFAULT_COMMANDS.get(format)
+        else:
+            self.check = CHECKS.get(IN_PROCESS_COMMANDS.get(command.strip(), ""))
+        self.argv: Optional[List[str]] = None
+        if command and self.check is None:
+            argv = shlex.split(command)
+            path = find_tool(argv[0])
+            if path is not None:
+                self.argv = [path] + argv[1:]
+
+    @classmethod
+    def from_config(cls, format: str, config) -> "Validator":
+        """
+        Creates a Validator using ``formats.<format>.validator`` from an OnoConfig.
+        """
+        command = config.get(f"formats.{format}.validator")
+        if command is False:
+            command = ""
+        return cls(format, command, timeout=config.get("validation.timeout", DEFAULT_TIMEOUT))
+
+    @property
+    def can_validate(self) -> bool:
+        """
+        Whether there is a check for this format. Output in other formats is
+        always reported as valid.
+        """
+        return self.check is not None or self.argv is not None
 
     def validate_output(self, text: str) -> bool:
         """
@@ -25,8 +109,7 @@ class Validator:
         Returns:
             True if the output is valid, False otherwise.
         """
-        # TODO: Implement format-specific output validation
-        return True
+        return not self.get_validation_errors(text)
 
     def get_validation_errors(self, text: str) -> list[str]:
         """
@@ -38,5 +121,97 @@ class Validator:
         Returns:
             A list of validation error messages.
         """
-        # TODO: Implement format-specific error parsing
-        return []
\ No newline at end of file
+        if self.check is not None:
+            try:
+                self.check(text)
+            except (ValueError, SyntaxError) as e:
+                return [str(e)]
+            return []
+        if self.argv is None:
+            return []
+        try:
+            completed = subprocess.run(self.argv, input=text, capture_output=True, text=True, timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            return []  # A tool that can't run doesn't make the output invalid
+        if completed.returncode == 0:
+            return []
+        lines = [line for line in (completed.stdout + completed.stderr).splitlines() if line.strip()]
+        return lines or [f"{os.path.basename(self.argv[0])} exited with status {completed.returncode}"]
+
+class ValidatorPool:
+    """
+    Runs validators on a thread pool shared by a processor, so validation
+    overlaps the LLM calls still in flight instead of holding up a worker.
+
+    Validators are created once per format and recent results are cached, so
+    an output seen before is never validated twice. External tools still
+    start a process per check, but on the pool's threads rather than on the
+    critical path.
+    """
+
+    def __init__(self, config=None, workers: Optional[int] = None):
+        """
+        Initializes the ValidatorPool.
+
+        Args:
+            config: The OnoConfig to read ``formats`` and ``validation`` from.
+            workers: The number of validations run at once. Defaults to
+                ``validation.workers``, or the number of CPUs.
+        """
+        self.config = config
+        if workers is None and config is not None:
+            workers = config.get("validation.workers")
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self._validators: Dict[str, Validator] = {}
+        self._results: "OrderedDict[Tuple[str, str], List[str]]" = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def validator(self, format: str) -> Validator:
+        """
+        Gets the validator for a format.
+        """
+        with self._lock:
+            validator = self._validators.get(format)
+            if validator is None:
+                validator = Validator.from_config(format, self.config) if self.config is not None else Validator(format)
+                self._validators[format] = validator
+            return validator
+
+    def errors(self, format: str, text: str) -> List[str]:
+        """
+        Validates output in the calling thread, reusing earlier results.
+
+        Returns:
+            The validation error messages, empty if the output is valid.
+        """
+        key = (format, text)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+        errors = self.validator(format).get_validation_errors(text)
+        with self._lock:
+            self._results[key] = errors
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return errors
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        Runs a function on the pool, typically one that calls ``errors``.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ono-validate")
+            executor = self._executor
+        return executor.submit(fn, *args)
+
+    def close(self) -> None:
+        """
+        Shuts the pool's threads down.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
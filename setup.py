@@ -4,14 +4,19 @@ setup(
     name='ono-preprocessor',
     version='0.1.0',
     packages=find_packages(),
+    package_data={'ono': ['grammar.lark']},
     install_requires=[
         'typer',
         'pyyaml',
         'requests'
     ],
+    extras_require={
+        'async': ['httpx'],
+        'grammar': ['lark'],
+    },
     entry_points={
         'console_scripts': [
-            'ono=ono.cli:main',
+            'ono=ono.cli:run',
         ],
     },
 )
\ No newline at end of file
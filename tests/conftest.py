@@ -2,4 +2,101 @@
 This module contains the pytest configuration for Ono tests.
 """
 
-# TODO: Add pytest configuration here
\ No newline at end of file
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Bound at import so tests that patch time.sleep don't affect the server
+_sleep = time.sleep
+
+
+class StubLLMServer:
+    """
+    A local HTTP server that answers LLM requests from a script of responses.
+
+    Each scripted response is a (status, body, headers, delay, events) tuple;
+    once the script runs out every request gets a 200 echoing the prompt. With
+    events, the body is sent as a server-sent event stream, one event per piece
+    of text, ``delay`` seconds apart.
+    """
+
+    def __init__(self):
+        self.script = []
+        self.requests = []
+        self.events_sent = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server.lock:
+                    server.requests.append({"body": body, "headers": dict(self.headers), "client": self.client_address})
+                    scripted = server.script.pop(0) if server.script else None
+                status, payload, headers, delay, events = (
+                    scripted or (200, {"text": f"echo: {body.get('prompt')}"}, {}, 0, None)
+                )
+                if events is not None:
+                    self.send_events(events, delay)
+                    return
+                if delay:
+                    _sleep(delay)
+                data = json.dumps(payload).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def send_events(self, events, delay):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                pieces = [f"data: {json.dumps({'choices': [{'text': text}]})}\n\n" for text in events]
+                try:
+                    for piece in pieces + ["data: [DONE]\n\n"]:
+                        data = piece.encode("utf-8")
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                        self.wfile.flush()
+                        with server.lock:
+                            server.events_sent += 1
+                        _sleep(delay)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            def handle_error(self, request, client_address):
+                pass  # Clients drop connections on purpose, e.g. when a stream ends early
+
+        self.httpd = Server(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1/completions"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+
+    def respond(self, status=200, body=None, headers=None, delay=0, events=None):
+        self.script.append((status, body if body is not None else {"text": "ok"}, headers or {}, delay, events))
+
+
+@pytest.fixture
+def llm_server():
+    server = StubLLMServer()
+    server.thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
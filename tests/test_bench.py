@@ -0,0 +1,17 @@
+"""
+This module contains the tests for the Ono benchmark suite.
+"""
+
+from ono.bench import bench_end_to_end, load_examples
+from ono.demo.server import MockLLMServer
+
+
+def test_end_to_end_benchmark_renders_examples():
+    templates = load_examples()
+
+    with MockLLMServer() as server:
+        rows = bench_end_to_end(server, templates, [1, 4], file_jobs=2)
+
+    assert [row["concurrency"] for row in rows] == [1, 4]
+    assert all(row["renders"] == len(templates) and row["requests"] > 0 for row in rows)
+    assert rows[0]["requests"] == rows[1]["requests"]
@@ -0,0 +1,106 @@
+"""
+This module contains the tests for Ono batch builds.
+"""
+
+import os
+
+from ono.build import build_files, expand_inputs, is_template, output_name
+from ono.exceptions import LLMError
+from ono.metadata import BuildManifest
+
+
+def make_tree(root):
+    for path in ["deploy.ono.sh", "notes.txt", "nested/config.ono.json", "nested/deep/Dockerfile.ono"]:
+        full = os.path.join(root, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "w") as f:
+            f.write(f"<?ono {path} ?>")
+
+
+def test_output_name_drops_ono_component():
+    assert output_name("a/deploy.ono.sh") == os.path.join("a", "deploy.sh")
+    assert output_name("Dockerfile.ono") == "Dockerfile"
+    assert is_template("config.ono.json") and not is_template("ono.txt")
+    assert not is_template("examples/__pycache__/deploy.ono.cpython-311.pyc")
+
+
+def test_expand_directories_and_globs(tmp_path):
+    make_tree(str(tmp_path))
+
+    from_dir = expand_inputs([str(tmp_path)])
+    from_glob = expand_inputs([os.path.join(str(tmp_path), "**", "*.ono.*")])
+
+    assert [relative for _, relative in from_dir] == [
+        "deploy.ono.sh", os.path.join("nested", "config.ono.json"), os.path.join("nested", "deep", "Dockerfile.ono"),
+    ]
+    assert [relative for _, relative in from_glob] == ["deploy.ono.sh", os.path.join("nested", "config.ono.json")]
+    assert expand_inputs([os.path.join(str(tmp_path), "*")]) == [(os.path.join(str(tmp_path), "deploy.ono.sh"),
+                                                                   "deploy.ono.sh")]
+
+
+def test_inputs_without_ono_component_are_never_written_over(tmp_path):
+    plain = tmp_path / "a.sh"
+    plain.write_text("X=<?ono say hi ?>")
+    template = tmp_path / "b.ono.sh"
+    template.write_text("<?ono b ?>")
+
+    results = build_files(lambda text, path: "rendered", expand_inputs([str(plain), str(template)]))
+
+    assert results[0].error and "overwrite" in results[0].error
+    assert plain.read_text() == "X=<?ono say hi ?>"
+    assert results[1].error is None and (tmp_path / "b.sh").read_text() == "rendered"
+
+    results = build_files(lambda text, path: "rendered", expand_inputs([str(plain)]), output_dir=str(tmp_path / "out"))
+    assert results[0].error is None and (tmp_path / "out" / "a.sh").read_text() == "rendered"
+
+
+def test_build_files_mirrors_layout(tmp_path):
+    make_tree(str(tmp_path / "src"))
+    sources = expand_inputs([str(tmp_path / "src")])
+
+    results = build_files(lambda text, path: text.upper(), sources, output_dir=str(tmp_path / "out"), jobs=3)
+
+    assert [result.error for result in results] == [None] * 3
+    with open(tmp_path / "out" / "nested" / "deep" / "Dockerfile") as f:
+        assert f.read() == "<?ONO NESTED/DEEP/DOCKERFILE.ONO ?>"
+
+
+def test_build_files_skips_unchanged_templates(tmp_path):
+    make_tree(str(tmp_path / "src"))
+    sources = expand_inputs([str(tmp_path / "src")])
+    manifest = BuildManifest(str(tmp_path / "manifest.json"))
+    calls = []
+
+    def process(text, path):
+        calls.append(path)
+        return text
+
+    build_files(process, sources, output_dir=str(tmp_path / "out"), manifest=manifest, fingerprint=lambda path: {})
+    results = build_files(process, sources, output_dir=str(tmp_path / "out"), manifest=manifest, fingerprint=lambda path: {})
+
+    assert len(calls) == 3
+    assert all(result.skipped for result in results)
+
+    forced = build_files(process, sources, output_dir=str(tmp_path / "out"), manifest=manifest,
+                         fingerprint=lambda path: {}, force=True)
+    assert len(calls) == 6 and not any(result.skipped for result in forced)
+
+
+def test_failed_templates_are_not_written_or_recorded(tmp_path):
+    make_tree(str(tmp_path / "src"))
+    sources = expand_inputs([str(tmp_path / "src")])
+    manifest = BuildManifest(str(tmp_path / "manifest.json"))
+
+    def process(text, path):
+        if path.endswith(".json"):
+            raise LLMError("LLM API returned 503")
+        return text
+
+    results = build_files(process, sources, output_dir=str(tmp_path / "out"), manifest=manifest,
+                          fingerprint=lambda path: {})
+
+    assert [result.error for result in results] == [None, "LLM API returned 503", None]
+    assert not os.path.exists(tmp_path / "out" / "nested" / "config.json")
+    retried = build_files(lambda text, path: text, sources, output_dir=str(tmp_path / "out"), manifest=manifest,
+                          fingerprint=lambda path: {})
+    assert [result.skipped for result in retried] == [True, False, True]
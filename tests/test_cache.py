@@ -0,0 +1,62 @@
+"""
+This module contains the tests for the Ono response cache.
+"""
+
+import os
+import time
+
+from ono.cache import ResponseCache
+
+
+def test_get_returns_stored_value(tmp_path):
+    cache = ResponseCache(path=str(tmp_path))
+    key = ResponseCache.make_key("get temp dir", model="gpt-4", format="bash")
+
+    assert cache.get(key) is None
+    cache.set(key, "/tmp")
+
+    assert cache.get(key) == "/tmp"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_key_depends_on_every_input():
+    base = dict(prompt="get temp dir", model="gpt-4", params={"temperature": 0.2}, context="system", format="bash")
+    key = ResponseCache.make_key(**base)
+
+    for field, value in [("prompt", "get home dir"), ("model", "other"), ("params", {"temperature": 0.3}),
+                         ("context", "other"), ("format", "python")]:
+        assert ResponseCache.make_key(**{**base, field: value}) != key
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(path=str(tmp_path), ttl=0.01)
+    cache.set("ab" * 32, "value")
+    time.sleep(0.02)
+
+    assert cache.get("ab" * 32) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(path=str(tmp_path))
+    keys = [f"{i:064x}" for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.set(key, "x" * 100)
+        path = os.path.join(str(tmp_path), key[:2], f"{key}.json")
+        os.utime(path, (i, i))
+    cache.get(keys[0])  # Most recently used now
+
+    cache.max_size = cache.stats()["size"] - 1
+    cache.set(f"{3:064x}", "x" * 100)
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+
+
+def test_clear_removes_all_entries(tmp_path):
+    cache = ResponseCache(path=str(tmp_path))
+    cache.set("a" * 64, "1")
+    cache.set("b" * 64, "2")
+
+    assert cache.clear() == 2
+    assert cache.stats()["entries"] == 0
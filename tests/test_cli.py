@@ -2,4 +2,113 @@
 This module contains the tests for the Ono CLI.
 """
 
-# TODO: Add tests for the Ono CLI
\ No newline at end of file
+import os
+import subprocess
+import sys
+
+from ono.cli import infer_format
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_infer_format_from_ono_extension():
+    assert infer_format("deploy.ono.sh") == "bash"
+    assert infer_format("examples/basic/config.ono.json") == "json"
+    assert infer_format("Dockerfile.ono") == "dockerfile"
+    assert infer_format("notes") is None
+
+
+# Milliseconds ``import ono.cli`` may take on top of typer, which every invocation needs
+IMPORT_BUDGET_MS = 75
+
+HEAVY_MODULES = ("ono.processor", "ono.llm", "requests", "yaml", "asyncio", "httpx")
+
+
+def run_python(code, *args, cwd=ROOT):
+    return subprocess.run([sys.executable, *args, "-c", code], capture_output=True, text=True, check=True,
+                          cwd=cwd, env={**os.environ, "PYTHONPATH": ROOT})
+
+
+def test_import_stays_within_budget():
+    times = {}
+    for line in run_python("import ono.cli", "-X", "importtime").stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if name.strip() in ("ono.cli", "typer"):
+                times[name.strip()] = int(cumulative) / 1000
+    assert times["ono.cli"] - times["typer"] < IMPORT_BUDGET_MS
+
+
+def test_template_without_blocks_skips_the_processor(tmp_path):
+    template = tmp_path / "plain.ono.sh"
+    template.write_text("echo hello\n")
+    output = tmp_path / "plain.sh"
+
+    code = (
+        "import sys\n"
+        "from ono.cli import app\n"
+        f"app([{str(template)!r}, '--output', {str(output)!r}, '--force'], standalone_mode=False)\n"
+        f"print([name for name in {HEAVY_MODULES!r} if name in sys.modules])\n"
+    )
+    assert run_python(code, cwd=tmp_path).stdout.splitlines()[-1] == "[]"
+    assert output.read_text() == "echo hello\n"
+
+
+def test_streamed_and_mapped_inputs_without_blocks_skip_the_processor(tmp_path):
+    plain = tmp_path / "plain.txt"
+    plain.write_text("no blocks here\n" * 100)
+
+    for option in ("--stream", "--mmap"):
+        output = tmp_path / f"out{option}.txt"
+        code = (
+            "import sys\n"
+            "from ono.cli import app\n"
+            f"app([{str(plain)!r}, {option!r}, '--output', {str(output)!r}, '--force'], standalone_mode=False)\n"
+            f"print([name for name in {HEAVY_MODULES!r} if name in sys.modules])\n"
+        )
+        assert run_python(code, cwd=tmp_path).stdout.splitlines()[-1] == "[]"
+        assert output.read_text() == plain.read_text()
+
+
+def test_copy_until_blocks_finds_an_opener_split_across_chunks():
+    from ono.cli import copy_until_blocks
+
+    written = []
+    rest = copy_until_blocks(iter(["plain text <", "?o", "no x ?> tail"]), written.append)
+
+    assert "".join(written) + "".join(rest) == "plain text <?ono x ?> tail"
+    assert "".join(written) == "plain text"
+    assert copy_until_blocks(iter(["a", "b"]), written.append) is None and "".join(written).endswith("ab")
+
+
+def test_streamed_output_may_replace_its_input(tmp_path):
+    from ono.cli import LazyProcessor, process_stream
+    from tests.test_processor import FakeLLMClient, make_config
+
+    template = tmp_path / "same.txt"
+    template.write_text("head <?ono a ?>\n" + "row;\n" * 1000)
+
+    processor = LazyProcessor(config=make_config(), llm_client=FakeLLMClient())
+    assert process_stream(processor, str(template), str(template))
+    assert template.read_text() == "head A\n" + "row;\n" * 1000
+
+    template.write_text("head <?ono b ?>")
+    failing = LazyProcessor(config=make_config(llm={"max_retries": 0}),
+                            llm_client=FakeLLMClient(answer=lambda prompt: 1 / 0))
+    assert not process_stream(failing, str(template), str(template))
+    assert template.read_text() == "head <?ono b ?>"
+    assert [path.name for path in tmp_path.iterdir()] == ["same.txt"]
+
+
+def test_batch_run_shares_answers_only_while_it_lasts():
+    from ono.cli import LazyProcessor
+    from tests.test_processor import FakeLLMClient, make_config
+
+    client = FakeLLMClient()
+    processor = LazyProcessor(config=make_config(), llm_client=client)
+
+    with processor.run():
+        assert processor.process("<?ono same ?>") == processor.process("x <?ono same ?>")[2:] == "SAME"
+    processor.process("<?ono same ?>")
+
+    assert client.prompts == ["same", "same"]
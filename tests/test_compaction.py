@@ -0,0 +1,66 @@
+"""
+This module contains the tests for Ono context compaction.
+"""
+
+import pytest
+
+from ono.compaction import ContextCompactor, estimate_tokens, message_tokens
+
+
+def conversation(turns):
+    messages = [{"role": "system", "content": "You write bash."}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i} " + "x" * 40})
+        messages.append({"role": "assistant", "content": f"answer {i} " + "y" * 40})
+    return messages
+
+
+def test_history_within_budget_is_unchanged():
+    messages = conversation(2)
+    compactor = ContextCompactor(budget=10_000)
+
+    assert compactor.compact(messages, "next") == messages
+    assert compactor.metrics.tokens_saved == 0
+
+
+def test_sliding_window_keeps_pinned_and_recent_messages():
+    messages = conversation(20)
+    compactor = ContextCompactor(budget=100)
+
+    compacted = compactor.compact(messages, "next question")
+
+    assert compacted[0]["role"] == "system"
+    assert compacted[-1] == messages[-1]
+    assert sum(message_tokens(message) for message in compacted) + estimate_tokens("next question") <= 100
+    assert compactor.metrics.tokens_saved > 0
+
+
+def test_summarize_replaces_older_turns_with_cached_digest():
+    calls = []
+
+    def summarize(text):
+        calls.append(text)
+        return "they discussed questions"
+
+    messages = conversation(20)
+    compactor = ContextCompactor(budget=120, strategy="summarize", summarize=summarize)
+
+    first = compactor.compact(messages, "next")
+    second = compactor.compact(messages, "next")
+
+    assert first == second
+    assert first[1]["content"] == "Summary of earlier conversation: they discussed questions"
+    assert len(calls) == 1
+    assert compactor.metrics.summaries == 2
+
+
+def test_per_model_budgets():
+    compactor = ContextCompactor(budget={"default": 100, "big": 10_000})
+
+    assert compactor.budget_for("big") == 10_000
+    assert compactor.budget_for("other") == 100
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        ContextCompactor(strategy="forget")
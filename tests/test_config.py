@@ -0,0 +1,20 @@
+"""
+This module contains the tests for the Ono configuration.
+"""
+
+from ono.config import OnoConfig
+
+
+def test_project_config_merges_into_global_sections(tmp_path):
+    global_path = tmp_path / "global.yaml"
+    global_path.write_text("llm:\n  api_url: http://global/v1\n  timeout: 30\n  batch_size: 1\ncache:\n  ttl: 60\n")
+    project_path = tmp_path / "project.yaml"
+    project_path.write_text("llm:\n  batch_size: 4\ncache: null\nformats:\n  bash:\n    validator: ''\n")
+
+    config = OnoConfig(global_config_path=str(global_path), project_config_path=str(project_path))
+
+    assert config.get("llm.api_url") == "http://global/v1"
+    assert config.get("llm.timeout") == 30
+    assert config.get("llm.batch_size") == 4
+    assert config.get("cache") is None
+    assert config.get("formats.bash.validator") == ""
@@ -2,4 +2,78 @@
 This module contains the tests for the Ono context manager.
 """
 
-# TODO: Add tests for the Ono context manager
\ No newline at end of file
+import os
+
+from ono.context import ContextManager
+
+
+def test_in_memory_context_data():
+    manager = ContextManager()
+    manager.update_context("build", {"os": "linux"})
+
+    assert manager.get_context("build") == {"os": "linux"}
+    manager.clear_context("build")
+    assert manager.get_context("build") == {}
+
+
+def test_contexts_persist_across_managers(tmp_path):
+    manager = ContextManager(storage_path=str(tmp_path), project_root="/project")
+    manager.append_message("system", "user", "analyze this server")
+    manager.append_message("system", "assistant", "it runs nginx")
+    manager.update_context("system", {"os": "linux"})
+
+    reloaded = ContextManager(storage_path=str(tmp_path), project_root="/project")
+
+    assert reloaded.list_contexts() == ["system"]
+    assert [message["content"] for message in reloaded.get_messages("system")] == [
+        "analyze this server", "it runs nginx",
+    ]
+    assert reloaded.get_context("system") == {"os": "linux"}
+
+
+def test_forks_share_parent_history_copy_on_write(tmp_path):
+    manager = ContextManager(storage_path=str(tmp_path), project_root="/project")
+    manager.append_message("system", "user", "identify services")
+    manager.append_message("system/monitoring", "user", "set up monitoring")
+    manager.append_message("system", "user", "later parent message")
+
+    reloaded = ContextManager(storage_path=str(tmp_path), project_root="/project")
+    assert [message["content"] for message in reloaded.get_messages("system/monitoring")] == [
+        "identify services", "set up monitoring",
+    ]
+
+    # The fork's log holds only its own message, not a copy of the parent's
+    fork_log = [name for name in os.listdir(reloaded.project_dir) if name.startswith("system%2F")][0]
+    with open(os.path.join(reloaded.project_dir, fork_log)) as f:
+        assert "identify services" not in f.read()
+
+
+def test_context_logs_load_lazily(tmp_path):
+    manager = ContextManager(storage_path=str(tmp_path), project_root="/project")
+    for name in ["a", "b", "c"]:
+        manager.append_message(name, "user", name)
+
+    reloaded = ContextManager(storage_path=str(tmp_path), project_root="/project")
+    reloaded.get_messages("b")
+
+    assert set(reloaded.contexts) == {"b"}
+
+
+def test_clearing_or_deleting_a_parent_keeps_its_forks_history(tmp_path):
+    for storage in (None, str(tmp_path)):
+        manager = ContextManager(storage_path=storage, project_root="/project")
+        manager.append_message("sys", "user", "q1")
+        manager.append_message("sys", "assistant", "a1")
+        manager.fork_context("sys", "sys/mon")
+        manager.append_message("sys/mon", "user", "mon")
+        manager.fork_context("sys", "other")
+
+        manager.clear_context("sys")
+        manager.append_message("sys", "user", "NEW")
+        manager.delete_context("sys")
+
+        for reader in (manager, ContextManager(storage_path=storage, project_root="/project")):
+            if reader is not manager and storage is None:
+                continue
+            assert [message["content"] for message in reader.get_messages("sys/mon")] == ["q1", "a1", "mon"]
+            assert [message["content"] for message in reader.get_messages("other")] == ["q1", "a1"]
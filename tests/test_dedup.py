@@ -0,0 +1,66 @@
+"""
+This module contains the tests for block deduplication.
+"""
+
+import pytest
+
+from ono.dedup import Deduplicator, MinHashIndex, canonical_words, normalize
+
+
+def test_normalize_ignores_whitespace_and_loosely_case_and_punctuation():
+    assert normalize("  Get the  TEMP dir?\n") == "Get the TEMP dir?"
+    assert normalize("  Get the  TEMP dir?\n", loose=True) == normalize("get the temp dir", loose=True) == "get the temp dir"
+
+
+def test_canonical_words_expand_abbreviations():
+    assert canonical_words("get the user's temp dir") == canonical_words("Get user temp directories") == [
+        "get", "user", "temp", "directory",
+    ]
+
+
+def test_minhash_index_matches_near_duplicates_only():
+    index = MinHashIndex(threshold=0.8)
+
+    assert index.match("first", "get the user's temp dir") == "first"
+    assert index.match("second", "get user temp directory") == "first"
+    assert index.match("third", "get user home directory") == "third"
+    assert index.match("fourth", "install python 3.11") == "fourth"
+    assert index.match("fifth", "install python 3.12") == "fifth"
+
+
+def test_deduplicator_levels():
+    scope = ["model", {}, None, "bash", False]
+
+    off = Deduplicator(level=False)
+    assert off.claim("list files", scope) == (None, False, False)
+
+    exact = Deduplicator()
+    first, claimed, _ = exact.claim("echo Hello", scope)
+    assert claimed
+    assert exact.claim(" echo   Hello\n", scope) == (first, False, False)
+    assert exact.claim("echo hello.", scope)[1]
+    assert exact.claim("echo Hello", ["other-model", {}, None, "bash", False])[1]
+
+    loose = Deduplicator(level="loose")
+    first, _, _ = loose.claim("List files.", scope)
+    assert loose.claim("list   files", scope) == (first, False, False)
+    assert loose.claim("get user temp directory", scope)[1]
+    assert loose.claim("get the user's temp dir", scope)[1]
+
+    fuzzy = Deduplicator(level="fuzzy")
+    first, _, _ = fuzzy.claim("get user temp directory", scope)
+    assert fuzzy.claim("get the user's temp dir", scope) == (first, False, True)
+    assert fuzzy.claim("Get user temp directory.", scope) == (first, False, False)
+    assert fuzzy.metrics.as_dict() == {"blocks": 3, "shared": 0, "fuzzy": 0, "calls_saved": 0}
+
+    with pytest.raises(ValueError):
+        Deduplicator(level="semantic")
+
+
+def test_release_lets_the_next_request_claim_again():
+    dedup = Deduplicator()
+    first, _, _ = dedup.claim("list files", None)
+    dedup.release(first)
+
+    second, claimed, _ = dedup.claim("list files", None)
+    assert claimed and second is not first
@@ -0,0 +1,55 @@
+"""
+This module contains the tests for the Ono mock LLM server.
+"""
+
+import pytest
+
+from ono.batching import build_batch_prompt, parse_batch_response
+from ono.demo.server import MockLLMServer
+from ono.exceptions import LLMError
+from ono.llm import LLMClient
+
+
+@pytest.fixture
+def mock_server():
+    with MockLLMServer(response_size=40, seed=1) as server:
+        yield server
+
+
+def test_answers_are_deterministic_and_sized(mock_server):
+    client = LLMClient(api_url=mock_server.url)
+
+    first = client.generate_text("get temp dir")
+
+    assert first == client.generate_text("get temp dir")
+    assert first != client.generate_text("get home dir")
+    assert len(first) == 40
+    assert mock_server.stats["requests"] == 3
+
+
+def test_streams_server_sent_events(mock_server):
+    client = LLMClient(api_url=mock_server.url)
+
+    pieces = list(client.stream_text("get temp dir"))
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == mock_server.answer("get temp dir", 40)
+
+
+def test_batch_prompts_get_one_answer_per_request(mock_server):
+    client = LLMClient(api_url=mock_server.url)
+
+    answers = parse_batch_response(client.generate_text(build_batch_prompt(["a", "b \"quoted\""])), 2)
+
+    assert answers == [mock_server.answer("a", 40), mock_server.answer('b "quoted"', 40)]
+
+
+def test_simulated_errors():
+    with MockLLMServer(error_rate=1.0) as server:
+        client = LLMClient(api_url=server.url, max_retries=1)
+        client.backoff = 0
+
+        with pytest.raises(LLMError):
+            client.generate_text("x")
+
+        assert server.stats["errors"] == 2
@@ -0,0 +1,62 @@
+"""
+This module contains the tests for the Ono grammar parser.
+"""
+
+import glob
+import os
+
+import pytest
+
+pytest.importorskip("lark")
+
+from ono.exceptions import ParseError
+from ono.grammar import GrammarParser, load_grammar
+from ono.parser import OnoParser
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+
+
+def test_matches_ono_parser_on_examples():
+    grammar, parser = GrammarParser(), OnoParser()
+
+    for path in glob.glob(os.path.join(EXAMPLES, "**", "*.ono*"), recursive=True):
+        if "__pycache__" in path:
+            continue
+        with open(path) as f:
+            text = f.read()
+        assert grammar.parse(text) == parser.parse(text), path
+
+
+def test_parses_every_delimiter_pair():
+    parser = GrammarParser()
+    text = "a=\"?ono one ?\" b='?ono two ?' c={?ono three ?} d=[?ono four ?] e=<?ono five ?> f=🐊?ono six 🦋"
+
+    parsed = parser.parse(text)
+
+    assert parser.extract_ono_blocks(parsed) == ["one", "two", "three", "four", "five", "six"]
+    assert parser.render(parsed, ["1", "2", "3", "4", "5", "6"]) == "a=1 b=2 c=3 d=4 e=5 f=6"
+
+
+def test_matches_ono_parser_on_every_delimiter_pair():
+    text = "a=\"?ono one {?ono two ?> ?} ?\" b='?ono three ?' if x ?] y: 🐊?ono four ?🦋 ?"
+
+    assert GrammarParser().parse(text) == OnoParser().parse(text)
+
+
+def test_closers_of_other_pairs_are_text():
+    parser = GrammarParser()
+
+    parsed = parser.parse('if x ?> y: "?ono is it <?ono inner ?> done? ?] ?" ?}')
+
+    assert parser.extract_ono_blocks(parsed) == ["is it <?ono inner ?> done? ?]", "inner"]
+    assert parsed[0].content == "if x ?> y: "
+    assert parsed[-1].content == " ?}"
+
+
+def test_unclosed_block_is_an_error():
+    with pytest.raises(ParseError, match="line 2"):
+        GrammarParser().parse("x=1\ny={?ono never closed")
+
+
+def test_grammar_is_built_once():
+    assert GrammarParser().lark is GrammarParser().lark is load_grammar()
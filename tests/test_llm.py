@@ -2,4 +2,166 @@
 This module contains the tests for the Ono LLM client.
 """
 
-# TODO: Add tests for the Ono LLM client
\ No newline at end of file
+import asyncio
+
+import pytest
+
+import ono.llm
+from ono.exceptions import DeadlineExceeded, LLMError
+from ono.llm import AsyncLLMClient, LLMClient, last_retries
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(ono.llm.time, "sleep", recorded.append)
+    return recorded
+
+
+def test_generate_text_sends_prompt_and_key(llm_server):
+    client = LLMClient(api_url=llm_server.url, api_key="secret")
+    llm_server.respond(body={"text": "/tmp"})
+
+    assert client.generate_text("get temp dir", model="gpt-4", temperature=0.2) == "/tmp"
+    request = llm_server.requests[0]
+    assert request["body"] == {"prompt": "get temp dir", "model": "gpt-4", "temperature": 0.2}
+    assert request["headers"]["Authorization"] == "Bearer secret"
+
+
+def test_connections_are_reused(llm_server):
+    client = LLMClient(api_url=llm_server.url)
+
+    for _ in range(3):
+        client.generate_text("ping")
+
+    assert len({request["client"] for request in llm_server.requests}) == 1
+
+
+def test_retries_server_errors_with_backoff(llm_server, sleeps):
+    client = LLMClient(api_url=llm_server.url, max_retries=3)
+    llm_server.respond(status=503)
+    llm_server.respond(status=500)
+    llm_server.respond(body={"text": "done"})
+
+    assert client.generate_text("x") == "done"
+    assert last_retries() == 2
+    assert len(llm_server.requests) == 3
+    assert len(sleeps) == 2
+    assert all(0 <= delay <= client.backoff * 2 for delay in sleeps)
+
+
+def test_honours_retry_after(llm_server, sleeps):
+    client = LLMClient(api_url=llm_server.url)
+    llm_server.respond(status=429, headers={"Retry-After": "7"})
+
+    assert client.generate_text("x") == "echo: x"
+    assert sleeps == [7.0]
+
+
+def test_gives_up_after_max_retries(llm_server, sleeps):
+    client = LLMClient(api_url=llm_server.url, max_retries=2)
+    for _ in range(3):
+        llm_server.respond(status=502)
+
+    with pytest.raises(LLMError):
+        client.generate_text("x")
+    assert len(llm_server.requests) == 3
+
+
+def test_client_errors_are_not_retried(llm_server, sleeps):
+    client = LLMClient(api_url=llm_server.url)
+    llm_server.respond(status=400, body={"error": "bad request"})
+
+    with pytest.raises(LLMError, match="400"):
+        client.generate_text("x")
+    assert sleeps == []
+
+
+def test_read_timeout_is_retried(llm_server, sleeps):
+    client = LLMClient(api_url=llm_server.url, timeout=(1, 0.2), max_retries=1)
+    llm_server.respond(body={"text": "late"}, delay=0.5)
+
+    assert client.generate_text("x") == "echo: x"
+    assert len(sleeps) == 1
+
+
+def test_timeout_from_config():
+    class Config:
+        def get(self, key, default=None):
+            return {"llm.timeout": {"connect": 2, "read": 40}}.get(key, default)
+
+    client = LLMClient(api_url="http://localhost", config=Config())
+
+    assert client.timeout == (2.0, 40.0)
+
+
+def test_stream_text_yields_events(llm_server):
+    client = LLMClient(api_url=llm_server.url)
+    llm_server.respond(events=["he", "llo", " world"])
+
+    assert list(client.stream_text("greet")) == ["he", "llo", " world"]
+    assert llm_server.requests[0]["body"]["stream"] is True
+
+
+def test_stream_stops_at_end_of_single_line_answer(llm_server):
+    client = LLMClient(api_url=llm_server.url)
+    llm_server.respond(events=["\n/usr/", "local\nand then", " a long explanation"] + ["..."] * 20, delay=0.05)
+
+    assert "".join(client.stream_text("prefix", single_line=True)) == "/usr/local"
+    assert llm_server.events_sent < 10
+
+
+def test_streamed_and_buffered_answers_agree(llm_server):
+    class Config:
+        def get(self, key, default=None):
+            return {"llm.stream": True}.get(key, default)
+
+    streaming = LLMClient(api_url=llm_server.url, config=Config())
+    buffered = LLMClient(api_url=llm_server.url)
+    llm_server.respond(events=["abcdef", "ghij"])
+    llm_server.respond(body={"text": "abcdefghij"})
+
+    assert streaming.generate_text("x", max_chars=8) == buffered.generate_text("x", max_chars=8) == "abcdefgh"
+
+
+def test_async_client_generates_and_streams(llm_server):
+    pytest.importorskip("httpx")
+
+    async def run():
+        client = AsyncLLMClient(api_url=llm_server.url, api_key="secret")
+        llm_server.respond(body={"text": "/tmp"})
+        llm_server.respond(events=["a\n", "b"])
+        try:
+            text = await client.generate_text("get temp dir", model="gpt-4")
+            pieces = [piece async for piece in client.stream_text("letters", single_line=True)]
+        finally:
+            await client.aclose()
+        return text, pieces
+
+    assert asyncio.run(run()) == ("/tmp", ["a"])
+    assert llm_server.requests[0]["headers"]["Authorization"] == "Bearer secret"
+
+
+def test_async_client_retries_and_enforces_deadline(llm_server):
+    pytest.importorskip("httpx")
+
+    async def run():
+        client = AsyncLLMClient(api_url=llm_server.url, max_retries=2)
+        client.backoff = 0
+        llm_server.respond(status=503)
+        llm_server.respond(body={"text": "done"})
+        llm_server.respond(status=503)
+        llm_server.respond(body={"text": "again"})
+        llm_server.respond(body={"text": "late"}, delay=0.5)
+        try:
+            assert await client.generate_text("x") == "done"
+            assert last_retries() == 1
+            assert await client.generate_text("y", deadline=5) == "again"
+            assert last_retries() == 1
+            with pytest.raises(DeadlineExceeded):
+                await client.generate_text("slow", deadline=0.05)
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    assert len(llm_server.requests) == 5
@@ -0,0 +1,103 @@
+"""
+This module contains the tests for the memory-mapped input path.
+"""
+
+import io
+
+from ono.context import ContextManager
+from ono.mapped import RangeWriter, split_blocks
+from ono.parser import Kind, OnoParser
+from ono.scanner import get_scanner
+from tests.test_processor import FakeLLMClient, make_config, make_processor
+
+
+def test_split_blocks_matches_the_parser():
+    text = "a 🐊?ono x ?🦋 ?> b <?ono c <?ono d ?> \"?ono ?\" ?> e ?'?ono f ?' <?ono unclosed"
+    data = text.encode("utf-8")
+
+    spans = [(is_block, data[start:end].decode("utf-8")) for is_block, start, end in split_blocks(data)]
+
+    expected = [(item.kind is Kind.ONO, text[item.start:item.end]) for item in OnoParser().parse(text)]
+    merged = []
+    for is_block, chunk in expected:
+        if merged and not is_block and not merged[-1][0]:
+            merged[-1] = (False, merged[-1][1] + chunk)
+        else:
+            merged.append((is_block, chunk))
+    assert spans == merged
+
+
+def test_find_opener_bytes_skips_closers_and_lookalikes():
+    scanner = get_scanner()
+    data = "x ?> ?ono {?ono y".encode("utf-8")
+
+    assert scanner.opener_suffix == b"?ono"
+    assert scanner.find_opener_bytes(data) == data.index(b"{?ono")
+    assert scanner.find_opener_bytes(data, data.index(b"{?ono") + 1) == -1
+
+
+def test_process_file_matches_process(tmp_path):
+    text = "# ?ono\n# delimiters=%%, %%\n# ?\nhead %%?ono a %% <?ono b ?> " + "row;\n" * 1000 + "%%?ono c %%\r\n"
+    template = tmp_path / "dump.sql"
+    template.write_bytes(text.encode("utf-8"))
+    output = tmp_path / "out.sql"
+
+    with open(output, "wb") as destination:
+        make_processor(FakeLLMClient(delay=0.01)).process_file(str(template), destination)
+
+    assert output.read_bytes().decode("utf-8") == make_processor(FakeLLMClient()).process(text)
+    assert "head A <?ono b ?> row;" in output.read_text()
+
+
+def test_process_file_keeps_context_chains_and_inline_blocks(tmp_path):
+    text = "A: <?ono @context=chat first ?>\nB: <?ono @context=chat second ?>\n<?ono two\nlines ?>\n"
+    template = tmp_path / "chat.txt"
+    template.write_text(text)
+    output = tmp_path / "out.txt"
+    config = make_config(llm={"single_line_formats": ["text"]})
+
+    def answer(prompt):
+        history = " (continued)" if "assistant:" in prompt else ""
+        return f"{prompt.splitlines()[-1]}{history}\nmore"
+
+    expected = make_processor(FakeLLMClient(answer=answer), config=config,
+                              context_manager=ContextManager()).process(text, format="text")
+    with open(output, "wb") as destination:
+        make_processor(FakeLLMClient(answer=answer, delay=0.01), config=config,
+                       context_manager=ContextManager()).process_file(str(template), destination, format="text")
+
+    assert output.read_text() == expected
+    assert expected.startswith("A: first\nB: second (continued)\nlines\nmore")
+
+
+def test_range_writer_falls_back_to_writing_slices(tmp_path):
+    template = tmp_path / "in.txt"
+    template.write_bytes(b"0123456789")
+    buffer = io.BytesIO()
+
+    with open(template, "rb") as source:
+        writer = RangeWriter(source, source.read(), buffer)
+        writer.copy(2, 5)
+        writer.write(b"-")
+        writer.copy(8, 10)
+
+    assert buffer.getvalue() == b"234-89"
+    assert writer.copied == 0
+
+
+def test_mapped_output_may_replace_its_input(tmp_path):
+    from ono.cli import LazyProcessor, process_mapped
+
+    template = tmp_path / "same.txt"
+    template.write_text("head <?ono a ?> " + "row;\n" * 1000)
+
+    processor = LazyProcessor(config=make_config(), llm_client=FakeLLMClient())
+    assert process_mapped(processor, str(template), str(template))
+    assert template.read_text() == "head A " + "row;\n" * 1000
+
+    template.write_text("head <?ono b ?>")
+    failing = LazyProcessor(config=make_config(llm={"max_retries": 0}),
+                            llm_client=FakeLLMClient(answer=lambda prompt: 1 / 0))
+    assert not process_mapped(failing, str(template), str(template))
+    assert template.read_text() == "head <?ono b ?>"
+    assert [path.name for path in tmp_path.iterdir()] == ["same.txt"]
@@ -2,4 +2,69 @@
 This module contains the tests for the Ono metadata generator.
 """
 
-# TODO: Add tests for the Ono metadata generator
\ No newline at end of file
+import json
+import os
+
+from ono.metadata import BuildManifest, BuildProfile
+
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_manifest_detects_changed_inputs(tmp_path):
+    source, output = str(tmp_path / "a.ono.sh"), str(tmp_path / "a.sh")
+    write(source, "x=<?ono get x ?>")
+    write(output, "x=1")
+    manifest = BuildManifest(str(tmp_path / "manifest.json"))
+    inputs = manifest.fingerprint(None, "config-hash", "bash")
+
+    assert not manifest.is_up_to_date(source, output, inputs)
+    manifest.record(source, output, inputs)
+    manifest.save()
+
+    reloaded = BuildManifest(str(tmp_path / "manifest.json"))
+    assert reloaded.is_up_to_date(source, output, inputs)
+    assert not reloaded.is_up_to_date(source, output, {**inputs, "config_hash": "other"})
+    assert not reloaded.is_up_to_date(source, output, {**inputs, "format": "python"})
+
+    write(source, "x=<?ono get y ?>")
+    assert not reloaded.is_up_to_date(source, output, inputs)
+
+
+def test_manifest_detects_edited_output(tmp_path):
+    source, output = str(tmp_path / "a.ono.sh"), str(tmp_path / "a.sh")
+    write(source, "x=<?ono get x ?>")
+    write(output, "x=1")
+    manifest = BuildManifest(str(tmp_path / "manifest.json"))
+    manifest.record(source, output, {})
+
+    write(output, "x=2")
+    os.utime(output, ns=(0, 0))
+
+    assert not manifest.is_up_to_date(source, output, {})
+
+
+def test_profile_exports_json_and_chrome_trace(tmp_path):
+    profile = BuildProfile()
+    profile.record_parse("a.ono", 0.0, 0.001)
+    block = profile.start_block(0, "a.ono", content="get x", model="m")
+    block.started_at = block.ready_at + 0.5
+    block.finished_at = block.started_at + 0.25
+    block.thread_id = 42
+    block.spans.append(("concept", block.started_at, block.finished_at, 42))
+
+    profile.save(str(tmp_path / "profile.json"))
+    with open(tmp_path / "profile.json") as f:
+        report = json.load(f)
+    assert report["blocks"][0]["queue_wait"] == 0.5
+    assert report["summary"]["blocks"] == 1
+
+    profile.save(str(tmp_path / "trace.json"), trace=True)
+    with open(tmp_path / "trace.json") as f:
+        events = json.load(f)["traceEvents"]
+    spans = {event["name"]: event for event in events if event["ph"] == "X"}
+    assert set(spans) == {"parse a.ono", "block 0 (a.ono) queued", "block 0 (a.ono)", "block 0 (a.ono) concept"}
+    assert spans["block 0 (a.ono)"]["dur"] == 250000
+    assert spans["block 0 (a.ono) queued"]["tid"] != spans["block 0 (a.ono)"]["tid"]
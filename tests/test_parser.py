@@ -2,4 +2,86 @@
 This module contains the tests for the Ono parser.
 """
 
-# TODO: Add tests for the Ono parser
\ No newline at end of file
+from ono.parser import Kind, OnoParser
+
+
+def test_parse_block_config_splits_params_and_directives():
+    config = OnoParser().parse_block_config(
+        'model="claude-3-5-sonnet"\ntemperature=0.2\n@context=preserve_previous\n\nget database configuration'
+    )
+
+    assert config.prompt == "get database configuration"
+    assert config.params == {"model": "claude-3-5-sonnet", "temperature": 0.2}
+    assert config.directives == {"context": "preserve_previous"}
+
+
+def test_parse_block_config_accepts_bare_directives():
+    config = OnoParser().parse_block_config("context=system identify running services")
+
+    assert config.prompt == "identify running services"
+    assert config.directives == {"context": "system"}
+
+
+def test_parse_nested_blocks_with_offsets():
+    text = "start <?ono level1 <?ono level2 ?> end1 ?> finish"
+    items = OnoParser().parse(text)
+
+    assert [item.type for item in items] == ["text", "ono", "text"]
+    block = items[1]
+    assert block.content == "level1 <?ono level2 ?> end1"
+    assert text[block.start:block.end] == "<?ono level1 <?ono level2 ?> end1 ?>"
+    assert [child.content for child in block.parsed] == ["level1 ", "level2", " end1"]
+    assert text[block.parsed[1].start:block.parsed[1].end] == "<?ono level2 ?>"
+
+
+def test_parse_unclosed_block_is_text():
+    items = OnoParser().parse("a <?ono b ?> c <?ono d <?ono e ?>")
+
+    assert [(item.type, item.content) for item in items] == [
+        ("text", "a "), ("ono", "b"), ("text", " c "), ("text", "<?ono d <?ono e ?>"),
+    ]
+
+
+def test_extract_ono_blocks_handles_deep_nesting():
+    depth = 5000
+    text = "<?ono x " * depth + "?>" * depth
+    parser = OnoParser()
+
+    assert len(parser.extract_ono_blocks(parser.parse(text))) == depth
+
+
+def test_render_splices_results_by_block_id():
+    parser = OnoParser()
+    items = parser.parse("x=<?ono a <?ono b ?> ?> y=<?ono c ?>")
+
+    assert parser.extract_ono_blocks(items) == ["a <?ono b ?>", "b", "c"]
+    assert parser.render(items, ["A", "B", "C"]) == "x=A y=C"
+    assert parser.render(items) == "x=<?ono a <?ono b ?> ?> y=<?ono c ?>"
+
+
+def test_parse_every_delimiter_pair():
+    parser = OnoParser()
+    parsed = parser.parse("a=\"?ono one [?ono two ?] ?\" b='?ono three ?> ?' c=🐊?ono four 🦋")
+
+    assert parser.extract_ono_blocks(parsed) == ["one [?ono two ?]", "two", "three ?>", "four"]
+    assert parser.render(parsed, ["1", "2", "3", "4"]) == "a=1 b=3 c=4"
+
+
+def test_parse_file_level_delimiters_replace_the_defaults():
+    parser = OnoParser()
+    text = "# ?ono\n# delimiters=%%, %%\n# ?\nx = %%?ono get x %%\ny = <?ono left alone ?>\n"
+
+    assert parser.extract_ono_blocks(parser.parse(text)) == ["get x"]
+
+
+def test_items_share_the_source_text():
+    text = "a <?ono model=small context=ops list services ?> b <?ono outer <?ono inner ?> ?>"
+    items = OnoParser().parse(text)
+
+    assert all(item.source is text for item in items)
+    assert not hasattr(items[0], "__dict__")
+    leaf, outer = items[1], items[3]
+    assert leaf.kind is Kind.ONO and leaf.type == "ono" and leaf.parsed is None
+    assert leaf.config.params == {"model": "small"} and leaf.config.directives == {"context": "ops"}
+    assert leaf.config.prompt == "list services"
+    assert [child.content for child in outer.parsed] == ["outer ", "inner"]
@@ -2,4 +2,541 @@
 This module contains the tests for the Ono processor.
 """
 
-# TODO: Add tests for the Ono processor
\ No newline at end of file
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from ono.batching import BATCH_INSTRUCTIONS
+from ono.cache import ResponseCache
+from ono.config import OnoConfig
+from ono.context import ContextManager
+from ono.exceptions import DeadlineExceeded, LLMError
+from ono.metadata import BuildProfile
+from ono.processor import TwoPassProcessor
+
+
+class FakeLLMClient:
+    """
+    Records prompts and answers them without touching the network.
+    """
+
+    def __init__(self, answer=None, delay=0.0):
+        self.answer = answer or (lambda prompt: prompt.upper())
+        self.delay = delay
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def generate_text(self, prompt, model=None, **kwargs):
+        with self.lock:
+            self.prompts.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return self.answer(prompt)
+
+
+def make_config(**sections):
+    config = OnoConfig(global_config_path="/nonexistent", project_config_path="/nonexistent")
+    config.config = {"cache": {"enabled": False}, **sections}
+    return config
+
+
+def make_processor(client, config=None, **kwargs):
+    return TwoPassProcessor(config=config or make_config(), llm_client=client, **kwargs)
+
+
+def test_process_preserves_block_order():
+    client = FakeLLMClient(delay=0.01)
+    processor = make_processor(client, max_concurrency=4)
+
+    text = "a=<?ono one ?> b=<?ono two ?> c=<?ono three ?>"
+
+    assert processor.process(text) == "a=ONE b=TWO c=THREE"
+
+
+def test_process_respects_concurrency_limit():
+    client = FakeLLMClient(delay=0.02)
+    processor = make_processor(client, max_concurrency=2)
+
+    text = "".join(f"<?ono block {i} ?>\n" for i in range(8))
+    processor.process(text)
+
+    assert len(client.prompts) == 8
+    assert client.max_in_flight == 2
+
+
+def test_concurrency_limit_is_shared_by_parallel_documents():
+    client = FakeLLMClient(delay=0.02)
+    processor = make_processor(client, max_concurrency=2)
+
+    texts = ["".join(f"<?ono file {n} block {i} ?>\n" for i in range(4)) for n in range(3)]
+    threads = [threading.Thread(target=processor.process, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert client.max_in_flight == 2
+
+
+def test_process_resolves_nested_blocks_first():
+    client = FakeLLMClient()
+    processor = make_processor(client, max_concurrency=4)
+
+    text = "x <?ono outer <?ono inner ?> end ?> y"
+
+    assert processor.process(text) == "x OUTER INNER END y"
+    assert client.prompts == ["inner", "outer INNER end"]
+
+
+def test_parent_starts_without_waiting_for_unrelated_blocks():
+    finished = []
+
+    def answer(prompt):
+        if prompt == "slow":
+            time.sleep(0.2)
+        finished.append(prompt)
+        return prompt.upper()
+
+    processor = make_processor(FakeLLMClient(answer=answer), max_concurrency=4)
+
+    assert processor.process("<?ono slow ?> <?ono outer <?ono fast ?> ?>") == "SLOW OUTER FAST"
+    assert finished == ["fast", "outer FAST", "slow"]
+
+
+def test_failed_blocks_raise_instead_of_returning_the_template():
+    def answer(prompt):
+        raise LLMError("LLM API returned 503")
+
+    processor = make_processor(FakeLLMClient(answer=answer))
+
+    with pytest.raises(LLMError):
+        processor.process("x=<?ono thing ?>")
+    with pytest.raises(LLMError):
+        processor.process_stream(["x=<?ono thing ?>"], lambda text: None)
+
+
+def test_max_concurrency_read_from_config():
+    processor = make_processor(FakeLLMClient(), config=make_config(llm={"max_concurrency": 7}))
+
+    assert processor.max_concurrency == 7
+
+
+def test_process_reuses_cached_responses(tmp_path):
+    cache = ResponseCache(path=str(tmp_path))
+    text = "dir=<?ono get temp dir ?>"
+
+    first = FakeLLMClient()
+    assert make_processor(first, cache=cache, format="bash").process(text) == "dir=GET TEMP DIR"
+
+    second = FakeLLMClient()
+    assert make_processor(second, cache=cache, format="bash").process(text) == "dir=GET TEMP DIR"
+    assert second.prompts == []
+
+
+def test_variables_from_context_file_are_bound_before_caching(tmp_path):
+    variables = tmp_path / "vars.yaml"
+    variables.write_text("port: 8080\nretries: 3\n")
+    cache = ResponseCache(path=str(tmp_path / "cache"))
+    text = "a=<?ono free port $port ?> b=<?ono retry $(retries * 2) times <?ono using $tool ?> ?>"
+
+    first = FakeLLMClient()
+    make_processor(first, cache=cache, context=str(variables)).process(text)
+    assert first.prompts[:2] == ["free port 8080", "using $tool"]
+    assert first.prompts[2] == "retry 6 times USING $TOOL"
+
+    # Only the block using the changed variable misses the cache
+    variables.write_text("port: 9090\nretries: 3\n")
+    second = FakeLLMClient()
+    make_processor(second, cache=cache, context=str(variables)).process(text)
+    assert second.prompts == ["free port 9090"]
+
+
+def test_execution_always_bypasses_cache(tmp_path):
+    cache = ResponseCache(path=str(tmp_path))
+    text = "now=<?ono @execution=always get current time ?>"
+
+    make_processor(FakeLLMClient(), cache=cache).process(text)
+    client = FakeLLMClient()
+    make_processor(client, cache=cache).process(text)
+
+    assert client.prompts == ["get current time"]
+
+
+def test_process_splices_blocks_with_irregular_whitespace_and_duplicates():
+    client = FakeLLMClient()
+    processor = make_processor(client)
+
+    text = "a=<?ono   same\n?> b=<?ono same ?> c=<?ono\tsame?>"
+
+    assert processor.process(text) == "a=SAME b=SAME c=SAME"
+
+
+def test_nested_answers_are_never_read_as_configuration():
+    calls = []
+
+    class RecordingClient(FakeLLMClient):
+        def generate_text(self, prompt, model=None, **kwargs):
+            params = {key: value for key, value in kwargs.items() if key not in ("single_line", "max_chars")}
+            calls.append((prompt.splitlines()[-1], model, params))
+            return "TMPDIR" if prompt.endswith("env var name") else "ok"
+
+    processor = make_processor(RecordingClient())
+    processor.process("<?ono <?ono env var name ?>=/tmp as an export line ?> "
+                      "<?ono model=small temperature=0 list <?ono dir ?> contents ?>")
+
+    assert ("TMPDIR=/tmp as an export line", None, {}) in calls
+    assert ("list ok contents", "small", {"temperature": 0}) in calls
+
+
+def test_duplicate_blocks_share_one_call_across_files():
+    client = FakeLLMClient(delay=0.05)
+    processor = make_processor(client, config=make_config(dedup={"level": "fuzzy"}))
+    texts = ["a=<?ono get the user's temp dir ?> b=<?ono List  files ?>", "c=<?ono list files. ?>",
+             "d=<?ono get user temp directory ?>"]
+
+    with processor.dedup.run():
+        threads = [threading.Thread(target=processor.process, args=(text,)) for text in texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(client.prompts) == ["List  files", "get the user's temp dir"]
+        assert processor.dedup.metrics.calls_saved == 2
+        assert processor.process("e=<?ono LIST FILES ?>") == "e=LIST  FILES"
+        assert len(client.prompts) == 2
+
+
+def test_answers_are_not_shared_after_the_run():
+    answers = iter(["answer0", "answer1", "answer2"])
+    client = FakeLLMClient(answer=lambda prompt: next(answers))
+    processor = make_processor(client, config=make_config(cache={"enabled": False}))
+
+    assert [processor.process("<?ono current time ?>") for _ in range(3)] == ["answer0", "answer1", "answer2"]
+    assert len(client.prompts) == 3
+
+
+def test_duplicates_count_as_shared_only_when_they_use_the_answer():
+    started = threading.Event()
+
+    def answer(prompt):
+        started.set()
+        time.sleep(0.05)
+        if not answer.failed:
+            answer.failed = True
+            raise LLMError("refused")
+        return prompt.upper()
+    answer.failed = False
+
+    client = FakeLLMClient(answer=answer)
+    processor = make_processor(client, config=make_config(llm={"max_retries": 0}))
+    errors = []
+
+    def own():
+        try:
+            processor.process("<?ono echo Hello ?>")
+        except LLMError as e:
+            errors.append(e)
+
+    owner = threading.Thread(target=own)
+    owner.start()
+    started.wait()
+    # The duplicate waits for the owner's call, which fails, and then makes its own
+    assert processor.process("<?ono echo Hello ?> <?ono echo hello. ?>") == "ECHO HELLO ECHO HELLO."
+    owner.join()
+    assert len(errors) == 1
+
+    assert processor.dedup.metrics.as_dict() == {"blocks": 3, "shared": 0, "fuzzy": 0, "calls_saved": 0}
+    with processor.dedup.run():
+        processor.process("<?ono echo Hi ?>")
+        assert processor.process("<?ono echo  Hi ?>") == "ECHO HI"
+    assert processor.dedup.metrics.calls_saved == 1
+
+
+def test_dedup_off_sends_every_block():
+    client = FakeLLMClient()
+    processor = make_processor(client, config=make_config(dedup={"level": "off"}))
+
+    assert processor.process("<?ono same ?> <?ono same ?>") == "SAME SAME"
+    assert client.prompts == ["same", "same"]
+
+
+def answer_batches(prompt):
+    if prompt.startswith(BATCH_INSTRUCTIONS):
+        requests = [json.loads(line.split(". ", 1)[1]) for line in prompt.splitlines()[3:]]
+        return json.dumps([request.upper() for request in requests])
+    return prompt.upper()
+
+
+def test_batching_groups_blocks_by_model():
+    client = FakeLLMClient(answer=answer_batches)
+    processor = make_processor(client, batch_size=2)
+
+    text = "<?ono a ?> <?ono b ?> <?ono c ?> <?ono model=small d ?>"
+
+    assert processor.process(text) == "A B C D"
+    assert len(client.prompts) == 3  # [a, b], [c], [d]
+    assert processor.batch_metrics.as_dict()["batched_blocks"] == 2
+
+
+def test_batching_falls_back_when_answer_is_malformed():
+    client = FakeLLMClient(answer=lambda prompt: "not json" if prompt.startswith(BATCH_INSTRUCTIONS) else prompt.upper())
+    processor = make_processor(client, batch_size=4)
+
+    assert processor.process("<?ono a ?> <?ono b ?>") == "A B"
+    assert processor.batch_metrics.fallback_rate == 1.0
+    assert client.prompts[1:] == ["a", "b"]
+
+
+def test_process_stream_matches_process():
+    text = "head <?ono a ?> mid <?ono b <?ono c ?> ?> tail <?ono unclosed"
+    expected = make_processor(FakeLLMClient()).process(text)
+
+    written = []
+    chunks = [text[i:i + 3] for i in range(0, len(text), 3)]
+    make_processor(FakeLLMClient(delay=0.01)).process_stream(chunks, written.append)
+
+    assert "".join(written) == expected == "head A mid B C tail <?ono unclosed"
+
+
+def test_process_stream_honors_file_delimiters():
+    text = "# ?ono\n# delimiters=%%, %%\n# ?\na=%%?ono hi %% b=<?ono no ?>"
+    written = []
+
+    make_processor(FakeLLMClient()).process_stream([text[i:i + 4] for i in range(0, len(text), 4)], written.append)
+
+    assert "".join(written) == make_processor(FakeLLMClient()).process(text) == text.replace("%%?ono hi %%", "HI")
+
+
+def test_process_stream_writes_text_before_reading_everything():
+    written = []
+
+    def chunks():
+        yield "first line\n<?ono a ?>\n"
+        assert "first line\n" in written
+        yield "last line\n"
+
+    make_processor(FakeLLMClient()).process_stream(chunks(), written.append)
+
+    assert "".join(written) == "first line\nA\nlast line\n"
+
+
+def test_process_stream_keeps_context_chains_and_concurrency_limit():
+    client = FakeLLMClient(answer=lambda prompt: f"answer {prompt.splitlines()[-1]}", delay=0.02)
+    processor = make_processor(client, context_manager=ContextManager(), max_concurrency=2)
+    text = "A: <?ono @context=chat first ?>\nB: <?ono @context=chat second ?>\n" + "<?ono x <?ono y ?> <?ono z ?> ?>\n" * 3
+
+    written = []
+    processor.process_stream([text[i:i + 5] for i in range(0, len(text), 5)], written.append)
+
+    second = [prompt for prompt in client.prompts if prompt.endswith("second")][0]
+    assert "assistant: answer first" in second
+    assert "".join(written).startswith("A: answer first\nB: answer second\n")
+    assert client.max_in_flight == 2
+
+
+def test_context_chains_carry_history_in_order():
+    client = FakeLLMClient(answer=lambda prompt: f"answer {prompt.splitlines()[-1]}", delay=0.01)
+    manager = ContextManager()
+    processor = make_processor(client, context_manager=manager, max_concurrency=4)
+
+    text = "<?ono context=system first ?> <?ono free ?> <?ono context=system/backup second ?>"
+    processor.process(text)
+
+    second = [prompt for prompt in client.prompts if prompt.endswith("second")][0]
+    assert "user: first" in second and "assistant: answer first" in second
+    assert "free" not in second
+    assert len(manager.get_messages("system/backup")) == 4
+
+
+def test_contexts_are_persisted_only_when_asked(tmp_path):
+    text = "<?ono context=chat hello ?>"
+    storage = {"context_storage": str(tmp_path)}
+
+    for _ in range(2):
+        client = FakeLLMClient()
+        make_processor(client, config=make_config(defaults=storage)).process(text)
+        assert client.prompts == ["hello"]
+    assert not any(tmp_path.iterdir())
+
+    persisted = make_config(defaults=storage, context={"persist": True})
+    make_processor(FakeLLMClient(), config=persisted).process(text)
+    client = FakeLLMClient()
+    make_processor(client, config=persisted).process(text)
+    assert "assistant: HELLO" in client.prompts[0]
+
+
+def test_syntax_pass_uses_its_own_client_and_model():
+    concept = FakeLLMClient(answer=lambda prompt: "echo hi")
+    syntax = FakeLLMClient(answer=lambda prompt: "echo 'hi'")
+    config = make_config(passes={"syntax": {"enabled": True, "model": "small"}}, formats={"bash": {"validator": ""}})
+    processor = make_processor(concept, config=config, syntax_client=syntax)
+
+    assert processor.process("<?ono greet <?ono name ?> ?>", format="bash") == "echo 'hi'"
+    assert len(concept.prompts) == 2
+    assert len(syntax.prompts) == 1 and syntax.prompts[0].endswith("echo hi")
+
+
+def test_syntax_pass_skipped_when_output_validates():
+    concept = FakeLLMClient(answer=lambda prompt: '{"ok": true}' if "valid" in prompt else "{ok: true")
+    syntax = FakeLLMClient(answer=lambda prompt: '{"fixed": true}')
+    config = make_config(passes={"syntax": {"enabled": True}})
+    processor = make_processor(concept, config=config, syntax_client=syntax)
+
+    assert processor.process("<?ono valid ?>\n", format="json") == '{"ok": true}\n'
+    assert syntax.prompts == []
+    assert processor.process("<?ono broken ?>", format="json") == '{"fixed": true}'
+    assert len(syntax.prompts) == 1
+
+
+def test_fragments_always_get_the_fragment_syntax_pass():
+    concept = FakeLLMClient(answer=lambda prompt: '"key": 1')
+    syntax = FakeLLMClient(answer=lambda prompt: '"key": 1')
+    config = make_config(passes={"syntax": {"enabled": True}})
+    profile = BuildProfile()
+    processor = make_processor(concept, config=config, syntax_client=syntax, profile=profile)
+
+    assert processor.process("{<?ono a key ?>}", format="json") == '{"key": 1}'
+    assert len(syntax.prompts) == 1 and "fragment of a larger json document" in syntax.prompts[0]
+    assert [span[0] for span in profile.blocks[0].spans] == ["concept", "syntax"]
+
+
+def test_profile_records_each_block(tmp_path):
+    cache = ResponseCache(path=str(tmp_path))
+    cache.set(ResponseCache.make_key("cached", None, {}, None, "json"), '"hit"')
+    concept = FakeLLMClient(answer=lambda prompt: "{broken" if "outer" in prompt else '"ok"', delay=0.01)
+    config = make_config(passes={"syntax": {"enabled": True}})
+    profile = BuildProfile()
+    processor = make_processor(concept, config=config, cache=cache, profile=profile,
+                               syntax_client=FakeLLMClient(answer=lambda prompt: "{}"))
+
+    processor.process("[<?ono outer <?ono inner ?> ?>, <?ono cached ?>]", format="json", source="a.ono.json")
+
+    blocks = {block.content: block for block in profile.blocks}
+    assert set(blocks) == {"outer \"ok\"", "inner", "cached"}
+    assert blocks["cached"].cache_hit and [span[0] for span in blocks["cached"].spans] == ["syntax"]
+    inner, outer = blocks["inner"], blocks["outer \"ok\""]
+    assert inner.llm_calls == 1 and inner.llm_latency >= 0.01 and inner.tokens_out == 1
+    assert outer.ready_at >= inner.finished_at
+    assert outer.llm_calls == 2 and outer.resolved_value == "{}"
+    assert [span[0] for span in outer.spans] == ["concept", "syntax"]  # A fragment isn't validated
+    assert all(block.source == "a.ono.json" for block in profile.blocks)
+    assert profile.parses[0]["source"] == "a.ono.json"
+    assert profile.summary()["cache_hits"] == 1
+
+
+def test_syntax_pass_overlaps_later_concept_passes():
+    events = []
+
+    def concept_answer(prompt):
+        if prompt.endswith("second"):
+            time.sleep(0.1)
+        events.append(("concept", prompt.splitlines()[-1]))
+        return prompt.splitlines()[-1]
+
+    def syntax_answer(prompt):
+        events.append(("syntax", prompt.splitlines()[-1]))
+        return prompt.splitlines()[-1]
+
+    config = make_config(passes={"syntax": {"enabled": True}}, formats={"bash": {"validator": ""}})
+    processor = make_processor(FakeLLMClient(answer=concept_answer), config=config,
+                               syntax_client=FakeLLMClient(answer=syntax_answer),
+                               context_manager=ContextManager())
+
+    processor.process("<?ono context=a first ?> <?ono context=a second ?>", format="bash")
+
+    assert events.index(("syntax", "first")) < events.index(("concept", "second"))
+
+
+def test_inline_values_are_single_line_in_configured_formats():
+    client = FakeLLMClient(answer=lambda prompt: "/opt/app\nThis directory holds the app.")
+    processor = make_processor(client, config=make_config(llm={"single_line_formats": ["bash"]}))
+
+    text = "APP_DIR=<?ono app dir ?>\n<?ono app dir ?>\n"
+
+    assert processor.process(text, format="bash") == "APP_DIR=/opt/app\n/opt/app\nThis directory holds the app.\n"
+
+
+def test_inline_values_are_kept_whole_by_default():
+    processor = make_processor(FakeLLMClient(answer=lambda prompt: "a\nb"))
+
+    assert processor.process("KEYS=<?ono keys ?>\n", format="bash") == "KEYS=a\nb\n"
+
+
+class FakeAsyncLLMClient:
+    """
+    Answers prompts on the event loop, recording calls that were cancelled.
+    """
+
+    def __init__(self, answer=None, delay=0.0):
+        self.answer = answer or (lambda prompt: prompt.upper())
+        self.delay = delay
+        self.prompts = []
+        self.cancelled = 0
+
+    async def generate_text(self, prompt, model=None, **kwargs):
+        self.prompts.append(prompt)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.answer(prompt)
+
+    async def aclose(self):
+        pass
+
+
+def test_aprocess_matches_process():
+    text = "a=<?ono one ?> <?ono outer <?ono inner ?> ?> <?ono context=s x ?> <?ono context=s y ?>"
+    client = FakeAsyncLLMClient(answer=lambda prompt: prompt.splitlines()[-1].upper(), delay=0.01)
+    processor = make_processor(FakeLLMClient(), async_client=client, context_manager=ContextManager())
+
+    assert asyncio.run(processor.aprocess(text)) == "a=ONE OUTER INNER X Y"
+    assert client.prompts.index("inner") < client.prompts.index("outer INNER")
+
+
+def test_aprocess_cancellation_and_deadline():
+    client = FakeAsyncLLMClient(delay=1.0)
+    processor = make_processor(FakeLLMClient(), async_client=client)
+    text = "<?ono one ?> <?ono two ?>"
+
+    async def cancel():
+        task = asyncio.ensure_future(processor.aprocess(text))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert client.cancelled == 2
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(processor.aprocess(text, deadline=0.05))
+
+
+def test_aprocess_raises_instead_of_returning_the_template():
+    class FailingClient(FakeAsyncLLMClient):
+        def __init__(self, error):
+            super().__init__()
+            self.error = error
+
+        async def generate_text(self, prompt, model=None, **kwargs):
+            raise self.error
+
+    expiring = FailingClient(DeadlineExceeded("LLM call did not finish within 0.01s"))
+    processor = make_processor(FakeLLMClient(), async_client=expiring)
+    with pytest.raises(DeadlineExceeded, match="LLM call"):
+        asyncio.run(processor.aprocess("<?ono one ?>", deadline=10))
+
+    processor = make_processor(FakeLLMClient(), async_client=FailingClient(LLMError("refused")))
+    with pytest.raises(LLMError, match="refused"):
+        asyncio.run(processor.aprocess("<?ono one ?>"))
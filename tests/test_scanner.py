@@ -0,0 +1,63 @@
+"""
+This module contains the tests for the Ono delimiter scanner.
+"""
+
+from ono.scanner import DEFAULT_DELIMITERS, file_delimiters, get_scanner, header_complete
+from ono.stream import StreamScanner
+
+
+def test_scan_finds_every_pair_in_one_pass():
+    scanner = get_scanner()
+    text = "<?ono a ?> \"?ono b ?\" {?ono c ?} 🐊?ono d 🦋 🐊?ono e ?🦋"
+
+    found = [(opens, pair, text[start:end]) for opens, pair, start, end in scanner.scan(text)]
+
+    assert found == [
+        (True, 0, "<?ono"), (False, 0, "?>"),
+        (True, 1, '"?ono'), (False, 1, '?"'),
+        (True, 3, "{?ono"), (False, 3, "?}"),
+        (True, 5, "🐊?ono"), (False, 5, "🦋"),
+        (True, 5, "🐊?ono"), (False, 5, "?🦋"),
+    ]
+
+
+def test_longer_delimiters_win_over_their_prefixes():
+    scanner = get_scanner((("<?ono", "?>"), ("<<?ono", ">>")))
+
+    assert [(opens, pair) for opens, pair, _, _ in scanner.scan("<<?ono x ?>>")] == [(True, 1), (False, 1)]
+
+
+def test_scanners_are_cached_per_delimiter_set():
+    assert get_scanner() is get_scanner(DEFAULT_DELIMITERS)
+    assert get_scanner((("%?ono", "%"),)) is get_scanner((("%?ono", "%"),))
+
+
+def test_file_delimiters_read_from_configuration_block():
+    text = "#!/usr/bin/env python\n# ?ono\n# type=config\n# delimiters=%%, %%\n# ?\n\nx = %%?ono get x %%\n"
+
+    assert file_delimiters(text) == (("%%?ono", "%%"),)
+    assert file_delimiters("x = <?ono delimiters=%, % get x ?>") is None
+
+
+def test_stream_scanner_handles_every_pair_across_chunks():
+    scanner = StreamScanner(delimiters=DEFAULT_DELIMITERS)
+    text = "a={?ono one ?> still one ?} b=🐊?ono two ?🦋 end"
+
+    events = [event for i in range(0, len(text), 3) for event in scanner.feed(text[i:i + 3])]
+    events.extend(scanner.close())
+
+    blocks = [value for kind, value in events if kind == "block"]
+    assert blocks == ["{?ono one ?> still one ?}", "🐊?ono two ?🦋"]
+    assert "".join(value for _, value in events) == text
+
+
+def test_stream_scanner_reads_delimiters_from_the_header():
+    text = "# ?ono\n# delimiters=%%, %%\n# ?\na=%%?ono hi %% b=<?ono no ?>"
+    scanner = StreamScanner(delimiters=DEFAULT_DELIMITERS)
+
+    events = [event for i in range(0, len(text), 4) for event in scanner.feed(text[i:i + 4])]
+    events.extend(scanner.close())
+
+    assert [value for kind, value in events if kind == "block"] == ["%%?ono hi %%"]
+    assert "".join(value for _, value in events) == text
+    assert header_complete("first line\n<?ono") and not header_complete("# ?ono\n# delim")
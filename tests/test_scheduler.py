@@ -0,0 +1,57 @@
+"""
+This module contains the tests for the Ono block scheduler.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from ono.parser import OnoParser
+from ono.scheduler import BlockGraph, Scheduler
+
+
+def chain_by_word(item):
+    words = item.content.split()
+    return words[0] if words and words[0].startswith("ctx") else None
+
+
+def test_nested_blocks_feed_their_parents():
+    graph = BlockGraph(OnoParser().parse("<?ono a <?ono b ?> <?ono c ?> ?> <?ono d ?>"))
+
+    assert graph.ready() == [1, 2, 3]
+    assert graph.complete(1, "B") == []
+    assert graph.complete(2, "C") == [0]
+
+
+def test_context_chains_run_inner_blocks_first():
+    text = "<?ono ctx1 outer <?ono ctx1 inner ?> ?> <?ono ctx1 last ?> <?ono free ?>"
+    graph = BlockGraph(OnoParser().parse(text), chain_of=chain_by_word)
+
+    assert graph.ready() == [1, 3]
+    assert graph.nodes[0].dependencies == {1}
+    assert graph.nodes[2].dependencies == {0}
+
+
+def test_scheduler_resolves_in_dependency_order():
+    graph = BlockGraph(OnoParser().parse("<?ono a <?ono b <?ono c ?> ?> ?> <?ono d ?>"))
+    order = []
+
+    def dispatch(block_ids):
+        order.append(block_ids)
+        return {}, [([block_id], lambda block_id=block_id: [f"r{block_id}"]) for block_id in block_ids]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = Scheduler(executor).run(graph, dispatch)
+
+    assert results == {0: "r0", 1: "r1", 2: "r2", 3: "r3"}
+    assert order[0] == [2, 3]
+    assert order.index([1]) < order.index([0])
+
+
+def test_extended_graph_chains_after_earlier_blocks():
+    parser = OnoParser()
+    graph = BlockGraph(parser.parse("<?ono ctx1 first ?>"), chain_of=chain_by_word)
+    graph.complete(0, "done")
+
+    assert graph.extend(parser.parse("<?ono ctx1 second <?ono ctx2 inner ?> ?>")) == [2]
+    assert graph.extend(parser.parse("<?ono ctx2 last ?>")) == []
+    assert graph.nodes[1].dependencies == {0, 2}
+    assert graph.nodes[3].dependencies == {2}
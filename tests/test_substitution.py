@@ -0,0 +1,56 @@
+"""
+This module contains the tests for the variable substitution engine.
+"""
+
+from ono.substitution import Call, Expression, Variable, compile_template, load_variables, substitute
+
+
+def test_compiles_the_specification_example():
+    text = "create backup using $backup_tool($source_dir, $dest_calc($base_path, $project_name), $(retention_days * 24))"
+    template = compile_template(text)
+
+    literal, call = template.parts
+    assert literal == "create backup using " and isinstance(call, Call) and call.name == "backup_tool"
+    source, nested, expression = call.args
+    assert isinstance(source[0], Variable) and source[0].name == "source_dir"
+    assert isinstance(nested[1], Call) and [arg[-1].name for arg in nested[1].args] == ["base_path", "project_name"]
+    assert isinstance(expression[1], Expression)
+    assert template.names == {"backup_tool", "source_dir", "dest_calc", "base_path", "project_name", "retention_days"}
+
+
+def test_binding_substitutes_only_what_is_bound():
+    template = compile_template("copy $src to $dest_dir($name) after $(delay * 60) seconds")
+
+    assert template.bind({}) == "copy $src to $dest_dir($name) after $(delay * 60) seconds"
+    assert template.bind({"src": "/data", "name": "app", "delay": 1.5}) == "copy /data to $dest_dir(app) after 90 seconds"
+
+
+def test_expressions_are_only_evaluated_when_they_are_arithmetic():
+    variables = {"port": 80, "name": "web"}
+
+    assert substitute("$(port + 1) $($port * (2 - 1))", variables) == "81 80"
+    assert substitute("$(name * 1000) $(grep -v :$port) $(2 ** 1000)", variables) == "$(name * 1000) $(grep -v :80) $(2 ** 1000)"
+
+
+def test_unclosed_stanzas_and_escapes_are_text():
+    assert substitute("cost $$HOME and $(a + (b", {"HOME": "/root", "a": 1, "b": 2}) == "cost $$HOME and $(a + (b"
+    assert substitute("f(x, y) $", {"x": 1}) == "f(x, y) $"
+
+
+def test_templates_are_compiled_once_per_text():
+    text = "deploy $service to $region"
+    compile_template(text)
+    hits = compile_template.cache_info().hits
+
+    assert substitute(text, {"service": "api"}) == "deploy api to $region"
+    assert substitute(text, {"region": "eu"}) == "deploy $service to eu"
+    assert compile_template.cache_info().hits == hits + 2
+
+
+def test_load_variables(tmp_path):
+    path = tmp_path / "context.json"
+    path.write_text('{"port": 8080, "hosts": ["a", "b"]}')
+
+    assert load_variables(str(path)) == {"port": 8080, "hosts": ["a", "b"]}
+    assert substitute("use $hosts", load_variables(str(path))) == 'use ["a", "b"]'
+    assert load_variables("new") == {}
@@ -0,0 +1,78 @@
+"""
+This module contains the tests for the Ono output validator.
+"""
+
+import sys
+
+from ono.validator import Validator, ValidatorPool, find_tool
+
+
+def test_json_validation():
+    validator = Validator("json")
+
+    assert validator.validate_output('{"a": [1, 2]}')
+    assert not validator.validate_output("{a: 1}")
+    assert validator.get_validation_errors("[1,")
+
+
+def test_python_validation():
+    validator = Validator("python")
+
+    assert validator.validate_output("def f():\n    return 1\n")
+    assert not validator.validate_output("def f(:\n")
+
+
+def test_unknown_formats_are_not_checked():
+    validator = Validator("markdown")
+
+    assert not validator.can_validate
+    assert validator.validate_output("if then fi")
+
+
+def test_missing_tools_and_disabled_validators_accept_everything():
+    assert not Validator("bash", "no-such-validator-tool -").can_validate
+    assert not Validator("json", "").can_validate
+
+
+def test_tool_lookups_are_cached():
+    find_tool.cache_clear()
+    Validator("bash", "no-such-validator-tool -")
+    Validator("dockerfile", "no-such-validator-tool -")
+
+    assert find_tool.cache_info().misses == 1 and find_tool.cache_info().hits == 1
+
+
+def test_configured_commands_with_in_process_equivalents_do_not_fork():
+    validator = Validator("json", "jq .")
+
+    assert validator.check is not None and validator.argv is None
+    assert not validator.validate_output("{a: 1}")
+
+
+def lint_script(tmp_path):
+    script = tmp_path / "lint.py"
+    script.write_text("import sys\nif 'bad' in sys.stdin.read():\n    print('line 1: bad word')\n    sys.exit(1)\n")
+    return f"{sys.executable} {script}"
+
+
+def test_external_validator_reads_output_from_stdin(tmp_path):
+    validator = Validator("bash", lint_script(tmp_path))
+
+    assert validator.can_validate
+    assert validator.validate_output("echo good")
+    assert validator.get_validation_errors("echo bad") == ["line 1: bad word"]
+
+
+def test_pool_validates_off_thread_and_reuses_results(tmp_path):
+    calls = []
+    pool = ValidatorPool(workers=2)
+    pool._validators["bash"] = validator = Validator("bash", lint_script(tmp_path))
+    original = validator.get_validation_errors
+    validator.get_validation_errors = lambda text: calls.append(text) or original(text)
+    try:
+        futures = [pool.submit(pool.errors, "bash", text) for text in ("echo bad", "echo ok")]
+        assert [future.result() for future in futures] == [["line 1: bad word"], []]
+        assert pool.errors("bash", "echo bad") == ["line 1: bad word"]
+        assert sorted(calls) == ["echo bad", "echo ok"]
+    finally:
+        pool.close()